@@ -1,38 +1,112 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.language_models import BaseChatModel
-from src.utils.prompts import load_prompt
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ensure_config, merge_configs
+from src.metrics import LLMMetricsCallback
+from src.scheduler import estimate_tokens, get_scheduler
+from src.utils.prompts import get_prompt
 
-def run_agent_chain(
+# Providers that cache a prompt prefix only up to an explicit cache_control
+# breakpoint. OpenAI-compatible models cache the longest shared prefix on their own.
+CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "claude")
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# (id(llm), system_prompt_name, context_template, user_prompt_template) -> (llm, prompt mtime, chain)
+_chain_registry: Dict[Tuple[int, str, Optional[str], str], Tuple[BaseChatModel, float, Runnable]] = {}
+
+def get_chain(
     llm: BaseChatModel,
     system_prompt_name: str,
     user_prompt_template: str,
-    input_vars: Dict[str, Any]
-) -> str:
+    context_template: Optional[str] = None
+) -> Runnable:
     """
-    Common function to run an agent chain:
-    1. Load system prompt from file
-    2. Create prompt template with system prompt and user prompt
-    3. Run chain (Prompt -> LLM -> StrOutputParser)
+    Return the compiled Prompt -> LLM -> StrOutputParser chain for this
+    (agent LLM, system prompt, context template, user template) combination.
+    Chains are built once per process and rebuilt when the prompt file's mtime changes.
+
+    Prompt caching: the messages start with the static system prompt, then
+    context_template (the approved upstream documents, always in the same order),
+    then the per-call part. For providers that need it, the system prompt and
+    the context are marked as cache breakpoints.
     """
-    system_prompt = load_prompt(system_prompt_name)
-    
+    system_prompt, mtime = get_prompt(system_prompt_name)
+    key = (id(llm), system_prompt_name, context_template, user_prompt_template)
+
+    entry = _chain_registry.get(key)
+    if entry and entry[0] is llm and entry[1] == mtime:
+        return entry[2]
+
+    if needs_cache_control(model_name(llm)):
+        system: Any = [{"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}]
+        user: Any = [{"type": "text", "text": user_prompt_template}]
+        if context_template:
+            user.insert(0, {"type": "text", "text": context_template, "cache_control": CACHE_CONTROL})
+    else:
+        system, user = system_prompt, full_user_template(user_prompt_template, context_template)
     prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("user", user_prompt_template)
+        ("system", system),
+        ("user", user)
     ])
-    
-    # input_vars are used to format the 'user' message in the prompt template
-    # The invoke call needs the actual values for these variables.
-    # However, ChatPromptTemplate expects the formatting to happen during invoke
-    # OR we can pre-format.
-    # Standard LangChain usage: prompt elements with {var} need values at invoke time.
-    
     chain = prompt | llm | StrOutputParser()
-    result = chain.invoke(input_vars)
+    _chain_registry[key] = (llm, mtime, chain)
+    return chain
+
+def clear_chain_registry() -> None:
+    _chain_registry.clear()
+
+def needs_cache_control(model: str) -> bool:
+    return model.lower().startswith(CACHE_CONTROL_MODEL_PREFIXES)
+
+def full_user_template(user_prompt_template: str, context_template: Optional[str] = None) -> str:
+    """The user message as one template: the context first, then the per-call part."""
+    return f"{context_template}\n\n{user_prompt_template}" if context_template else user_prompt_template
+
+async def arun_agent_chain(
+    llm: BaseChatModel,
+    system_prompt_name: str,
+    user_prompt_template: str,
+    input_vars: Dict[str, Any],
+    context_template: Optional[str] = None
+) -> str:
+    """
+    Common function to run an agent chain:
+    1. Get the compiled chain (system prompt + user prompt template + LLM) from the registry
+    2. Run chain (Prompt -> LLM -> StrOutputParser)
+    3. Strip code fences from the output
+
+    [REQ-PER-001] Uses ainvoke so the LLM wait does not block the event loop.
+    The graph is async-only: there is no sync counterpart, because the shared
+    HTTP client and the scheduler are bound to the app's event loop.
+    """
+    # input_vars are used to format the 'user' message in the prompt template
+    chain = get_chain(llm, system_prompt_name, user_prompt_template, context_template)
+    usage = UsageMetadataCallbackHandler()
+    estimated = _estimate_prompt_tokens(system_prompt_name, full_user_template(user_prompt_template, context_template), input_vars)
+    # Wait for a fair, rate-limited turn on this model (see src/scheduler.py)
+    async with get_scheduler().slot(model_name(llm), estimated) as ticket:
+        # Merge with the inherited config: replacing its callbacks would hide the call
+        # from the graph's stream_mode="messages" handler and any parent tracer.
+        config = merge_configs(ensure_config(), {"callbacks": [usage, LLMMetricsCallback(model=model_name(llm))]})
+        result = await chain.ainvoke(input_vars, config=config)
+        ticket.used_tokens = _total_tokens(usage)
     return _clean_output(result)
 
+def model_name(llm: BaseChatModel) -> str:
+    return str(getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__)
+
+def _estimate_prompt_tokens(system_prompt_name: str, user_prompt_template: str, input_vars: Dict[str, Any]) -> int:
+    system_prompt, _ = get_prompt(system_prompt_name)
+    return estimate_tokens(system_prompt, user_prompt_template, *input_vars.values())
+
+def _total_tokens(usage: UsageMetadataCallbackHandler) -> Optional[int]:
+    if not usage.usage_metadata:
+        return None
+    return sum(metadata.get("total_tokens", 0) for metadata in usage.usage_metadata.values())
+
 def _clean_output(text: str) -> str:
     """
     Remove markdown code blocks fence if present.
@@ -48,3 +122,83 @@ def _clean_output(text: str) -> str:
             lines = lines[:-1]
         return "\n".join(lines).strip()
     return text
+
+class StreamingFenceCleaner:
+    """
+    Incremental version of _clean_output for streamed tokens.
+    feed() returns the part of the stream that is safe to display;
+    finish() flushes the rest. The concatenated output equals
+    _clean_output() of the whole text.
+    """
+
+    def __init__(self) -> None:
+        self._head = ""           # Buffered until we know whether the text is fenced
+        self._started = False
+        self._fenced = False
+        self._in_header = False   # Inside the opening fence line (```lang)
+        self._in_lead = False     # Skipping whitespace right after the opening fence
+        self._tail = ""           # Held back: trailing whitespace / possible closing fence
+        self._emitted = False
+
+    def feed(self, chunk: str) -> str:
+        if not self._started:
+            self._head += chunk
+            head = self._head.lstrip()
+            if not head or (len(head) < 3 and "```".startswith(head)):
+                return ""
+            self._started = True
+            self._head = ""
+            if not head.startswith("```"):
+                return self._push(head)
+            self._fenced = True
+            self._in_header = True
+            chunk = head
+
+        if self._in_header:
+            newline = chunk.find("\n")
+            if newline == -1:
+                return ""
+            chunk = chunk[newline + 1:]
+            self._in_header = False
+            self._in_lead = True
+
+        if self._in_lead:
+            chunk = chunk.lstrip()
+            if not chunk:
+                return ""
+            self._in_lead = False
+
+        return self._push(chunk)
+
+    def finish(self) -> str:
+        if not self._started:
+            return self._head.strip()
+        if self._in_header or self._in_lead:
+            return ""
+        tail = self._tail.rstrip()
+        if self._fenced:
+            line_start = self._last_line_start(tail)
+            if line_start is not None and tail[line_start:].strip() == "```":
+                tail = tail[:line_start].rstrip()
+        self._tail = ""
+        return tail
+
+    def _push(self, text: str) -> str:
+        self._tail += text
+        keep_from = len(self._tail.rstrip())
+        if self._fenced:
+            # Hold back a last line that may still turn into the closing fence
+            line_start = self._last_line_start(self._tail[:keep_from])
+            if line_start is not None and "```".startswith(self._tail[line_start:keep_from].strip()):
+                keep_from = len(self._tail[:line_start].rstrip())
+        out, self._tail = self._tail[:keep_from], self._tail[keep_from:]
+        if out:
+            self._emitted = True
+        return out
+
+    def _last_line_start(self, text: str) -> Optional[int]:
+        """Index where the last line of text starts, or None if it continues an emitted line."""
+        newline = text.rfind("\n")
+        if newline == -1:
+            return None if self._emitted else 0
+        return newline + 1
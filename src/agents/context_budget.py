@@ -0,0 +1,194 @@
+"""
+Token-budget-aware prompt assembly for the refine calls.
+
+After a few amend rounds the spec, outline, draft and feedback together can
+exceed what the model handles well. fit_context() counts the prompt tokens
+for the agent's model and, when they exceed the agent's
+`context_budget_tokens` (config.toml), reduces the lower-value inputs first:
+
+1. summarize: replace a markdown document by its outline (headings and the
+   first line under each)
+2. trim: cut the middle of a document, keeping its start and end
+
+The user feedback and anything not listed is never changed. The document
+being refined is never listed either: the model's answer replaces it, so a
+trimmed draft would silently lose its middle.
+"""
+import functools
+import logging
+from typing import Any, Callable, Dict, Optional, Sequence
+from langchain_core.language_models import BaseChatModel
+from src.agents.common import model_name
+from src.config import get_agent_config
+from src.metrics import REGISTRY, Counter
+from src.utils.markdown import iter_headings
+from src.utils.prompts import get_prompt
+
+logger = logging.getLogger(__name__)
+
+TRIM_MARKER = "\n\n…(中略)…\n\n"
+SUMMARY_LINE_CHARS = 200
+
+CONTEXT_TOKENS_SAVED = REGISTRY.register(Counter(
+    "mabg_context_tokens_saved_total", "Prompt tokens removed to fit the agent's context budget", ("agent",),
+))
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: str) -> Any:
+    """
+    tiktoken encoding for the model (o200k_base for models tiktoken does not
+    know), or None when tiktoken or its encoding file is unavailable.
+    """
+    try:
+        import tiktoken
+        try:
+            name = tiktoken.encoding_name_for_model(model.split("/")[-1])
+        except KeyError:
+            name = "o200k_base"
+        return tiktoken.get_encoding(name)
+    except Exception as e:  # ImportError, or the encoding file could not be downloaded
+        logger.warning("tiktoken unavailable for %s, estimating tokens from characters: %s", model, e)
+        return None
+
+@functools.lru_cache(maxsize=1024)
+def count_tokens(text: str, model: str) -> int:
+    """
+    Token count of text for the model. Results are cached: the same spec and
+    outline are counted again on every amend round.
+    """
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # About 4 ASCII characters per token; CJK text is close to one token per character
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+def summarize_markdown(text: str) -> str:
+    """
+    Outline of a markdown document: every heading with the first non-empty
+    line under it. Documents without headings are returned unchanged.
+    """
+    lines = text.splitlines()
+    headings = iter_headings(text)
+    if not headings:
+        return text
+    kept = []
+    for n, (index, _, _) in enumerate(headings):
+        kept.append(lines[index])
+        end = headings[n + 1][0] if n + 1 < len(headings) else len(lines)
+        first = next((line.strip() for line in lines[index + 1:end] if line.strip()), None)
+        if first:
+            kept.append(first[:SUMMARY_LINE_CHARS])
+    return "\n".join(kept)
+
+def trim_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cut the middle of text so that it fits in max_tokens, keeping its start and end."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    keep = max_tokens - count_tokens(TRIM_MARKER, model)
+    if keep <= 0:
+        return ""
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return _join_ends(tokens, keep, encoding.decode)
+    # Without a tokenizer, shrink by the character ratio until the estimate fits
+    chars = len(text) * keep // count_tokens(text, model)
+    while True:
+        trimmed = _join_ends(text, chars, "".join)
+        if chars == 0 or count_tokens(trimmed, model) <= max_tokens:
+            return trimmed
+        chars = chars * 9 // 10
+
+def _join_ends(items: Sequence[Any], keep: int, join: Any) -> str:
+    head, tail = keep - keep // 2, keep // 2
+    return join(items[:head]) + TRIM_MARKER + (join(items[-tail:]) if tail else "")
+
+def _context_budget(agent_name: str) -> int:
+    return int(get_agent_config(agent_name).get("context_budget_tokens") or 0)
+
+def _prompt_counter(
+    model: str, system_prompt_name: str, user_prompt_template: str, input_vars: Dict[str, Any],
+) -> Callable[[Dict[str, Any]], int]:
+    """Token count of the whole prompt for given input values."""
+    system_prompt, _ = get_prompt(system_prompt_name)
+    try:
+        template = user_prompt_template.format(**{key: "" for key in input_vars})
+    except (KeyError, IndexError):
+        template = user_prompt_template
+    overhead = count_tokens(system_prompt, model) + count_tokens(template, model)
+
+    def total(values: Dict[str, Any]) -> int:
+        return overhead + sum(count_tokens(str(value), model) for value in values.values() if value is not None)
+
+    return total
+
+def exceeds_budget(
+    agent_name: str,
+    llm: BaseChatModel,
+    system_prompt_name: str,
+    user_prompt_template: str,
+    input_vars: Dict[str, Any],
+    budget: Optional[int] = None,
+) -> bool:
+    """Whether the prompt is larger than the agent's context budget (never with no budget set)."""
+    if budget is None:
+        budget = _context_budget(agent_name)
+    if budget <= 0:
+        return False
+    total = _prompt_counter(model_name(llm), system_prompt_name, user_prompt_template, input_vars)
+    return total(input_vars) > budget
+
+def fit_context(
+    agent_name: str,
+    llm: BaseChatModel,
+    system_prompt_name: str,
+    user_prompt_template: str,
+    input_vars: Dict[str, Any],
+    summarize: Sequence[str] = (),
+    trim: Sequence[str] = (),
+    budget: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Return input_vars reduced to fit the agent's context budget.
+    `summarize` and `trim` name the inputs that may be reduced, lowest value first.
+    """
+    if budget is None:
+        budget = _context_budget(agent_name)
+    if budget <= 0:
+        return input_vars
+
+    model = model_name(llm)
+    total = _prompt_counter(model, system_prompt_name, user_prompt_template, input_vars)
+    original = total(input_vars)
+    if original <= budget:
+        return input_vars
+
+    fitted = dict(input_vars)
+    changed = []
+    for name in summarize:
+        if fitted.get(name):
+            summary = summarize_markdown(str(fitted[name]))
+            if summary != fitted[name]:
+                fitted[name] = summary
+                changed.append(f"{name}:summarized")
+                if total(fitted) <= budget:
+                    break
+    for name in trim:
+        excess = total(fitted) - budget
+        if excess <= 0:
+            break
+        if fitted.get(name):
+            value = str(fitted[name])
+            fitted[name] = trim_to_tokens(value, max(0, count_tokens(value, model) - excess), model)
+            changed.append(f"{name}:trimmed")
+
+    final = total(fitted)
+    CONTEXT_TOKENS_SAVED.inc(original - final, agent=agent_name)
+    logger.info(
+        "%s: prompt %d -> %d tokens (budget %d, saved %d; %s)",
+        agent_name, original, final, budget, original - final, ", ".join(changed) or "nothing reducible",
+    )
+    if final > budget:
+        logger.warning("%s: prompt still exceeds the context budget (%d > %d tokens)", agent_name, final, budget)
+    return fitted
@@ -0,0 +1,130 @@
+"""
+Typed article outline.
+
+The structure agent parses the model's Markdown outline (structure_doc, in the
+format of prompts/structure_generator.md) once with Outline.from_markdown(),
+validates it, and stores it in BlogSessionState["outline"] next to the
+Markdown. Downstream nodes use the sections from the state instead of
+parsing structure_doc again.
+"""
+import functools
+import re
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from src.utils.markdown import HEADING_TAG_RE, clean_heading, iter_headings, section_level, split_sections
+
+# Used by from_markdown() when the outline does not give a section length
+DEFAULT_TARGET_CHARS = 800
+
+TARGET_CHARS_RE = re.compile(r"(\d[\d,]*)\s*(?:文字|字|characters|chars)", re.IGNORECASE)
+GOAL_RE = re.compile(r"目的\**\s*[:：]\s*(.+)")
+BULLET_RE = re.compile(r"^\s*(?:[*\-+]|\d+\.)\s+")
+LABEL_RE = re.compile(r"^\*\*[^*]+\*\*\s*[:：]\s*")  # "**含めるべき要素**:"
+
+class OutlineSection(BaseModel):
+    """One section of the article, in the order of the article."""
+
+    title: str = Field(min_length=1, description="セクションの見出し (H2)")
+    goal: str = Field(description="このセクションの目的: 読者に何を伝えるか")
+    target_chars: int = Field(gt=0, le=20000, description="本文の目安の文字数")
+    points: List[str] = Field(default_factory=list, description="含めるべき要素。H3 にする場合は 'H3: 見出し' と書く")
+
+    def to_markdown(self) -> str:
+        lines = [
+            f"### H2: {self.title}",
+            f"*   **このセクションの目的**: {self.goal}",
+            f"*   **目安の文字数**: 約{self.target_chars}文字",
+        ]
+        if self.points:
+            lines.append("*   **含めるべき要素**:")
+            lines.extend(f"    *   {point}" for point in self.points)
+        return "\n".join(lines)
+
+class Outline(BaseModel):
+    """記事構成案: 導入とまとめを含む、記事の順のセクション一覧。"""
+
+    title: str = Field(description="SEO キーワードを含む記事タイトル案")
+    sections: List[OutlineSection] = Field(min_length=2, description="導入 (Lead) とまとめ (Conclusion) を含む、記事の順のセクション")
+
+    @model_validator(mode="after")
+    def _unique_titles(self) -> "Outline":
+        titles = [section.title for section in self.sections]
+        duplicates = sorted({title for title in titles if titles.count(title) > 1})
+        if duplicates:
+            raise ValueError(f"duplicate section titles: {', '.join(duplicates)}")
+        return self
+
+    @functools.cached_property
+    def _index(self) -> Dict[str, int]:
+        return {section.title: i for i, section in enumerate(self.sections)}
+
+    def section(self, title: str) -> Optional[OutlineSection]:
+        """The section with this title (with or without an "H2:" marker)."""
+        i = self._index.get(clean_heading(title))
+        return self.sections[i] if i is not None else None
+
+    def to_markdown(self) -> str:
+        """The outline in the format of prompts/structure_generator.md."""
+        parts = ["# 記事構成案", f"## 記事タイトル案\n{self.title}", "## 構成案"]
+        parts.extend(section.to_markdown() for section in self.sections)
+        return "\n\n".join(parts) + "\n"
+
+    @classmethod
+    def from_markdown(cls, markdown: str) -> "Outline":
+        """
+        Parse an outline written in Markdown. Raises ValidationError when it
+        does not have the sections an outline needs.
+        """
+        _, sections = split_sections(markdown, _outline_level(markdown))
+        return cls(
+            title=_article_title(markdown),
+            sections=[_parse_section(section.title, section.text) for section in sections],
+        )
+
+def load_outline(data: Optional[Dict[str, Any]]) -> Optional[Outline]:
+    """The Outline of BlogSessionState["outline"] (stored as a plain dict)."""
+    return Outline.model_validate(data) if data else None
+
+def parse_outline(markdown: str) -> Optional[Outline]:
+    try:
+        return Outline.from_markdown(markdown)
+    except ValidationError:
+        return None
+
+def _outline_level(markdown: str) -> Optional[int]:
+    # The sections are the headings tagged "H2:" when the outline uses the tags,
+    # else the headings right under "## 構成案" (prompts/structure_generator.md)
+    headings = iter_headings(markdown)
+    tagged = [level for _, level, title in headings if HEADING_TAG_RE.match(title)]
+    if tagged:
+        return min(tagged)
+    for (_, level, title), (_, next_level, _) in zip(headings, headings[1:]):
+        if title.strip() == "構成案" and next_level > level:
+            return next_level
+    return section_level(markdown)
+
+def _article_title(markdown: str) -> str:
+    lines = [line.strip() for line in markdown.splitlines()]
+    for i, line in enumerate(lines):
+        if line.startswith("#") and "タイトル" in line:
+            return next((_strip_bullet(candidate) for candidate in lines[i + 1:] if candidate and not candidate.startswith("#")), "")
+    return next((candidate.lstrip("# ").strip() for candidate in lines if candidate.startswith("# ") and "構成案" not in candidate), "")
+
+def _parse_section(title: str, text: str) -> OutlineSection:
+    goal = ""
+    target_chars = DEFAULT_TARGET_CHARS
+    points = []
+    for line in text.splitlines()[1:]:
+        line = _strip_bullet(line)
+        goal_match = GOAL_RE.search(line)
+        length_match = TARGET_CHARS_RE.search(line) if "文字数" in line else None
+        if goal_match and not goal:
+            goal = goal_match.group(1).strip()
+        elif length_match:
+            target_chars = int(length_match.group(1).replace(",", ""))
+        elif point := LABEL_RE.sub("", line):
+            points.append(point)
+    return OutlineSection(title=clean_heading(title), goal=goal or (points.pop(0) if points else ""), target_chars=target_chars, points=points)
+
+def _strip_bullet(line: str) -> str:
+    return BULLET_RE.sub("", line).strip()
@@ -1,60 +1,68 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 from src.state import BlogSessionState
-from src.config import get_llm
-from src.agents.common import run_agent_chain
+from src.config import get_agent_llm
+from src.agents.common import arun_agent_chain
+from src.agents.context_budget import fit_context
 
-# Initialize LLM with configuration
-llm = get_llm("spec_agent")
+# The LLM client is built on first use (see get_agent_llm)
+AGENT_NAME = "spec_agent"
 
-def spec_agent_node(state: BlogSessionState) -> BlogSessionState:
+GENERATE_TEMPLATE = "以下のトピック（または要望）に基づいて、記事要求仕様書を作成してください。\n\nトピック: {topic}"
+REFINE_TEMPLATE = "以下の現在の仕様書とユーザーフィードバックに基づいて、記事要求仕様書を修正・再生成してください。\n\nトピック: {topic}\n\n現在の仕様書:\n{current_spec}\n\nユーザーフィードバック:\n{feedback}"
+
+async def aspec_agent_node(state: BlogSessionState) -> BlogSessionState:
     """
     [REQ-FUN-011] 仕様案の提示: トピックに基づいて仕様案を生成する。
     [REQ-FUN-012] 仕様案の修正: ユーザーフィードバックに基づいて仕様案を修正する。
+    [REQ-PER-001] LLM 待ちの間もイベントループをブロックしない。
     """
     topic = state.get("topic")
     user_feedback = state.get("user_feedback")
     current_spec = state.get("spec_doc")
 
     if user_feedback and current_spec:
-        # Refinement flow
-        return _refine_spec(topic, current_spec, user_feedback)
+        return await _arefine_spec(topic, current_spec, user_feedback)
     else:
-        # Generation flow
-        return _generate_spec(topic)
+        return await _agenerate_spec(topic)
 
-def _generate_spec(topic: Optional[str]) -> BlogSessionState:
+async def _agenerate_spec(topic: Optional[str]) -> BlogSessionState:
     # [REQ-FUN-011] 仕様案の提示
     if not topic:
         return {"spec_doc": "Error: Topic is missing.", "phase": "Spec", "user_feedback": None}
 
-    spec_doc = run_agent_chain(
-        llm=llm,
+    spec_doc = await arun_agent_chain(
+        llm=get_agent_llm(AGENT_NAME),
         system_prompt_name="spec_generator",
-        user_prompt_template="以下のトピック（または要望）に基づいて、記事要求仕様書を作成してください。\n\nトピック: {topic}",
+        user_prompt_template=GENERATE_TEMPLATE,
         input_vars={"topic": topic}
     )
-    
+
     return {
         "spec_doc": spec_doc,
         "phase": "Spec",
         "user_feedback": None
     }
 
-def _refine_spec(topic: Optional[str], current_spec: str, feedback: str) -> BlogSessionState:
+async def _arefine_spec(topic: Optional[str], current_spec: str, feedback: str) -> BlogSessionState:
     # [REQ-FUN-012] 仕様案の修正
-    updated_spec = run_agent_chain(
+    llm = get_agent_llm(AGENT_NAME)
+    updated_spec = await arun_agent_chain(
         llm=llm,
         system_prompt_name="spec_generator",
-        user_prompt_template="以下の現在の仕様書とユーザーフィードバックに基づいて、記事要求仕様書を修正・再生成してください。\n\nトピック: {topic}\n\n現在の仕様書:\n{current_spec}\n\nユーザーフィードバック:\n{feedback}",
-        input_vars={
-            "topic": topic,
-            "current_spec": current_spec,
-            "feedback": feedback
-        }
+        user_prompt_template=REFINE_TEMPLATE,
+        input_vars=_refine_inputs(llm, topic, current_spec, feedback)
     )
 
     return {
         "spec_doc": updated_spec,
         "phase": "Spec",
-        "user_feedback": None # Feedback handled, reset
+        "user_feedback": None
     }
+
+def _refine_inputs(llm, topic: Optional[str], current_spec: str, feedback: str) -> Dict[str, Any]:
+    # Nothing here may be reduced: the answer replaces the current spec, so a
+    # trimmed spec would lose its middle. Over the budget it is sent whole (with a warning).
+    return fit_context(
+        AGENT_NAME, llm, "spec_generator", REFINE_TEMPLATE,
+        {"topic": topic, "current_spec": current_spec, "feedback": feedback},
+    )
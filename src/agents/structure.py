@@ -1,12 +1,32 @@
-from typing import Optional
+import logging
+from typing import Any, Dict, Optional
+from pydantic import ValidationError
 from src.state import BlogSessionState
-from src.config import get_llm
-from src.agents.common import run_agent_chain
+from src.config import get_agent_llm
+from src.agents.common import arun_agent_chain, full_user_template
+from src.agents.context_budget import fit_context
+from src.agents.outline import Outline
+from src.utils.markdown import iter_headings
+from src.metrics import REGISTRY, Counter
 
-# Initialize LLM with configuration
-llm = get_llm("structure_agent")
+logger = logging.getLogger(__name__)
 
-def structure_agent_node(state: BlogSessionState) -> BlogSessionState:
+# The LLM client is built on first use (see get_agent_llm)
+AGENT_NAME = "structure_agent"
+
+# Outline requests per generate/refine call; the last answer is kept even when it fails validation
+OUTLINE_ATTEMPTS = 2
+
+OUTLINE_ERRORS = REGISTRY.register(Counter(
+    "mabg_outline_errors_total", "Malformed outlines caught by the structure agent",
+))
+
+# The approved spec comes first so that generate and refine calls share a cacheable prefix
+CONTEXT_TEMPLATE = "記事要求仕様書:\n{spec_doc}"
+GENERATE_TEMPLATE = "上記の記事要求仕様書に基づいて、記事構成案を作成してください。"
+REFINE_TEMPLATE = "現在の構成案:\n{current_structure}\n\nユーザーフィードバック:\n{feedback}\n\n上記の仕様書、現在の構成案、およびユーザーフィードバックに基づいて、記事構成案を修正してください。"
+
+async def astructure_agent_node(state: BlogSessionState) -> BlogSessionState:
     """
     [REQ-FUN-020] 構成案の提示
     [REQ-FUN-021] 構成案の修正
@@ -16,43 +36,78 @@ def structure_agent_node(state: BlogSessionState) -> BlogSessionState:
     current_structure = state.get("structure_doc")
 
     if user_feedback and current_structure:
-        return _refine_structure(spec_doc, current_structure, user_feedback)
+        return await _arefine_structure(spec_doc, current_structure, user_feedback)
     else:
-        return _generate_structure(spec_doc)
+        return await _agenerate_structure(spec_doc)
 
-def _generate_structure(spec_doc: Optional[str]) -> BlogSessionState:
+async def _agenerate_structure(spec_doc: Optional[str]) -> BlogSessionState:
     # [REQ-FUN-020] 構成案の生成
     if not spec_doc:
-         return {"structure_doc": "Error: Spec is missing.", "phase": "Structure", "user_feedback": None}
+        return {"structure_doc": "Error: Spec is missing.", "outline": None, "outline_error": "Spec is missing.", "phase": "Structure", "user_feedback": None}
 
-    structure_doc = run_agent_chain(
-        llm=llm,
+    return await _arun_outline_chain(
+        llm=get_agent_llm(AGENT_NAME),
         system_prompt_name="structure_generator",
-        user_prompt_template="以下の記事要求仕様書に基づいて、記事構成案を作成してください。\n\n記事要求仕様書:\n{spec_doc}",
-        input_vars={"spec_doc": spec_doc}
+        user_prompt_template=GENERATE_TEMPLATE,
+        input_vars={"spec_doc": spec_doc},
+        context_template=CONTEXT_TEMPLATE
     )
-    
-    return {
-        "structure_doc": structure_doc,
-        "phase": "Structure",
-        "user_feedback": None
-    }
 
-def _refine_structure(spec_doc: Optional[str], current_structure: str, feedback: str) -> BlogSessionState:
+async def _arefine_structure(spec_doc: Optional[str], current_structure: str, feedback: str) -> BlogSessionState:
     # [REQ-FUN-021] 構成案の修正
-    updated_structure = run_agent_chain(
+    llm = get_agent_llm(AGENT_NAME)
+    return await _arun_outline_chain(
         llm=llm,
         system_prompt_name="structure_generator",
-        user_prompt_template="以下の仕様書、現在の構成案、およびユーザーフィードバックに基づいて、記事構成案を修正してください。\n\n記事要求仕様書:\n{spec_doc}\n\n現在の性案:\n{current_structure}\n\nユーザーフィードバック:\n{feedback}",
-        input_vars={
-            "spec_doc": spec_doc,
-            "current_structure": current_structure,
-            "feedback": feedback
-        }
+        user_prompt_template=REFINE_TEMPLATE,
+        input_vars=_refine_inputs(llm, spec_doc, current_structure, feedback),
+        context_template=CONTEXT_TEMPLATE
+    )
+
+def _refine_inputs(llm, spec_doc: Optional[str], current_structure: str, feedback: str) -> Dict[str, Any]:
+    # Only the spec gives way: reduced to its outline, then trimmed. The current
+    # structure is replaced by the answer, so it is sent whole even over the budget.
+    return fit_context(
+        AGENT_NAME, llm, "structure_generator", full_user_template(REFINE_TEMPLATE, CONTEXT_TEMPLATE),
+        {"spec_doc": spec_doc, "current_structure": current_structure, "feedback": feedback},
+        summarize=("spec_doc",),
+        trim=("spec_doc",),
     )
 
+async def _arun_outline_chain(**chain_kwargs: Any) -> BlogSessionState:
+    """
+    Ask for a Markdown outline and parse it into an Outline, asking once more
+    when its sections fail validation. Malformed outlines are caught here,
+    before the writing phase. structure_doc keeps the model's Markdown (title
+    candidates and notes included); the parsed Outline is stored next to it.
+    When the last answer is still malformed, outline_error tells the reviewer
+    why, and the outline has to be amended before it can be approved.
+    """
+    outline: Optional[Outline] = None
+    error: Optional[str] = None
+    for attempt in range(1, OUTLINE_ATTEMPTS + 1):
+        structure_doc = await arun_agent_chain(**chain_kwargs)
+        try:
+            outline = Outline.from_markdown(structure_doc)
+            error = None
+            break
+        except ValidationError as e:
+            OUTLINE_ERRORS.inc()
+            error = _describe(e)
+            logger.warning("%s returned an invalid outline (attempt %d/%d): %s", AGENT_NAME, attempt, OUTLINE_ATTEMPTS, e)
+        if not iter_headings(structure_doc):
+            break  # Not an outline at all; asking again would not help
     return {
-        "structure_doc": updated_structure,
+        "structure_doc": structure_doc,
+        "outline": outline.model_dump() if outline else None,
+        "outline_error": error,
         "phase": "Structure",
         "user_feedback": None
     }
+
+def _describe(error: ValidationError) -> str:
+    """The validation errors in one line, e.g. "sections: List should have at least 2 items ..."."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" if item["loc"] else item["msg"]
+        for item in error.errors()
+    )
@@ -1,13 +1,52 @@
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
 from src.state import BlogSessionState
-from src.config import get_llm
-from src.agents.common import run_agent_chain
+from src.config import get_agent_config, get_agent_llm
+from src.agents.common import arun_agent_chain, full_user_template
+from src.agents.context_budget import exceeds_budget, fit_context
+from src.agents.outline import load_outline
+from src.utils.markdown import Section, clean_heading, join_sections, split_sections, top_section_level
 
-# Initialize LLM for this agent
-llm = get_llm("writing_agent")
+logger = logging.getLogger(__name__)
 
-def writing_agent_node(state: BlogSessionState) -> BlogSessionState:
+# The LLM client is built on first use (see get_agent_llm)
+AGENT_NAME = "writing_agent"
+
+# Approved spec and outline first, in a fixed order: all writing calls of a session
+# (including the parallel section calls) share them as a cacheable prompt prefix
+CONTEXT_TEMPLATE = "Specification:\n{spec_doc}\n\nArticle Structure:\n{structure_doc}"
+GENERATE_TEMPLATE = "Please write the article."
+SECTION_TEMPLATE = "Write only section {index} of {total} of the article, following this part of the structure:\n{section_outline}\n\n{title_instruction}Start the section with the heading line \"## {section_title}\" and output only this section."
+TITLE_INSTRUCTION = "This is the first section: begin with the article title as a level-1 heading (# ...), then write the section. "
+REFINE_TEMPLATE = "Current Draft:\n{current_article}\n\nUser Feedback:\n{feedback}\n\nPlease revise the article."
+REFINE_SECTION_TEMPLATE = "Current Section:\n{current_section}\n\nUser Feedback:\n{feedback}\n\nRevise only this section according to the feedback. Keep its heading line \"{heading}\" and output only the revised section."
+
+# Feedback that refers to a section by number: "section 3", "the 3rd section", "セクション3",
+# "第3章", "3番目の見出し". The number must be tied to a section noun: "3つ目の例" or
+# "2番目の段落" are about something inside a section, not a section number.
+SECTION_NUMBER_RE = re.compile(
+    r"(?<![a-z])(?:section|sec\.)\s*(\d+)"
+    r"|(?<![a-z])(\d+)(?:st|nd|rd|th)\s+section"
+    r"|(?:セクション|見出し)\s*(\d+)"
+    r"|第\s*(\d+)\s*(?:章|節|セクション|見出し)"
+    r"|(\d+)\s*(?:番目|つ目)\s*の?\s*(?:セクション|見出し|章|節)",
+    re.IGNORECASE,
+)
+# Feedback about the whole article always triggers full regeneration. English words
+# match as whole words ("tone", not "milestone"); Japanese has no word boundaries, so
+# only phrases about the article as a whole are listed (not a bare "全て")
+GLOBAL_FEEDBACK_RE = re.compile(
+    r"(?<![a-z])(?:whole|entire|overall|throughout|all sections|tone)(?![a-z])"
+    r"|全体(?!像)|全セクション|(?:全て|すべて|全部)の(?:セクション|見出し|章|節)"
+    r"|(?<![ァ-ヺー])トーン(?![ァ-ヺー])|文体|語尾",
+    re.IGNORECASE,
+)
+
+async def awriting_agent_node(state: BlogSessionState) -> BlogSessionState:
     """
-    [REQ-FUN-030] 記事執筆エージェントのノード関数
+    [REQ-FUN-030] 記事執筆エージェントのノード関数。
     """
     feedback = state.get("user_feedback")
     spec_doc = state.get("spec_doc") or ""
@@ -15,33 +54,184 @@ def writing_agent_node(state: BlogSessionState) -> BlogSessionState:
     current_article = state.get("final_article") or ""
 
     if feedback and current_article:
-        # Refine existing article based on feedback
-        new_article = _refine_article(current_article, feedback, spec_doc, structure_doc)
+        new_article = await _arefine_article(current_article, feedback, spec_doc, structure_doc)
+    elif get_agent_config(AGENT_NAME).get("parallel_sections"):
+        new_article = await _agenerate_article_by_sections(spec_doc, structure_doc, state.get("outline"))
     else:
-        # Generate new article
-        new_article = _generate_article(spec_doc, structure_doc)
+        new_article = await _agenerate_article(spec_doc, structure_doc)
 
     return {"final_article": new_article, "phase": "Writing", "user_feedback": None}
 
-def _generate_article(spec_doc: str, structure_doc: str) -> str:
+async def _agenerate_article(spec_doc: str, structure_doc: str) -> str:
     # [REQ-FUN-030] 記事本文の執筆
-    return run_agent_chain(
-        llm=llm,
+    return await arun_agent_chain(
+        llm=get_agent_llm(AGENT_NAME),
         system_prompt_name="writing_generator",
-        user_prompt_template="Specification:\n{spec_doc}\n\nArticle Structure:\n{structure_doc}\n\nPlease write the article.",
-        input_vars={"spec_doc": spec_doc, "structure_doc": structure_doc}
+        user_prompt_template=GENERATE_TEMPLATE,
+        input_vars={"spec_doc": spec_doc, "structure_doc": structure_doc},
+        context_template=CONTEXT_TEMPLATE
     )
 
-def _refine_article(current_article: str, feedback: str, spec_doc: str, structure_doc: str) -> str:
-    # [REQ-FUN-031] 最終確認・承認（の修正フロー）
-    return run_agent_chain(
+async def _agenerate_article_by_sections(spec_doc: str, structure_doc: str, outline_data: Optional[Dict[str, Any]] = None) -> str:
+    """
+    [REQ-FUN-030] 構成案の見出しごとにセクションを並行執筆し、構成案の順に結合する。
+    同時実行数は max_parallel_sections で制限する。見出しが2つ未満なら一括執筆にフォールバック。
+    """
+    sections = _outline_sections(structure_doc, outline_data)
+    if len(sections) < 2:
+        return await _agenerate_article(spec_doc, structure_doc)
+
+    semaphore = asyncio.Semaphore(int(get_agent_config(AGENT_NAME).get("max_parallel_sections", 4)))
+
+    async def write_section(index: int, section_outline: str, section_title: str) -> str:
+        async with semaphore:
+            return await arun_agent_chain(
+                llm=get_agent_llm(AGENT_NAME),
+                system_prompt_name="writing_generator",
+                user_prompt_template=SECTION_TEMPLATE,
+                input_vars={
+                    "spec_doc": spec_doc,
+                    "structure_doc": structure_doc,
+                    "index": index,
+                    "total": len(sections),
+                    "section_outline": section_outline,
+                    "section_title": section_title,
+                    "title_instruction": TITLE_INSTRUCTION if index == 1 else "",
+                },
+                context_template=CONTEXT_TEMPLATE
+            )
+
+    # Results keep the outline order regardless of completion order
+    written = await _gather_or_cancel([
+        write_section(i, section_outline, section_title)
+        for i, (section_outline, section_title) in enumerate(sections, start=1)
+    ])
+    return "\n\n".join(part.strip() for part in written)
+
+async def _gather_or_cancel(calls: List[Awaitable[str]]) -> List[str]:
+    """
+    Run the section calls concurrently, in order. When one fails, the others
+    are cancelled (freeing their scheduler slots) before its error is raised:
+    the article is not assembled from a partial set of sections.
+    """
+    tasks = [asyncio.ensure_future(call) for call in calls]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+def _outline_sections(structure_doc: str, outline_data: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    (outline, title) per section: from the structure agent's validated outline,
+    or by splitting structure_doc at its headings for states without one.
+    """
+    outline = load_outline(outline_data)
+    if outline is not None:
+        return [(section.to_markdown(), section.title) for section in outline.sections]
+    _, sections = split_sections(structure_doc)
+    return [(section.text.strip(), clean_heading(section.title)) for section in sections]
+
+async def _arefine_article(current_article: str, feedback: str, spec_doc: str, structure_doc: str) -> str:
+    """
+    [REQ-FUN-031] フィードバックが特定のセクションを指している場合はそのセクションだけを書き直し、
+    元の記事に差し戻す。対象外のセクションはバイト単位で変更しない。
+    全体へのフィードバックや対象が特定できない場合は記事全体を再生成する。
+    """
+    preamble, sections = split_sections(current_article, top_section_level(current_article))
+    targets = _target_sections(feedback, sections)
+    if not targets or len(targets) == len(sections):
+        return await _arefine_article_full(current_article, feedback, spec_doc, structure_doc)
+    return await _arefine_sections(preamble, sections, targets, feedback, spec_doc, structure_doc)
+
+async def _arefine_sections(
+    preamble: str, sections: List[Section], targets: List[int], feedback: str, spec_doc: str, structure_doc: str,
+) -> str:
+    """Rewrite the target sections in parallel and put them back into the article."""
+
+    async def rewrite(section: Section) -> str:
+        heading = section.text.splitlines()[0]
+        llm = get_agent_llm(AGENT_NAME)
+        return await arun_agent_chain(
+            llm=llm,
+            system_prompt_name="writing_generator",
+            user_prompt_template=REFINE_SECTION_TEMPLATE,
+            input_vars=_refine_inputs(llm, REFINE_SECTION_TEMPLATE, {
+                "spec_doc": spec_doc,
+                "structure_doc": structure_doc,
+                "current_section": section.text.strip(),
+                "feedback": feedback,
+                "heading": heading,
+            }),
+            context_template=CONTEXT_TEMPLATE
+        )
+
+    rewritten = await _gather_or_cancel([rewrite(sections[i]) for i in targets])
+    for i, text in zip(targets, rewritten):
+        section = sections[i]
+        # Keep the whitespace that separated the section from the next one
+        trailing = section.text[len(section.text.rstrip()):]
+        sections[i] = section._replace(text=text.strip() + trailing)
+    return join_sections(preamble, sections)
+
+def _target_sections(feedback: str, sections: List[Section]) -> List[int]:
+    """
+    Indices of the sections the feedback refers to, by number ("section 3")
+    or by heading title. Empty when the feedback is global or unspecific, or
+    when a section number does not exist in the article (ambiguous): the
+    caller then refines the whole article.
+    """
+    if len(sections) < 2:
+        return []
+    lowered = feedback.casefold()
+    if GLOBAL_FEEDBACK_RE.search(feedback):
+        return []
+
+    targets = set()
+    for match in SECTION_NUMBER_RE.finditer(feedback):
+        number = int(next(group for group in match.groups() if group))
+        if not 1 <= number <= len(sections):
+            return []
+        targets.add(number - 1)
+    for i, section in enumerate(sections):
+        title = clean_heading(section.title).casefold()
+        if len(title) >= 2 and title in lowered:
+            targets.add(i)
+    return sorted(targets)
+
+async def _arefine_article_full(current_article: str, feedback: str, spec_doc: str, structure_doc: str) -> str:
+    llm = get_agent_llm(AGENT_NAME)
+    input_vars = _refine_inputs(llm, REFINE_TEMPLATE, {
+        "spec_doc": spec_doc,
+        "structure_doc": structure_doc,
+        "current_article": current_article,
+        "feedback": feedback
+    })
+    if exceeds_budget(AGENT_NAME, llm, "writing_generator", full_user_template(REFINE_TEMPLATE, CONTEXT_TEMPLATE), input_vars):
+        # The draft alone is over the budget: refine it one section at a time
+        # (a single-section article is sent whole)
+        preamble, sections = split_sections(current_article, top_section_level(current_article))
+        if len(sections) > 1:
+            logger.warning("%s: article exceeds the context budget, refining its %d sections separately", AGENT_NAME, len(sections))
+            return await _arefine_sections(preamble, sections, list(range(len(sections))), feedback, spec_doc, structure_doc)
+    return await arun_agent_chain(
         llm=llm,
         system_prompt_name="writing_generator",
-        user_prompt_template="Specification:\n{spec_doc}\n\nArticle Structure:\n{structure_doc}\n\nCurrent Draft:\n{current_article}\n\nUser Feedback:\n{feedback}\n\nPlease revise the article.",
-        input_vars={
-            "spec_doc": spec_doc,
-            "structure_doc": structure_doc,
-            "current_article": current_article,
-            "feedback": feedback
-        }
+        user_prompt_template=REFINE_TEMPLATE,
+        input_vars=input_vars,
+        context_template=CONTEXT_TEMPLATE
+    )
+
+def _refine_inputs(llm, user_prompt_template: str, input_vars: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fit a refine prompt into the writing agent's context budget. The draft
+    already reflects the spec and outline, so only those are reduced; the draft
+    itself is replaced by the answer and is never cut.
+    """
+    return fit_context(
+        AGENT_NAME, llm, "writing_generator", full_user_template(user_prompt_template, CONTEXT_TEMPLATE), input_vars,
+        summarize=("spec_doc", "structure_doc"),
+        trim=("spec_doc", "structure_doc"),
     )
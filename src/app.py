@@ -1,20 +1,111 @@
-import uuid
+import asyncio
+import logging
+import os
+from typing import cast
 import chainlit as cl
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
-from src.graph import app_graph
+from src.graph import get_app_graph
+from src.config import load_config, warm_up_llm_connections
+from src.metrics import mount_metrics_endpoint
+from src.agents.common import StreamingFenceCleaner
+from src.state import BlogSessionState
+from src.utils.prompts import preload_prompts
+from src.watchdog import start_watchdog
+from src import artifact_view, memory_profile, session_tasks, speculation, workers
+
+logger = logging.getLogger(__name__)
+
+# Graph nodes whose LLM tokens are streamed into the chat
+STREAMED_NODES = ("spec_agent", "structure_agent", "writing_agent")
+
+# Phase -> node that produced the phase's artifact
+PHASE_NODES = {"Spec": "spec_agent", "Structure": "structure_agent", "Writing": "writing_agent"}
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+_background_tasks: set = set()
+
+def _mount_metrics() -> None:
+    """
+    Expose Prometheus metrics next to the Chainlit UI ([metrics] in config.toml).
+    """
+    settings = load_config().get("metrics", {})
+    if not settings.get("enabled", False):
+        return
+    try:
+        from chainlit.server import app as server
+    except ImportError:
+        # Not running under the Chainlit server (e.g. tests)
+        return
+    mount_metrics_endpoint(server, settings.get("path", "/metrics"))
+
+def _mount_memory_endpoint() -> None:
+    """
+    Expose the per-session memory report next to the Chainlit UI ([memory] in config.toml).
+    """
+    settings = load_config().get("memory", {})
+    if not settings.get("enabled", False):
+        return
+    try:
+        from chainlit.server import app as server
+    except ImportError:
+        return
+    checkpointer = get_app_graph().checkpointer
+    memory_profile.mount_memory_endpoint(
+        server,
+        checkpointer if isinstance(checkpointer, BaseCheckpointSaver) else None,
+        settings.get("admin_path", "/admin/memory"),
+        int(settings.get("top_sessions", 20)),
+        token=os.environ.get("MABG_ADMIN_TOKEN") or None,
+        allow_loopback=bool(settings.get("allow_loopback", False)),
+    )
+
+@cl.on_app_startup
+def on_app_startup():
+    """
+    Load all prompt files once so that no prompt is read from disk on the request path,
+    and open the graph's checkpointer before the first chat does.
+    """
+    preload_prompts()
+    start_watchdog()
+    _mount_metrics()
+    _mount_memory_endpoint()
+    memory_profile.start_memory_policy(get_app_graph().checkpointer)
+    workers.start_worker_pool()
 
 @cl.on_chat_start
 async def start():
     """
     [REQ-FUN-001] セッション開始
     """
-    cl.user_session.set("graph", app_graph)
-    # Create a unique thread ID for checkpointer
-    thread_id = str(uuid.uuid4())
+    cl.user_session.set("graph", get_app_graph())
+    # Chainlit's thread ID doubles as the checkpointer thread, so a resumed chat
+    # (possibly on another worker process) finds its persisted graph state.
+    thread_id = cl.context.session.thread_id
     cl.user_session.set("thread_id", thread_id)
     
+    # Open LLM connections while the user is typing the topic (opt-in: [http] warm_up)
+    task = asyncio.create_task(warm_up_llm_connections())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    
     await cl.Message(content="Hello! MABG is running. Please enter a topic.").send()
 
+@cl.on_chat_resume
+async def resume(thread: cl.types.ThreadDict):
+    """
+    チャット再開: 永続化されたチェックポイントからレビュー待ちの成果物を再表示する。
+    """
+    app_graph = get_app_graph()
+    cl.user_session.set("graph", app_graph)
+    cl.user_session.set("thread_id", thread["id"])
+    # The messages of the previous connection are not ours to update
+    artifact_view.discard_view(thread["id"])
+
+    state_snapshot = await app_graph.aget_state({"configurable": {"thread_id": thread["id"]}})
+    if state_snapshot.next:
+        await _show_output_and_actions(state_snapshot.values, state_snapshot.next)
+
 @cl.on_message
 async def main(message: cl.Message):
     """
@@ -29,23 +120,88 @@ async def main(message: cl.Message):
     # Assuming standard flow: User inputs topic -> Graph runs -> Interrupt -> User action.
     
     inputs = {"topic": message.content}
+    # A new topic makes any speculative next phase obsolete, and its artifacts are new messages
+    speculation.cancel_speculation(thread_id)
+    artifact_view.discard_view(thread_id)
     
-    # Run the graph until the first interruption
+    # Run the graph until the first interruption; a run still going for the previous topic is cancelled
     # [REQ-PER-001] ローカルレスポンス: 非同期実行(astream/ainvoke)によりUIブロックしない
-    async for event in graph.astream(inputs, config, stream_mode="values"):
-         # We can stream intermediate outputs if needed, or just wait for finish/interrupt
-         pass
+    msg = await session_tasks.run(thread_id, lambda run_config: _stream_graph(graph, inputs, run_config), config)
+    if msg is None:
+        return  # Superseded by a newer message or action
     
     # Retrieve current state to decide what to show
-    state_snapshot = graph.get_state(config)
+    state_snapshot = await graph.aget_state(config)
     current_state = state_snapshot.values
     next_step = state_snapshot.next
     
     # Show output based on phase
-    await cl.Message(content=f"DEBUG: Next={next_step}, Phase={current_state.get('phase')}").send()
-    await _show_output_and_actions(current_state, next_step)
+    logger.debug("Next=%s, Phase=%s", next_step, current_state.get("phase"))
+    await _show_output_and_actions(current_state, next_step, msg)
+    _speculate(thread_id, current_state, next_step)
+
+async def _stream_graph(graph, inputs, config) -> cl.Message:
+    """
+    [REQ-PER-001] graph.astream を messages モードで実行し、LLM のトークンを
+    到着順に cl.Message へ流し込む。コードフェンスは逐次除去する。
+    メッセージは LLM の応答を待たずに送信し、即座に反応を返す。
+    返したメッセージは、成果物をセクション単位で表示した後に _show_output_and_actions が削除する。
+    """
+    msg = cl.Message(content="")
+    # Show the (empty, loading) message right away instead of after the LLM's first token
+    await msg.send()
+    cleaner = StreamingFenceCleaner()
+    current_node = None
+    streamed_id = None
+
+    async for node, stream_id, text in _graph_tokens(graph, inputs, config):
+        if node not in STREAMED_NODES:
+            continue
+        if node != current_node:
+            # New agent run: start a fresh cleaner for its output
+            current_node = node
+            streamed_id = stream_id
+            cleaner = StreamingFenceCleaner()
+        if stream_id != streamed_id:
+            # Concurrent LLM calls in one node (e.g. parallel sections): stream only the first,
+            # the full result is shown once the node finishes.
+            continue
+        if text is None:
+            cleaner = StreamingFenceCleaner()
+            msg.content = ""
+            await msg.update()
+            continue
+        token = cleaner.feed(text)
+        if token:
+            await msg.stream_token(token)
+
+    return msg
+
+async def _graph_tokens(graph, inputs, config):
+    """
+    (node, LLM call id, text) of the LLM output streamed by the graph run. With
+    [workers] enabled the agents run in worker processes, and their output
+    arrives as custom stream events (src/workers.py); text is None when a
+    retried job starts its output over.
+    """
+    if not workers.is_enabled():
+        async for chunk, metadata in graph.astream(inputs, config, stream_mode="messages"):
+            yield metadata.get("langgraph_node"), chunk.id, chunk.text
+        return
+    async for mode, payload in graph.astream(inputs, config, stream_mode=["messages", "custom"]):
+        if mode == "custom":
+            yield payload.get("node"), "worker", None if payload.get("restart") else payload.get("token", "")
+        else:
+            chunk, metadata = payload
+            yield metadata.get("langgraph_node"), chunk.id, chunk.text
 
-async def _show_output_and_actions(state: dict, next_step: tuple):
+async def _show_output_and_actions(state: dict, next_step: tuple, msg: cl.Message | None = None):
+    """
+    Show the phase's artifact and the review buttons. The artifact is shown as
+    one message per section, and a revision only updates the sections that
+    changed (src/artifact_view.py). msg is the run's streamed output, which the
+    artifact replaces.
+    """
     phase = state.get("phase")
     content = _format_response(state)
     
@@ -53,20 +209,42 @@ async def _show_output_and_actions(state: dict, next_step: tuple):
     
     # If waiting for human review
     if next_step and "human_review" in next_step:
-        actions = [
-            cl.Action(name="approve", label="Approve (Next Phase)", payload={"value": "approve"}),
-            cl.Action(name="amend", label="Amend (Feedback)", payload={"value": "amend"})
-        ]
+        actions = _review_actions(state)
     
-    msg_content = f"**Phase: {phase}**\n\n{content}"
+    view = artifact_view.get_view(cl.user_session.get("thread_id"), lambda: cl.Message(content=""))
+    # The run's streamed output was sent too, before the artifact replaces it
+    streamed_bytes = len(msg.content.encode("utf-8")) if msg is not None else 0
+    # The finished article is the reviewed article: keep updating the same messages
+    delivery = await view.show("Writing" if phase == "Done" else phase or "", content, streamed_bytes)
+    if msg is not None:
+        await msg.remove()
+    
+    msg_content = f"**Phase: {phase}**"
     if phase == "Done":
-        msg_content = f"**記事作成が完了しました**\n\n{content}"
+        msg_content = "**記事作成が完了しました**"
+    if delivery["unchanged"]:
+        msg_content += f" ({delivery['changed']} of {delivery['changed'] + delivery['unchanged']} sections updated)"
     
-    if actions:
+    if actions and state.get("outline_error"):
+        msg_content += f"\n\n{_outline_error_notice(state)}"
+    elif actions:
         msg_content += "\n\n(Please review using the buttons below)"
-        
+    
     await cl.Message(content=msg_content, actions=actions).send()
 
+def _review_actions(state: dict) -> list:
+    """Review buttons: an outline that failed validation can only be amended."""
+    amend = cl.Action(name="amend", label="Amend (Feedback)", payload={"value": "amend"})
+    if state.get("outline_error"):
+        return [amend]
+    return [cl.Action(name="approve", label="Approve (Next Phase)", payload={"value": "approve"}), amend]
+
+def _outline_error_notice(state: dict) -> str:
+    return (
+        f"The outline could not be read: {state['outline_error']}\n"
+        "It cannot be approved as it is. Please ask for a fix with the Amend button below."
+    )
+
 @cl.action_callback("approve")
 async def on_approve(action: cl.Action):
     await action.remove()
@@ -74,21 +252,43 @@ async def on_approve(action: cl.Action):
     graph = cl.user_session.get("graph")
     thread_id = cl.user_session.get("thread_id")
     config = {"configurable": {"thread_id": thread_id}}
+    state_snapshot = await graph.aget_state(config)
+    if state_snapshot.values.get("outline_error"):
+        # A stale Approve button (e.g. of a resumed chat) of an outline that failed validation
+        await cl.Message(content=_outline_error_notice(state_snapshot.values), actions=_review_actions(state_snapshot.values)).send()
+        return
+    await _cancel_session_run(graph, thread_id, "superseded")
     
     # Resume with feedback = None represents approval
     # We update the state with user_feedback=None because logic checks "if feedback:"
     # Actually logic: "if feedback: retry else: next". 
     # State update via update_state
-    graph.update_state(config, {"user_feedback": None})
+    await graph.aupdate_state(config, {"user_feedback": None})
     
     await cl.Message(content="Approved. Proceeding to next phase...").send()
     
+    # If the next phase was already generated speculatively during review, deliver it directly
+    state_snapshot = await graph.aget_state(config)
+    speculated = await speculation.take_speculation(thread_id, state_snapshot.values)
+    if speculated:
+        node_name, node_output = speculated
+        # Record the output as if the node had run; the graph then stops before human_review again
+        await graph.aupdate_state(config, node_output, as_node=node_name)
+        state_snapshot = await graph.aget_state(config)
+        await _show_output_and_actions(state_snapshot.values, state_snapshot.next)
+        _speculate(thread_id, state_snapshot.values, state_snapshot.next)
+        return
+    
     # Resume graph execution (invoke with None input as we updated state directly)
     await _resume_graph(graph, config)
 
 @cl.action_callback("amend")
 async def on_amend(action: cl.Action):
     await action.remove()
+    # The speculative next phase was built from the artifact being amended,
+    # and a run still going would be replaced by the revision
+    speculation.cancel_speculation(cl.user_session.get("thread_id"))
+    await _cancel_session_run(cl.user_session.get("graph"), cl.user_session.get("thread_id"), "amend")
     # Ask for feedback
     res = await cl.AskUserMessage(content="Please enter your feedback for revision:", timeout=600).send()
     if res:
@@ -99,7 +299,7 @@ async def on_amend(action: cl.Action):
         config = {"configurable": {"thread_id": thread_id}}
         
         # Update state with feedback
-        graph.update_state(config, {"user_feedback": feedback_text})
+        await graph.aupdate_state(config, {"user_feedback": feedback_text})
         
         await cl.Message(content="Feedback received. Refining...").send()
         
@@ -107,14 +307,65 @@ async def on_amend(action: cl.Action):
         await _resume_graph(graph, config)
 
 async def _resume_graph(graph, config):
-    async for event in graph.astream(None, config, stream_mode="values"):
-        pass
+    thread_id = config["configurable"]["thread_id"]
+    msg = await session_tasks.run(thread_id, lambda run_config: _stream_graph(graph, None, run_config), config)
+    if msg is None:
+        return  # Superseded by a newer message or action
         
-    state_snapshot = graph.get_state(config)
+    state_snapshot = await graph.aget_state(config)
     current_state = state_snapshot.values
     next_step = state_snapshot.next
     
-    await _show_output_and_actions(current_state, next_step)
+    await _show_output_and_actions(current_state, next_step, msg)
+    _speculate(config["configurable"]["thread_id"], current_state, next_step)
+
+@cl.on_stop
+async def on_stop():
+    """
+    Stop button: Chainlit cancels the running handler; also stop its graph run and
+    the speculation, and offer the review of the last artifact again.
+    """
+    graph = cl.user_session.get("graph")
+    thread_id = cl.user_session.get("thread_id")
+    speculation.cancel_speculation(thread_id)
+    if await _cancel_session_run(graph, thread_id, "stop"):
+        state_snapshot = await graph.aget_state({"configurable": {"thread_id": thread_id}})
+        if state_snapshot.next:
+            await _show_output_and_actions(state_snapshot.values, state_snapshot.next)
+
+@cl.on_chat_end
+async def on_chat_end():
+    """
+    Tab closed or session expired: nobody will see the output, so stop generating it.
+    The thread can still be resumed from its last review.
+    """
+    thread_id = cl.user_session.get("thread_id")
+    speculation.cancel_speculation(thread_id)
+    await _cancel_session_run(cl.user_session.get("graph"), thread_id, "chat_end")
+    artifact_view.discard_view(thread_id)
+
+async def _cancel_session_run(graph, thread_id: str, reason: str) -> bool:
+    """
+    Cancel the session's graph run, if any, and leave the thread waiting for the
+    review of its last artifact (the interrupted node wrote nothing).
+    """
+    if not await session_tasks.cancel_run(thread_id, reason):
+        return False
+    config = {"configurable": {"thread_id": thread_id}}
+    state_snapshot = await graph.aget_state(config)
+    node = PHASE_NODES.get(state_snapshot.values.get("phase"))
+    if state_snapshot.next and "human_review" not in state_snapshot.next and node:
+        # Record the artifact again as its node's output, without the feedback of the cancelled revision
+        await graph.aupdate_state(config, {"user_feedback": None}, as_node=node)
+    return True
+
+def _speculate(thread_id: str, state: dict, next_step: tuple):
+    """
+    Opt-in ([speculation] enabled): generate the next phase in the background
+    while the user reviews the current one.
+    """
+    if next_step and "human_review" in next_step and speculation.is_enabled():
+        speculation.start_speculation(thread_id, cast(BlogSessionState, state))
 
 def _format_response(state: dict) -> str:
     """Helper to format content based on phase."""
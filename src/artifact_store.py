@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+# Strings starting with this marker are references into the artifact store
+ARTIFACT_PREFIX = "\x00artifact:sha256:"
+
+class ArtifactStore:
+    """
+    Content-addressed text store: sha256(text) -> zlib-compressed text.
+
+    Identical documents are stored once, however many checkpoints refer to them.
+    Every put refreshes last_used_at (at most once per touch_interval_seconds),
+    which delete_unused() uses to drop artifacts of expired sessions.
+    """
+
+    def __init__(self, path: str, compression_level: int = 6, cache_size: int = 256, touch_interval_seconds: float = 60.0):
+        self.path = path
+        self.compression_level = compression_level
+        self.cache_size = cache_size
+        self.touch_interval_seconds = touch_interval_seconds
+        self._lock = threading.Lock()
+        # hash -> (text, last touch); most recently used last
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            " hash TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL,"
+            " stored_size INTEGER NOT NULL, last_used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_last_used_at ON artifacts (last_used_at)")
+
+    def put(self, text: str) -> str:
+        """Store `text` (if new) and return its hash."""
+        raw = text.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None and now - cached[1] < self.touch_interval_seconds:
+                self._cache.move_to_end(digest)
+                return digest
+            updated = self._conn.execute("UPDATE artifacts SET last_used_at = ? WHERE hash = ?", (now, digest)).rowcount
+            if not updated:
+                data = zlib.compress(raw, self.compression_level)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (hash, data, size, stored_size, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                    (digest, data, len(raw), len(data), now),
+                )
+            self._remember(digest, text, now)
+        return digest
+
+    def get(self, digest: str) -> str:
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                return cached[0]
+            row = self._conn.execute("SELECT data FROM artifacts WHERE hash = ?", (digest,)).fetchone()
+            if row is None:
+                raise KeyError(f"Artifact not found: {digest}")
+            text = zlib.decompress(row[0]).decode("utf-8")
+            # Not a touch: reading does not extend the artifact's lifetime
+            self._remember(digest, text, 0.0)
+            return text
+
+    def delete_unused(self, before: float) -> int:
+        """
+        Delete artifacts not stored since `before` (epoch seconds).
+        The touch interval is subtracted so that artifacts whose touch was skipped survive.
+        """
+        cutoff = before - self.touch_interval_seconds
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM artifacts WHERE last_used_at < ?", (cutoff,)).rowcount
+            self._cache.clear()
+        return deleted
+
+    def sizes(self, digests: Iterable[str]) -> Dict[str, int]:
+        """hash -> stored (compressed) bytes, for the given artifacts that exist."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT hash, stored_size FROM artifacts WHERE hash IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(digests)),),
+            ).fetchall()
+        return dict(rows)
+
+    def delete(self, digests: Iterable[str]) -> int:
+        """Delete the given artifacts, e.g. those no checkpoint refers to any more."""
+        digests = list(digests)
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM artifacts WHERE hash IN (SELECT value FROM json_each(?))", (json.dumps(digests),),
+            ).rowcount
+            for digest in digests:
+                self._cache.pop(digest, None)
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, size, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM artifacts"
+            ).fetchone()
+        return {"artifacts": count, "raw_bytes": size, "stored_bytes": stored}
+
+    def _remember(self, digest: str, text: str, touched_at: float) -> None:
+        self._cache[digest] = (text, touched_at)
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+class ArtifactSerializer(SerializerProtocol):
+    """
+    Checkpoint serializer that moves large strings (spec_doc, structure_doc,
+    final_article, ...) into an ArtifactStore and keeps only a reference in the
+    checkpoint. Everything else is delegated to the wrapped serializer.
+    """
+
+    def __init__(self, store: ArtifactStore, min_bytes: int = 1024, serde: Optional[SerializerProtocol] = None):
+        self.store = store
+        self.min_bytes = min_bytes
+        self.serde = serde or JsonPlusSerializer()
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return self.serde.dumps_typed(self._externalize(obj))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self._resolve(self.serde.loads_typed(data))
+
+    def _externalize(self, obj: Any) -> Any:
+        if isinstance(obj, str):
+            if len(obj) * 4 >= self.min_bytes and len(obj.encode("utf-8")) >= self.min_bytes:
+                return ARTIFACT_PREFIX + self.store.put(obj)
+            return obj
+        if type(obj) is dict:
+            return {key: self._externalize(value) for key, value in obj.items()}
+        if type(obj) in (list, tuple):
+            return type(obj)(self._externalize(value) for value in obj)
+        return obj
+
+    def _resolve(self, obj: Any) -> Any:
+        if isinstance(obj, str):
+            if obj.startswith(ARTIFACT_PREFIX):
+                return self.store.get(obj[len(ARTIFACT_PREFIX):])
+            return obj
+        if type(obj) is dict:
+            return {key: self._resolve(value) for key, value in obj.items()}
+        if type(obj) in (list, tuple):
+            return type(obj)(self._resolve(value) for value in obj)
+        return obj
+
+async def artifact_history(graph: Any, thread_id: str, field: str) -> List[Dict[str, Any]]:
+    """
+    Revision history of one artifact (e.g. "spec_doc") in a session, oldest first.
+    Each entry: {"hash", "phase", "checkpoint_id", "created_at", "text"}.
+    Unchanged revisions are collapsed; revisions cost no extra storage
+    because the store keeps each distinct text once.
+    """
+    snapshots = [s async for s in graph.aget_state_history({"configurable": {"thread_id": thread_id}})]
+    history: List[Dict[str, Any]] = []
+    for snapshot in reversed(snapshots):
+        text = snapshot.values.get(field)
+        if not text:
+            continue
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if history and history[-1]["hash"] == digest:
+            continue
+        history.append({
+            "hash": digest,
+            "phase": snapshot.values.get("phase"),
+            "checkpoint_id": snapshot.config["configurable"]["checkpoint_id"],
+            "created_at": snapshot.created_at,
+            "text": text,
+        })
+    return history
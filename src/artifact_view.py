@@ -0,0 +1,129 @@
+"""
+Incremental delivery of the reviewed artifacts to the browser ([ui] in config.toml).
+
+An artifact (spec, outline, article) is shown as one Chainlit message per
+top-level section. When a revision of the same artifact is shown, only the
+sections whose text changed are sent again, in place (message.update());
+sections added at the end are sent as new messages and removed ones are
+deleted. A revised article then costs the changed sections instead of the
+whole document, and the browser re-renders only those messages.
+
+Sections longer than chunk_chars are streamed in chunks, so the browser
+starts rendering before the whole section has arrived. The stream is then
+finalized with message.update(), which ends the streaming state and lets
+the data layer persist the content (and sends the text once more).
+
+Per phase, mabg_ui_payload_bytes records the bytes sent per delivery,
+including the run's streamed LLM output that the artifact replaces, and
+mabg_ui_payload_saved_bytes_total the bytes of unchanged sections that were
+not sent again.
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from src.config import load_config
+from src.metrics import REGISTRY, Counter, Histogram
+from src.utils.markdown import section_level, split_sections, top_section_level
+
+PAYLOAD_BYTES = REGISTRY.register(Histogram(
+    "mabg_ui_payload_bytes", "Artifact bytes sent to the browser per delivery", ("phase",),
+    buckets=(1e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6),
+))
+SAVED_BYTES = REGISTRY.register(Counter(
+    "mabg_ui_payload_saved_bytes_total", "Artifact bytes not sent again because their section was unchanged", ("phase",),
+))
+
+DEFAULT_CHUNK_CHARS = 16000
+
+def split_blocks(markdown: str) -> List[str]:
+    """
+    The artifact's display blocks: the text before the first section, then
+    one block per top-level section (e.g. per H2 of an article with an H1 title).
+    """
+    preamble, sections = split_sections(markdown, top_section_level(markdown) or section_level(markdown))
+    blocks = [preamble] if preamble.strip() else []
+    blocks.extend(section.text + section.tail for section in sections)
+    return blocks or [markdown]
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+@dataclass
+class _Block:
+    message: Any
+    text: str
+
+class ArtifactView:
+    """The messages showing one session's artifacts, by phase."""
+
+    def __init__(self, new_message: Callable[[], Any], chunk_chars: int = DEFAULT_CHUNK_CHARS):
+        self.new_message = new_message
+        self.chunk_chars = chunk_chars
+        self._blocks: Dict[str, List[_Block]] = {}
+
+    async def show(self, phase: str, markdown: str, streamed_bytes: int = 0) -> Dict[str, int]:
+        """
+        Show the phase's artifact, sending only the blocks that differ from
+        what is on screen. streamed_bytes is the size of the LLM output already
+        streamed for this delivery. Returns the number of changed and unchanged blocks.
+        """
+        shown = self._blocks.setdefault(phase, [])
+        blocks = split_blocks(markdown)
+        sent, saved, changed = streamed_bytes, 0, 0
+        for i, text in enumerate(blocks):
+            if i < len(shown) and shown[i].text == text:
+                saved += _size(text)
+                continue
+            changed += 1
+            if i < len(shown):
+                shown[i].text = text
+                sent += await self._put(shown[i].message, text, new=False)
+            else:
+                message = self.new_message()
+                sent += await self._put(message, text, new=True)
+                shown.append(_Block(message, text))
+        for block in shown[len(blocks):]:
+            await block.message.remove()
+        del shown[len(blocks):]
+
+        PAYLOAD_BYTES.observe(sent, phase=phase)
+        if saved:
+            SAVED_BYTES.inc(saved, phase=phase)
+        return {"changed": changed, "unchanged": len(blocks) - changed}
+
+    def held_bytes(self) -> int:
+        """Bytes of artifact text kept for the diff."""
+        return sum(_size(block.text) for blocks in self._blocks.values() for block in blocks)
+
+    async def _put(self, message: Any, text: str, new: bool) -> int:
+        """Send the block's text; returns the bytes sent."""
+        if len(text) <= self.chunk_chars:
+            message.content = text
+            await (message.send() if new else message.update())
+            return _size(text)
+        # Send the message empty, then append the text chunk by chunk
+        message.content = ""
+        await (message.send() if new else message.update())
+        for start in range(0, len(text), self.chunk_chars):
+            await message.stream_token(text[start:start + self.chunk_chars])
+        # End the stream: the message leaves its streaming state and its content is persisted
+        await message.update()
+        return 2 * _size(text)
+
+# thread_id -> the session's view
+_views: Dict[str, ArtifactView] = {}
+
+def get_view(thread_id: str, new_message: Callable[[], Any]) -> ArtifactView:
+    view = _views.get(thread_id)
+    if view is None:
+        chunk_chars = int(load_config().get("ui", {}).get("chunk_chars", DEFAULT_CHUNK_CHARS))
+        view = _views[thread_id] = ArtifactView(new_message, chunk_chars)
+    return view
+
+def discard_view(thread_id: Optional[str]) -> None:
+    """Forget the messages of the session's artifacts (new topic or chat end)."""
+    if thread_id:
+        _views.pop(thread_id, None)
+
+def view_bytes() -> Dict[str, int]:
+    """thread_id -> held_bytes() of the session's view."""
+    return {thread_id: view.held_bytes() for thread_id, view in list(_views.items())}
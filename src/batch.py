@@ -0,0 +1,158 @@
+"""
+Headless batch generation.
+
+Drives the application graph without Chainlit: every topic runs through Spec -> Structure
+-> Writing. At each human_review interrupt it either auto-approves or applies
+the next scripted feedback for that phase. Finished articles are written to
+the output directory as soon as they are done, and topics whose article
+already exists are skipped, so a crashed run can simply be restarted.
+
+    python -m src.batch topics.jsonl --out articles/ --concurrency 8
+
+Topics file formats:
+- JSONL: {"id": "...", "topic": "...", "feedback": {"Spec": ["..."], "Structure": [...], "Writing": [...]}}
+  (id and feedback are optional)
+- CSV: columns "topic" and optionally "id"
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+from langchain_core.runnables import RunnableConfig
+from src.graph import get_app_graph
+from src.state import BlogSessionState
+from src.utils.prompts import preload_prompts
+
+logger = logging.getLogger(__name__)
+
+def load_topics(path: str) -> List[Dict[str, Any]]:
+    """
+    Read topics from a JSONL or CSV file. Every topic gets a stable id
+    (explicit "id" or a hash of the topic text) used for the output file
+    name and the checkpointer thread_id.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows: List[Dict[str, Any]] = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    topics = []
+    for row in rows:
+        topic = (row.get("topic") or "").strip()
+        if not topic:
+            continue
+        topic_id = str(row.get("id") or hashlib.sha256(topic.encode("utf-8")).hexdigest()[:12])
+        topics.append({
+            "id": _safe_name(topic_id),
+            "topic": topic,
+            "feedback": row.get("feedback") or {},
+        })
+    return topics
+
+async def generate_article(item: Dict[str, Any], output_dir: str) -> Optional[str]:
+    """
+    Run one topic to completion. Returns the output path, or None if the
+    graph stopped without an article.
+    """
+    # priority=batch: the LLM scheduler serves interactive sessions first
+    config: RunnableConfig = {"configurable": {"thread_id": f"batch-{item['id']}", "priority": "batch"}}
+    app_graph = get_app_graph()
+
+    snapshot = await app_graph.aget_state(config)
+    if not snapshot.values:
+        inputs: BlogSessionState = {"topic": item["topic"]}
+        await app_graph.ainvoke(inputs, config)
+    # else: the thread survived in a persistent checkpointer, continue where it stopped
+
+    # Scripted feedback per phase, consumed one entry per review round
+    consumed = await _consumed_feedback(config)
+    pending = {phase: list(entries)[consumed.get(phase, 0):] for phase, entries in item["feedback"].items()}
+    while True:
+        snapshot = await app_graph.aget_state(config)
+        if not snapshot.next:
+            break
+        if snapshot.values.get("user_feedback"):
+            # Applied before a crash, but its revision did not finish
+            await app_graph.ainvoke(None, config)
+            continue
+        phase = snapshot.values.get("phase")
+        feedback = pending.get(phase, []).pop(0) if pending.get(phase) else None
+        await app_graph.aupdate_state(config, {"user_feedback": feedback})
+        await app_graph.ainvoke(None, config)
+
+    article = snapshot.values.get("final_article")
+    if not article:
+        return None
+
+    path = _output_path(output_dir, item["id"])
+    # Write atomically so a crash never leaves a partial article that would be skipped on restart
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(article)
+    os.replace(tmp_path, path)
+    return path
+
+async def _consumed_feedback(config: RunnableConfig) -> Dict[str, int]:
+    """Feedback entries already applied to the thread, per phase (from its checkpoint history)."""
+    consumed: Dict[str, int] = {}
+    async for snapshot in get_app_graph().aget_state_history(config):
+        if (snapshot.metadata or {}).get("source") == "update" and snapshot.values.get("user_feedback"):
+            phase = snapshot.values.get("phase") or ""
+            consumed[phase] = consumed.get(phase, 0) + 1
+    return consumed
+
+async def run_batch(topics: List[Dict[str, Any]], output_dir: str, concurrency: int = 4) -> Dict[str, int]:
+    """
+    Generate all topics with at most `concurrency` sessions in flight.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    todo = [item for item in topics if not os.path.exists(_output_path(output_dir, item["id"]))]
+    summary = {"total": len(topics), "skipped": len(topics) - len(todo), "done": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(item: Dict[str, Any]) -> None:
+        async with semaphore:
+            try:
+                path = await generate_article(item, output_dir)
+            except Exception:
+                logger.exception("Topic %s failed", item["id"])
+                summary["failed"] += 1
+                return
+            if path is None:
+                logger.warning("Topic %s finished without an article", item["id"])
+                summary["failed"] += 1
+            else:
+                logger.info("Topic %s -> %s", item["id"], path)
+                summary["done"] += 1
+
+    await asyncio.gather(*[worker(item) for item in todo])
+    return summary
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate articles for a file of topics without the Chainlit UI.")
+    parser.add_argument("topics", help="Topics file (.jsonl or .csv)")
+    parser.add_argument("--out", default="articles", help="Output directory for finished articles")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum concurrent sessions")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    preload_prompts()
+    topics = load_topics(args.topics)
+    summary = asyncio.run(run_batch(topics, args.out, args.concurrency))
+    logger.info("Batch finished: %s", summary)
+    return 1 if summary["failed"] else 0
+
+def _output_path(output_dir: str, topic_id: str) -> str:
+    return os.path.join(output_dir, f"{topic_id}.md")
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]", "_", name)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
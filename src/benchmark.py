@@ -0,0 +1,244 @@
+"""
+Deterministic benchmark suite for the graph, run against a stub LLM.
+
+Every agent uses FakeStreamingChatModel (src/utils/fake_llm.py), injected
+through src.config.set_llm_factory, and the scheduler runs without rate
+limits. The suite measures:
+
+- session: end-to-end time of one session (spec -> structure -> writing),
+  and the overhead on top of the simulated LLM time
+- superstep: graph cost per superstep with an instant LLM
+- checkpointer: checkpointer time per superstep for each backend
+- memory: Python heap per session waiting for review (tracemalloc)
+- throughput: sessions/s and p50/p99 session time from 1 to 500 concurrent sessions
+
+Results are written as JSON and compared with a stored baseline; a metric
+that is worse than the baseline by more than --tolerance fails the run.
+
+    python -m src.benchmark                    # full suite, compare with benchmarks/baseline.json
+    python -m src.benchmark --quick            # fewer sessions / concurrency levels
+    python -m src.benchmark --update-baseline  # store this run as the new baseline
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Sequence
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from src import config as app_config
+from src import scheduler
+from src.checkpointer import create_checkpointer
+from src.graph import workflow
+from src.utils.fake_llm import FakeLLMSettings, FakeStreamingChatModel, fake_llm_factory
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+BASELINE_PATH = os.path.join(PROJECT_ROOT, "benchmarks", "baseline.json")
+RESULTS_PATH = os.path.join(PROJECT_ROOT, ".cache", "benchmark.json")
+
+CONCURRENCY_LEVELS = (1, 10, 50, 100, 250, 500)
+QUICK_CONCURRENCY_LEVELS = (1, 10, 50)
+
+# Simulated model for the session benchmark: 0.2 s to first token, 400 tokens/s
+SESSION_LLM: FakeLLMSettings = {"latency_seconds": 0.2, "tokens_per_second": 400.0, "output_tokens": 200}
+# Simulated model for the throughput benchmark: short, fixed latency
+THROUGHPUT_LLM: FakeLLMSettings = {"latency_seconds": 0.05, "output_tokens": 200}
+# Instant model: what remains is graph, agent and checkpointer overhead
+INSTANT_LLM: FakeLLMSettings = {"output_tokens": 200}
+
+PHASES = ("Spec", "Structure", "Writing")
+
+async def run_session(graph: Any, thread_id: str, amend_rounds: int = 0) -> None:
+    """Drive one session to the end: every phase is amended `amend_rounds` times, then approved."""
+    config = {"configurable": {"thread_id": thread_id}}
+    await graph.ainvoke({"topic": f"Benchmark {thread_id}"}, config)
+    for _phase in PHASES:
+        for i in range(amend_rounds):
+            await graph.aupdate_state(config, {"user_feedback": f"全体をもう少し詳しくしてください ({i})"})
+            await graph.ainvoke(None, config)
+        await graph.aupdate_state(config, {"user_feedback": None})
+        await graph.ainvoke(None, config)
+
+def _compile(checkpointer: BaseCheckpointSaver) -> Any:
+    return workflow.compile(checkpointer=checkpointer, interrupt_before=["human_review"])
+
+def _metric(value: float, unit: str, better: str = "lower") -> Dict[str, Any]:
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _instrument(checkpointer: BaseCheckpointSaver) -> Dict[str, float]:
+    """Time every async checkpointer call; returns the live {"seconds", "calls", "puts"} totals."""
+    totals = {"seconds": 0.0, "calls": 0, "puts": 0}
+    for name in ("aget_tuple", "aput", "aput_writes"):
+        method = getattr(checkpointer, name)
+
+        async def timed(*args: Any, _method: Any = method, _name: str = name, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return await _method(*args, **kwargs)
+            finally:
+                totals["seconds"] += time.perf_counter() - start
+                totals["calls"] += 1
+                totals["puts"] += _name == "aput"
+
+        setattr(checkpointer, name, timed)
+    return totals
+
+async def bench_session(repeats: int) -> Dict[str, Dict[str, Any]]:
+    app_config.set_llm_factory(fake_llm_factory(**SESSION_LLM))
+    llm_seconds = len(PHASES) * FakeStreamingChatModel(**SESSION_LLM).expected_seconds()
+    durations = []
+    for i in range(repeats):
+        graph = _compile(create_checkpointer({"backend": "memory", "artifact_store": False}))
+        start = time.perf_counter()
+        await run_session(graph, f"session-{i}")
+        durations.append(time.perf_counter() - start)
+    median = statistics.median(durations)
+    return {
+        "session.seconds": _metric(median, "s"),
+        "session.overhead_seconds": _metric(median - llm_seconds, "s"),
+    }
+
+async def bench_checkpointers(sessions: int) -> Dict[str, Dict[str, Any]]:
+    app_config.set_llm_factory(fake_llm_factory(**INSTANT_LLM))
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        backends: Dict[str, Dict[str, Any]] = {
+            "memory": {"backend": "memory", "artifact_store": False},
+            "sqlite": {"backend": "sqlite", "path": os.path.join(tmp, "checkpoints.sqlite")},
+        }
+        for backend, settings in backends.items():
+            checkpointer = create_checkpointer(settings)
+            totals = _instrument(checkpointer)
+            graph = _compile(checkpointer)
+            start = time.perf_counter()
+            for i in range(sessions):
+                await run_session(graph, f"{backend}-{i}", amend_rounds=1)
+            elapsed = time.perf_counter() - start
+            supersteps = totals["puts"]
+            if backend == "memory":
+                results["superstep.ms"] = _metric(1000 * (elapsed - totals["seconds"]) / supersteps, "ms")
+            results[f"checkpointer.{backend}.ms_per_superstep"] = _metric(1000 * totals["seconds"] / supersteps, "ms")
+    return results
+
+async def bench_memory(sessions: int) -> Dict[str, Dict[str, Any]]:
+    app_config.set_llm_factory(fake_llm_factory(**INSTANT_LLM))
+    graph = _compile(create_checkpointer({"backend": "memory", "artifact_store": False}))
+    # Warm up imports, chain registry and prompt cache outside the measurement
+    await graph.ainvoke({"topic": "warm-up"}, {"configurable": {"thread_id": "warm-up"}})
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        await asyncio.gather(*(
+            graph.ainvoke({"topic": f"Benchmark {i}"}, {"configurable": {"thread_id": f"memory-{i}"}})
+            for i in range(sessions)
+        ))
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return {"memory.kib_per_session": _metric(retained / sessions / 1024, "KiB")}
+
+async def _timed_session(graph: Any, thread_id: str, durations: List[float]) -> None:
+    start = time.perf_counter()
+    await run_session(graph, thread_id)
+    durations.append(time.perf_counter() - start)
+
+async def bench_throughput(levels: Sequence[int]) -> Dict[str, Dict[str, Any]]:
+    app_config.set_llm_factory(fake_llm_factory(**THROUGHPUT_LLM))
+    results: Dict[str, Dict[str, Any]] = {}
+    for level in levels:
+        graph = _compile(create_checkpointer({"backend": "memory", "artifact_store": False}))
+        durations: List[float] = []
+        start = time.perf_counter()
+        await asyncio.gather(*(_timed_session(graph, f"throughput-{level}-{i}", durations) for i in range(level)))
+        elapsed = time.perf_counter() - start
+        results[f"throughput.{level}.sessions_per_second"] = _metric(level / elapsed, "sessions/s", "higher")
+        results[f"throughput.{level}.p50_seconds"] = _metric(_percentile(durations, 0.5), "s")
+        results[f"throughput.{level}.p99_seconds"] = _metric(_percentile(durations, 0.99), "s")
+    return results
+
+async def run_benchmarks(quick: bool = False) -> Dict[str, Any]:
+    """Run the whole suite with the fake LLM and an unlimited scheduler."""
+    saved_scheduler = scheduler._scheduler
+    scheduler._scheduler = scheduler.LLMScheduler({})
+    try:
+        metrics: Dict[str, Dict[str, Any]] = {}
+        metrics.update(await bench_session(repeats=1 if quick else 3))
+        metrics.update(await bench_checkpointers(sessions=5 if quick else 20))
+        metrics.update(await bench_memory(sessions=20 if quick else 100))
+        metrics.update(await bench_throughput(QUICK_CONCURRENCY_LEVELS if quick else CONCURRENCY_LEVELS))
+    finally:
+        app_config.set_llm_factory(None)
+        scheduler._scheduler = saved_scheduler
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "quick": quick,
+        },
+        "metrics": metrics,
+    }
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Return one message per metric that is worse than the baseline by more than
+    `tolerance` (a fraction). Metrics missing from either side are skipped.
+    """
+    regressions = []
+    for name, base in baseline.get("metrics", {}).items():
+        current = results["metrics"].get(name)
+        if current is None or not base["value"]:
+            continue
+        change = (current["value"] - base["value"]) / abs(base["value"])
+        worse = change > tolerance if base["better"] == "lower" else change < -tolerance
+        if worse:
+            regressions.append(f"{name}: {current['value']:g} {current['unit']} (baseline {base['value']:g}, {change:+.0%})")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the graph against a stub LLM and compare with a baseline.")
+    parser.add_argument("--quick", action="store_true", help="Fewer sessions and concurrency levels up to 50")
+    parser.add_argument("--out", default=RESULTS_PATH, help="Where to write the results JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative regression (0.5 = 50%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to the baseline file")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmarks(quick=args.quick))
+
+    for path in (args.out, args.baseline if args.update_baseline else None):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+                f.write("\n")
+
+    for name, metric in results["metrics"].items():
+        print(f"  {name:45s} {metric['value']:>12.4f} {metric['unit']}")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"\nFAIL: {len(regressions)} regression(s) against {args.baseline}:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    print(f"\nOK: no regression beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
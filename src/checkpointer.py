@@ -0,0 +1,229 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Mapping, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.sqlite import SqliteSaver
+from src.artifact_store import ArtifactSerializer, ArtifactStore
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+
+class SqliteCheckpointer(SqliteSaver):
+    """
+    Durable LangGraph checkpointer shared by all server / batch processes.
+
+    SqliteSaver in WAL mode (readers never block the writer) plus:
+    - async methods, run in a worker thread so the event loop is not blocked
+    - a busy timeout, so concurrent writers from other processes wait instead of failing
+    - TTL cleanup: threads with no checkpoint written for ttl_seconds are deleted
+    Any process opening the same file can resume any thread_id.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: Optional[float] = None,
+        cleanup_interval_seconds: float = 600.0,
+        busy_timeout_ms: int = 5000,
+        serde: Optional[SerializerProtocol] = None,
+    ):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout_ms / 1000)
+        super().__init__(conn, serde=serde)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval_seconds = cleanup_interval_seconds
+        self.busy_timeout_ms = busy_timeout_ms
+        self.expired_threads = 0
+        self._last_cleanup = time.monotonic()
+        self._cleanup_lock = threading.Lock()
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        self.conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        super().setup()
+        self.conn.executescript(
+            """
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS thread_activity_updated_at ON thread_activity (updated_at);
+            """
+        )
+        # Threads written before the activity table existed start their TTL now
+        self.conn.execute(
+            "INSERT OR IGNORE INTO thread_activity (thread_id, updated_at)"
+            " SELECT DISTINCT thread_id, ? FROM checkpoints",
+            (time.time(),),
+        )
+        self.conn.commit()
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(str(config["configurable"]["thread_id"]))
+        self._maybe_cleanup()
+        return next_config
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def cleanup_expired(self, ttl_seconds: Optional[float] = None) -> int:
+        """
+        Delete every thread whose last checkpoint is older than the TTL.
+        Returns the number of deleted threads.
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl is None:
+            return 0
+        cutoff = time.time() - ttl
+        expired = "SELECT thread_id FROM thread_activity WHERE updated_at < ?"
+        with self.cursor() as cur:
+            # One transaction: the first DELETE takes the write lock, so no other
+            # process can touch an expiring thread until all three are committed.
+            cur.execute(f"DELETE FROM checkpoints WHERE thread_id IN ({expired})", (cutoff,))
+            cur.execute(f"DELETE FROM writes WHERE thread_id IN ({expired})", (cutoff,))
+            cur.execute("DELETE FROM thread_activity WHERE updated_at < ?", (cutoff,))
+            deleted = cur.rowcount
+        if isinstance(self.serde, ArtifactSerializer):
+            self.serde.store.delete_unused(cutoff)
+        self.expired_threads += deleted
+        return deleted
+
+    def session_bytes(self, thread_id: str) -> int:
+        """Bytes stored in checkpoints and writes for one thread (artifacts not included)."""
+        with self.cursor(transaction=False) as cur:
+            checkpoints = cur.execute(
+                "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints WHERE thread_id = ?",
+                (str(thread_id),),
+            ).fetchone()[0]
+            writes = cur.execute(
+                "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes WHERE thread_id = ?", (str(thread_id),)
+            ).fetchone()[0]
+        return checkpoints + writes
+
+    def session_sizes(self) -> Dict[str, int]:
+        """session_bytes() of every thread, in one pass."""
+        sizes: Dict[str, int] = {}
+        with self.cursor(transaction=False) as cur:
+            for query in (
+                "SELECT thread_id, SUM(LENGTH(checkpoint) + LENGTH(metadata)) FROM checkpoints GROUP BY thread_id",
+                "SELECT thread_id, SUM(LENGTH(value)) FROM writes GROUP BY thread_id",
+            ):
+                for thread_id, size in cur.execute(query):
+                    sizes[thread_id] = sizes.get(thread_id, 0) + (size or 0)
+        return sizes
+
+    def thread_count(self) -> int:
+        with self.cursor(transaction=False) as cur:
+            return cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0]
+
+    def _touch(self, thread_id: str) -> None:
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?)"
+                " ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (thread_id, time.time()),
+            )
+
+    def _maybe_cleanup(self) -> None:
+        if self.ttl_seconds is None:
+            return
+        with self._cleanup_lock:
+            if time.monotonic() - self._last_cleanup < self.cleanup_interval_seconds:
+                return
+            self._last_cleanup = time.monotonic()
+        self.cleanup_expired()
+
+    # SqliteSaver only implements the sync interface; the async one runs it in a thread.
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aget_delta_channel_history(self, *, config: RunnableConfig, channels: Sequence[str]) -> Mapping[str, Any]:
+        return await asyncio.to_thread(self.get_delta_channel_history, config=config, channels=channels)
+
+def create_checkpointer(settings: Optional[Dict[str, Any]] = None) -> BaseCheckpointSaver:
+    """
+    Build the graph checkpointer from the [checkpointer] section of config.toml.
+    backend = "sqlite" (default) persists sessions across restarts and processes;
+    backend = "memory" keeps them in this process only.
+    With artifact_store enabled (default for sqlite), large documents are stored once
+    in a content-addressed store (same database file) and checkpoints hold references.
+    It is off by default for memory: only a [memory] eviction frees in-memory artifacts.
+    """
+    settings = settings or {}
+    backend = settings.get("backend", "sqlite")
+    if backend not in ("sqlite", "memory"):
+        raise ValueError(f"Unknown checkpointer backend: {backend}")
+
+    path = settings.get("path", ".cache/checkpoints.sqlite") if backend == "sqlite" else ":memory:"
+    if path != ":memory:" and not os.path.isabs(path):
+        path = os.path.join(PROJECT_ROOT, path)
+
+    serde = None
+    if settings.get("artifact_store", backend == "sqlite"):
+        serde = ArtifactSerializer(
+            ArtifactStore(path, compression_level=int(settings.get("compression_level", 6))),
+            min_bytes=int(settings.get("artifact_min_bytes", 1024)),
+        )
+
+    if backend == "memory":
+        return MemorySaver(serde=serde)
+    ttl_hours = settings.get("ttl_hours")
+    return SqliteCheckpointer(
+        path,
+        ttl_seconds=float(ttl_hours) * 3600 if ttl_hours else None,
+        cleanup_interval_seconds=float(settings.get("cleanup_interval_seconds", 600)),
+        busy_timeout_ms=int(settings.get("busy_timeout_ms", 5000)),
+        serde=serde,
+    )
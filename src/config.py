@@ -1,20 +1,55 @@
 import os
+import threading
 import tomllib
-from typing import Any, Dict
-from langchain_openai import ChatOpenAI
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
 from pydantic import SecretStr
+from src.llm_cache import get_response_cache
+from src.utils.http_client import get_http_clients, warm_up_connections
+
+if TYPE_CHECKING:
+    # langchain_openai (and the openai SDK) is imported on first get_llm call
+    # to keep server and test startup fast.
+    from langchain_openai import ChatOpenAI
+    from langchain_core.language_models import BaseChatModel
 
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config.toml")
 
+# Agents that call the LLM
+AGENT_NAMES = ("spec_agent", "structure_agent", "writing_agent")
+
+_config: Optional[Dict[str, Any]] = None
+_agent_llms: Dict[str, "BaseChatModel"] = {}
+_llm_factory: Optional[Callable[[str], "BaseChatModel"]] = None
+_lock = threading.RLock()
+
 def load_config() -> Dict[str, Any]:
     """
     Load the entire configuration from config.toml.
+    The file is parsed once per process; call reload_config() to pick up changes.
+    The returned dict is shared and must not be modified.
     """
-    if not os.path.exists(CONFIG_PATH):
-        raise FileNotFoundError(f"Config file not found at {CONFIG_PATH}")
-    
-    with open(CONFIG_PATH, "rb") as f:
-        return tomllib.load(f)
+    global _config
+    if _config is None:
+        with _lock:
+            if _config is None:
+                if not os.path.exists(CONFIG_PATH):
+                    raise FileNotFoundError(f"Config file not found at {CONFIG_PATH}")
+                
+                with open(CONFIG_PATH, "rb") as f:
+                    _config = tomllib.load(f)
+    return _config
+
+def reload_config() -> Dict[str, Any]:
+    """
+    Re-read config.toml and drop the memoized agent LLM clients so that they are
+    rebuilt with the new settings on next use. Process-wide services that were
+    already created (response cache, HTTP pool, scheduler) keep their settings.
+    """
+    global _config
+    with _lock:
+        _config = None
+        _agent_llms.clear()
+    return load_config()
 
 def get_agent_config(agent_name: str) -> Dict[str, Any]:
     """
@@ -47,19 +82,87 @@ def get_agent_config(agent_name: str) -> Dict[str, Any]:
 
 
 
-def get_llm(agent_name: str) -> ChatOpenAI:
+def set_llm_factory(factory: Optional[Callable[[str], "BaseChatModel"]]) -> None:
+    """
+    Replace the model built by get_llm (e.g. with a stub model for benchmarks and
+    load tests, see src/utils/fake_llm.py). Pass None to restore ChatOpenAI.
+    Memoized agent clients are dropped so that the next call uses the new factory.
+    """
+    global _llm_factory
+    with _lock:
+        _llm_factory = factory
+        _agent_llms.clear()
+
+def get_llm(agent_name: str) -> "BaseChatModel":
     """
-    Factory function to create a ChatOpenAI instance for a specific agent.
+    Factory function to create the chat model (ChatOpenAI) for a specific agent.
+    With `deadline_seconds` or `fallback_llm` set, the model is wrapped in a
+    HedgedChatModel (see src/hedging.py).
     """
+    if _llm_factory is not None:
+        return _llm_factory(agent_name)
+
     config = get_agent_config(agent_name)
+    llm = _chat_openai(config, config["llm"])
+    if not (config.get("deadline_seconds") or config.get("fallback_llm")):
+        return llm
+
+    from src.hedging import HedgedChatModel
+
+    fallback = config.get("fallback_llm")
+    hedge_after = config.get("hedge_after_seconds")
+    return HedgedChatModel(
+        primary=llm,
+        fallback=_chat_openai(config, fallback) if fallback and fallback != config["llm"] else None,
+        agent=agent_name,
+        hedge_after_seconds=float(hedge_after) if hedge_after is not None else None,
+        deadline_seconds=float(config["deadline_seconds"]) if config.get("deadline_seconds") else None,
+    )
+
+def _chat_openai(config: Dict[str, Any], model: str) -> "ChatOpenAI":
+    from langchain_openai import ChatOpenAI
+
+    # Persistent response cache: opt-in per agent via `response_cache = true`,
+    # enabled by default for deterministic (temperature 0.0) agents.
+    cache_enabled = config.get("response_cache", config["temperature"] == 0.0)
+    cache = get_response_cache(load_config().get("response_cache", {})) if cache_enabled else False
     
     api_key_str = os.environ.get("OPENROUTER_API_KEY")
     api_key = SecretStr(api_key_str) if api_key_str else None
     
+    # All agents share one pooled HTTP client ([http] in config.toml)
+    http_client, http_async_client = get_http_clients(load_config().get("http", {}))
+    
     return ChatOpenAI(
-        model=config["llm"],
+        model=model,
         temperature=config["temperature"],
         api_key=api_key,
         base_url=config.get("base_url"),
-        cache=False # Disable caching to ensures fresh responses
+        cache=cache,
+        # Usage (incl. cached prompt tokens) is also reported for streamed calls
+        stream_usage=True,
+        http_client=http_client,
+        http_async_client=http_async_client
     )
+
+def get_agent_llm(agent_name: str) -> "BaseChatModel":
+    """
+    Memoized get_llm: an agent's client is built on first use, not at import time.
+    """
+    llm = _agent_llms.get(agent_name)
+    if llm is None:
+        with _lock:
+            llm = _agent_llms.get(agent_name)
+            if llm is None:
+                llm = _agent_llms[agent_name] = get_llm(agent_name)
+    return llm
+
+async def warm_up_llm_connections() -> int:
+    """
+    Pre-open connections to every agent's base_url if [http] warm_up is enabled.
+    """
+    http_config = load_config().get("http", {})
+    if not http_config.get("warm_up", False):
+        return 0
+    base_urls = [get_agent_config(name).get("base_url") for name in AGENT_NAMES]
+    return await warm_up_connections([url for url in base_urls if url], http_config)
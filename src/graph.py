@@ -1,15 +1,19 @@
-from typing import Literal
+from typing import Literal, Optional
 from langgraph.graph import StateGraph, END
+from langgraph.graph.state import CompiledStateGraph
 from src.state import BlogSessionState
-from langgraph.checkpoint.memory import MemorySaver
-from src.agents.spec import spec_agent_node
-from src.agents.structure import structure_agent_node
-from src.agents.writing import writing_agent_node
+from src.checkpointer import create_checkpointer
+from src.config import load_config
+from src.workers import agent_node
+from src.agents.spec import aspec_agent_node
+from src.agents.structure import astructure_agent_node
+from src.agents.writing import awriting_agent_node
 
-# Placeholder functions for nodes. Actual logic will be implemented in agents/ modules.
-# spec_agent_node is now imported from src.agents.spec
-# structure_agent_node is now imported from src.agents.structure
-# writing_agent_node is now imported from src.agents.writing
+# Agent nodes are the async variants from src.agents.* so that graph.astream
+# never blocks the Chainlit event loop while waiting for the LLM. [REQ-PER-001]
+# agent_node wraps them in timed_node, which records per-node latency and labels the
+# LLM metrics (src/metrics.py), and with [workers] enabled runs them in worker
+# processes instead (src/workers.py).
 
 def human_review_node(state: BlogSessionState) -> BlogSessionState:
     """
@@ -50,12 +54,12 @@ def should_continue(state: BlogSessionState) -> Literal["structure_agent", "writ
     return "end" # Default fallback
 
 # Create the graph
-workflow = StateGraph(BlogSessionState)
+workflow = StateGraph(BlogSessionState, input_schema=BlogSessionState, output_schema=BlogSessionState)
 
 # Add nodes
-workflow.add_node("spec_agent", spec_agent_node)
-workflow.add_node("structure_agent", structure_agent_node)
-workflow.add_node("writing_agent", writing_agent_node)
+workflow.add_node("spec_agent", agent_node("spec_agent", aspec_agent_node))
+workflow.add_node("structure_agent", agent_node("structure_agent", astructure_agent_node))
+workflow.add_node("writing_agent", agent_node("writing_agent", awriting_agent_node))
 workflow.add_node("human_review", human_review_node)
 
 # Set entry point
@@ -85,6 +89,17 @@ workflow.add_edge("structure_agent", "human_review")
 # Writing Agent -> Human Review
 workflow.add_edge("writing_agent", "human_review")
 
-# Compile the graph
-memory = MemorySaver()
-app_graph = workflow.compile(checkpointer=memory, interrupt_before=["human_review"])
+_app_graph: Optional[CompiledStateGraph] = None
+
+def get_app_graph() -> CompiledStateGraph:
+    """
+    The compiled application graph, built on first use.
+    The checkpointer is selected by [checkpointer] in config.toml. With the default
+    SQLite backend, sessions survive restarts and can be resumed by any worker process.
+    Importing this module therefore neither reads config.toml nor opens the database.
+    """
+    global _app_graph
+    if _app_graph is None:
+        checkpointer = create_checkpointer(load_config().get("checkpointer", {}))
+        _app_graph = workflow.compile(checkpointer=checkpointer, interrupt_before=["human_review"])
+    return _app_graph
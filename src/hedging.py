@@ -0,0 +1,341 @@
+"""
+Deadlines, hedged requests and a circuit breaker for agent LLM calls.
+
+get_llm() wraps an agent's model in HedgedChatModel when the agent has
+`deadline_seconds` or `fallback_llm` (config.toml):
+
+- deadline: the whole call (first token to last) must finish within
+  deadline_seconds, otherwise LLMDeadlineExceeded is raised
+- hedging: when the primary model has not produced its first token after
+  hedge_after_seconds, the same request is also sent to fallback_llm. The
+  first to respond is streamed, and the other request is cancelled
+- failover: a primary that fails before its first token is replaced by the
+  fallback right away
+- circuit breaker ([circuit_breaker]): a model that failed
+  failure_threshold times in a row is skipped for reset_seconds, then
+  a single probe call decides whether it is used again
+
+Hedging needs the async path; sync calls only get failover and the breaker.
+
+The caller's scheduler slot (src/scheduler.py) is taken for the primary model,
+so a request to the fallback first waits for a slot of its own: the
+fallback's [scheduler.models] limits apply to hedged and failover requests too.
+"""
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.chat_models import agenerate_from_stream, generate_from_stream
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig
+from src.config import load_config
+from src.metrics import REGISTRY, Counter, Gauge
+from src.scheduler import estimate_tokens, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# fired: a hedge request was sent; won: the hedge answered first;
+# failover: the fallback was used because the primary failed or its circuit is open;
+# deadline: the call ran out of time
+HEDGE_EVENTS = REGISTRY.register(Counter(
+    "mabg_llm_hedge_events_total", "Hedged / failover LLM requests by outcome", ("agent", "event"),
+))
+CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    "mabg_llm_circuit_open", "1 while the circuit breaker skips the model", ("model",),
+))
+
+# Inner requests must not report to the caller's callbacks (e.g. the LangGraph
+# message stream): only the winner's chunks are emitted, by the wrapper's own run
+_NO_CALLBACKS: RunnableConfig = {"callbacks": []}
+
+class LLMDeadlineExceeded(TimeoutError):
+    pass
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker, per model name."""
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._probing: set = set()
+        self._lock = threading.Lock()
+
+    def allow(self, model: str) -> bool:
+        """False while the circuit is open; after reset_seconds one probe call is let through."""
+        return self.admit(model)[0]
+
+    def admit(self, model: str) -> Tuple[bool, bool]:
+        """
+        (allowed, probe): probe is True for the single call let through an open
+        circuit. Its caller must end it with record_success / record_failure,
+        or release() when the call ends without an outcome (lost a hedge race, cancelled).
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(model)
+            if opened_at is None:
+                return True, False
+            if time.monotonic() - opened_at < self.reset_seconds or model in self._probing:
+                return False, False
+            self._probing.add(model)
+            return True, True
+
+    def release(self, model: str) -> None:
+        """Let another probe through; the circuit stays open. A no-op once the probe recorded an outcome."""
+        with self._lock:
+            self._probing.discard(model)
+
+    def record_success(self, model: str) -> None:
+        with self._lock:
+            self._failures.pop(model, None)
+            self._opened_at.pop(model, None)
+            self._probing.discard(model)
+        CIRCUIT_OPEN.set(0, model=model)
+
+    def record_failure(self, model: str) -> None:
+        with self._lock:
+            self._failures[model] = failures = self._failures.get(model, 0) + 1
+            probe_failed = model in self._probing
+            self._probing.discard(model)
+            if failures < self.failure_threshold and not probe_failed:
+                return
+            self._opened_at[model] = time.monotonic()
+        CIRCUIT_OPEN.set(1, model=model)
+        logger.warning("Circuit opened for %s after %d consecutive failures", model, failures)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                model: {"failures": failures, "open": model in self._opened_at}
+                for model, failures in self._failures.items()
+            }
+
+_breaker: Optional[CircuitBreaker] = None
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        settings = load_config().get("circuit_breaker", {})
+        _breaker = CircuitBreaker(
+            failure_threshold=int(settings.get("failure_threshold", 3)),
+            reset_seconds=float(settings.get("reset_seconds", 60.0)),
+        )
+    return _breaker
+
+def _model_name(llm: BaseChatModel) -> str:
+    return str(getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__)
+
+@dataclass
+class _Attempt:
+    model: str
+    stream: AsyncIterator[AIMessageChunk]
+    first: "asyncio.Task[Optional[AIMessageChunk]]"
+    probe: bool = False  # Holds the breaker's half-open probe of the model
+
+async def _first_chunk(stream: AsyncIterator[AIMessageChunk]) -> Optional[AIMessageChunk]:
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+async def _scheduled_first_chunk(model: str, estimated_tokens: int, stream: AsyncIterator[AIMessageChunk]) -> Optional[AIMessageChunk]:
+    # The stream sends its request on the first __anext__, i.e. once admitted
+    async with get_scheduler().slot(model, estimated_tokens):
+        return await _first_chunk(stream)
+
+def _estimate(messages: List[BaseMessage]) -> int:
+    return estimate_tokens(*(message.content for message in messages))
+
+class HedgedChatModel(BaseChatModel):
+    """An agent's primary model with deadline, hedged fallback and circuit breaker."""
+
+    primary: BaseChatModel
+    fallback: Optional[BaseChatModel] = None
+    agent: str = "unknown"
+    model_name: str = ""
+    hedge_after_seconds: Optional[float] = None
+    deadline_seconds: Optional[float] = None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if not self.model_name:
+            self.model_name = _model_name(self.primary)
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "primary": _model_name(self.primary),
+            "fallback": _model_name(self.fallback) if self.fallback else None,
+        }
+
+    def _candidates(self) -> Tuple[List[BaseChatModel], bool]:
+        """
+        Models to use in order, and whether the primary is the breaker's probe;
+        an open circuit moves the primary behind the fallback.
+        """
+        breaker = get_circuit_breaker()
+        if self.fallback is None:
+            return [self.primary], False
+        allowed, probe = breaker.admit(_model_name(self.primary))
+        if allowed:
+            return [self.primary, self.fallback], probe
+        HEDGE_EVENTS.inc(agent=self.agent, event="failover")
+        return [self.fallback], False
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # Sync: no hedging, but fail over to the next model until a first chunk arrives
+        breaker = get_circuit_breaker()
+        candidates, probe = self._candidates()
+        for i, llm in enumerate(candidates):
+            model = _model_name(llm)
+            started = False
+            # Only the primary is covered by the caller's scheduler slot
+            slot = contextlib.nullcontext() if llm is self.primary else get_scheduler().blocking_slot(model, _estimate(messages))
+            try:
+                with slot:
+                    for chunk in llm.stream(messages, _NO_CALLBACKS, stop=stop, **kwargs):
+                        started = True
+                        yield ChatGenerationChunk(message=chunk)
+            except Exception:
+                breaker.record_failure(model)
+                if started or i == len(candidates) - 1:
+                    raise
+                HEDGE_EVENTS.inc(agent=self.agent, event="failover")
+                logger.warning("%s: %s failed, falling back to %s", self.agent, model, _model_name(candidates[i + 1]), exc_info=True)
+                continue
+            else:
+                breaker.record_success(model)
+                return
+            finally:
+                # The consumer stopped early (GeneratorExit) or the call was interrupted
+                if probe and llm is self.primary:
+                    breaker.release(model)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        deadline = time.monotonic() + self.deadline_seconds if self.deadline_seconds else None
+        winner = await self._race(messages, stop, kwargs, deadline)
+        breaker = get_circuit_breaker()
+        try:
+            chunk = winner.first.result()
+            while chunk is not None:
+                yield ChatGenerationChunk(message=chunk)
+                chunk = await self._next_chunk(winner, deadline)
+        except Exception:
+            breaker.record_failure(winner.model)
+            raise
+        else:
+            breaker.record_success(winner.model)
+        finally:
+            # Cancelled, or the consumer stopped early: no outcome for the probe
+            if winner.probe:
+                breaker.release(winner.model)
+            await winner.stream.aclose()  # type: ignore[attr-defined]
+
+    async def _next_chunk(self, attempt: _Attempt, deadline: Optional[float]) -> Optional[AIMessageChunk]:
+        if deadline is None:
+            return await _first_chunk(attempt.stream)
+        try:
+            return await asyncio.wait_for(_first_chunk(attempt.stream), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            HEDGE_EVENTS.inc(agent=self.agent, event="deadline")
+            raise LLMDeadlineExceeded(f"{self.agent}: {attempt.model} did not finish within {self.deadline_seconds}s") from None
+
+    def _start(self, llm: BaseChatModel, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any], probe: bool = False) -> _Attempt:
+        model = _model_name(llm)
+        stream = llm.astream(messages, _NO_CALLBACKS, stop=stop, **kwargs)
+        # Only the primary is covered by the caller's scheduler slot
+        first = _first_chunk(stream) if llm is self.primary else _scheduled_first_chunk(model, _estimate(messages), stream)
+        return _Attempt(model, stream, asyncio.ensure_future(first), probe and llm is self.primary)
+
+    async def _race(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any], deadline: Optional[float]) -> _Attempt:
+        """Start the candidates (the fallback after hedge_after_seconds) and return the first with a first chunk."""
+        breaker = get_circuit_breaker()
+        waiting, probe = self._candidates()
+        running = [self._start(waiting.pop(0), messages, stop, kwargs, probe)]
+        hedge_at = time.monotonic() + self.hedge_after_seconds if waiting and self.hedge_after_seconds is not None else None
+        hedge: Optional[_Attempt] = None
+        error: Optional[BaseException] = None
+        try:
+            while running:
+                now = time.monotonic()
+                timeouts = [t - now for t in (hedge_at, deadline) if t is not None]
+                done, _ = await asyncio.wait(
+                    [attempt.first for attempt in running],
+                    timeout=max(0.0, min(timeouts)) if timeouts else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for attempt in [attempt for attempt in running if attempt.first in done]:
+                    running.remove(attempt)
+                    error = attempt.first.exception()
+                    if error is None:
+                        if attempt is hedge:
+                            HEDGE_EVENTS.inc(agent=self.agent, event="won")
+                        return attempt
+                    breaker.record_failure(attempt.model)
+                    logger.warning("%s: %s failed before its first token: %r", self.agent, attempt.model, error)
+                    await attempt.stream.aclose()  # type: ignore[attr-defined]
+                    if waiting:
+                        HEDGE_EVENTS.inc(agent=self.agent, event="failover")
+                        running.append(self._start(waiting.pop(0), messages, stop, kwargs))
+                        hedge_at = None
+                if done:
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    HEDGE_EVENTS.inc(agent=self.agent, event="deadline")
+                    raise LLMDeadlineExceeded(f"{self.agent}: no response within {self.deadline_seconds}s")
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    HEDGE_EVENTS.inc(agent=self.agent, event="fired")
+                    hedge = self._start(waiting.pop(0), messages, stop, kwargs)
+                    running.append(hedge)
+                    hedge_at = None
+            assert error is not None
+            raise error
+        finally:
+            # Losers and attempts cut short by a deadline or cancellation end without an outcome
+            for attempt in running:
+                if attempt.probe:
+                    breaker.release(attempt.model)
+                attempt.first.cancel()
+                await asyncio.gather(attempt.first, return_exceptions=True)
+                await attempt.stream.aclose()  # type: ignore[attr-defined]
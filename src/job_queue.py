@@ -0,0 +1,184 @@
+"""
+Durable local job queue for agent node runs (SQLite, no broker).
+
+The Chainlit process enqueues a node run with the graph state and the
+run's session (thread_id / priority, see src/scheduler.py); worker
+processes (src/workers.py) claim jobs, append the streamed LLM output as
+progress, and store the resulting state update. A job whose worker stops
+sending heartbeats is put back in the queue.
+
+Job status: queued -> running -> done | failed, or cancelled by the web
+process (the worker stops the run at its next heartbeat). Interactive jobs
+are claimed before batch jobs.
+
+Every claim starts a new attempt (the attempts counter) with empty progress.
+Readers of the progress start over when the attempt changes, and a worker
+that lost its job to a requeue can no longer write to it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Mapping, NamedTuple, Optional
+
+class Job(NamedTuple):
+    id: str
+    node: str
+    state: Dict[str, Any]
+    attempts: int
+    configurable: Dict[str, Any]  # thread_id / priority of the graph run
+
+class JobQueue:
+    def __init__(self, path: str, busy_timeout_ms: int = 5000, max_attempts: int = 2):
+        self.path = path
+        self.max_attempts = max_attempts
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, node TEXT NOT NULL, state TEXT NOT NULL,"
+            " status TEXT NOT NULL, progress TEXT NOT NULL DEFAULT '',"
+            " result TEXT, error TEXT, worker TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        if "configurable" not in {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            # Queues created before jobs carried their session
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN configurable TEXT NOT NULL DEFAULT '{}'")
+
+    def enqueue(self, node: str, state: Mapping[str, Any], configurable: Optional[Dict[str, Any]] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, node, state, configurable, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, node, json.dumps(dict(state), ensure_ascii=False), json.dumps(configurable or {}), time.time()),
+            )
+        return job_id
+
+    def claim(self, worker: str, stale_seconds: Optional[float] = None) -> Optional[Job]:
+        """
+        Take the oldest queued job, interactive before batch. With stale_seconds,
+        running jobs without a heartbeat for that long are first requeued (or
+        failed after max_attempts).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if stale_seconds is not None:
+                    self._requeue_stale(now - stale_seconds)
+                row = self._conn.execute(
+                    "SELECT id, node, state, attempts, configurable FROM jobs WHERE status = 'queued'"
+                    " ORDER BY ifnull(json_extract(configurable, '$.priority'), '') = 'batch', created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+                        " started_at = ?, heartbeat_at = ?, progress = '' WHERE id = ?",
+                        (worker, now, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return Job(row[0], row[1], json.loads(row[2]), row[3] + 1, json.loads(row[4]))
+
+    def _requeue_stale(self, before: float) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'worker lost', finished_at = ?"
+            " WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+            (time.time(), before, self.max_attempts),
+        )
+        self._conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat_at < ?",
+            (before,),
+        )
+
+    def heartbeat(self, job_id: str, progress: str = "", attempt: Optional[int] = None) -> str:
+        """
+        Append streamed output and refresh the heartbeat; returns the job status.
+        With `attempt` (Job.attempts), a job that was requeued and claimed again
+        since is reported as "requeued" and left untouched.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = progress || ?, heartbeat_at = ?"
+                " WHERE id = ? AND status = 'running' AND attempts = ifnull(?, attempts)",
+                (progress, time.time(), job_id, attempt),
+            )
+            row = self._conn.execute("SELECT status, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return "cancelled"
+        return "requeued" if attempt is not None and row[1] != attempt else row[0]
+
+    def complete(self, job_id: str, result: Mapping[str, Any], progress: str = "", attempt: Optional[int] = None) -> None:
+        self._finish(job_id, "done", json.dumps(dict(result), ensure_ascii=False), None, progress, attempt)
+
+    def fail(self, job_id: str, error: str, progress: str = "", attempt: Optional[int] = None) -> None:
+        self._finish(job_id, "failed", None, error, progress, attempt)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str], progress: str, attempt: Optional[int]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, progress = progress || ?, finished_at = ?"
+                " WHERE id = ? AND status = 'running' AND attempts = ifnull(?, attempts)",
+                (status, result, error, progress, time.time(), job_id, attempt),
+            )
+
+    def cancel(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+
+    def get(self, job_id: str, progress_from: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Job status, result and the progress text from character progress_from on.
+        The progress belongs to the current attempt: start over at 0 when "attempts" changes.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, substr(progress, ?), result, error, created_at, started_at, finished_at, attempts"
+                " FROM jobs WHERE id = ?",
+                (progress_from + 1, job_id),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "status": row[0],
+            "progress": row[1] or "",
+            "result": json.loads(row[2]) if row[2] else None,
+            "error": row[3],
+            "created_at": row[4],
+            "started_at": row[5],
+            "finished_at": row[6],
+            "attempts": row[7],
+        }
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def depth(self) -> Dict[str, int]:
+        """Number of queued and running jobs."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall()
+        counts = {"queued": 0, "running": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+from src.metrics import REGISTRY, Counter, Gauge
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "mabg_response_cache_lookups_total", "LLM response cache lookups by result (hit, miss)", ("result",),
+))
+CACHE_EVICTIONS = REGISTRY.register(Counter(
+    "mabg_response_cache_evictions_total", "LLM response cache entries dropped as expired or over max_bytes",
+))
+CACHE_BYTES = REGISTRY.register(Gauge("mabg_response_cache_bytes", "Stored payload of the LLM response cache", ()))
+
+class SQLiteResponseCache(BaseCache):
+    """
+    Persistent, content-addressed LLM response cache.
+
+    The key is sha256(llm_string + prompt). For ChatOpenAI the llm_string holds
+    model, temperature and base_url, and the prompt is the fully rendered message list.
+    Entries older than max_age_seconds are dropped, and the least recently used
+    entries are evicted once the stored payload exceeds max_bytes.
+    Hits, misses, evictions and the stored bytes are exported as mabg_response_cache_*.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024, max_age_seconds: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        CACHE_BYTES.set(self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0])
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = _cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._evicted(1)
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            CACHE_LOOKUPS.inc(result="hit")
+        return _decode(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value = _encode(return_val)
+        if value is None:
+            return
+        key = _cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+        CACHE_BYTES.set(0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def _evict(self, now: float) -> None:
+        cursor = self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.max_age_seconds,)
+        )
+        self._evicted(max(cursor.rowcount, 0))
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            CACHE_BYTES.set(total)
+            return
+        # Least recently used first
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self._evicted(1)
+        CACHE_BYTES.set(total)
+
+    def _evicted(self, count: int) -> None:
+        self.evictions += count
+        CACHE_EVICTIONS.inc(count)
+
+def _cache_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+def _encode(generations: Sequence[Generation]) -> Optional[str]:
+    items = []
+    for generation in generations:
+        if not isinstance(generation, ChatGeneration):
+            # Only chat model responses are cached
+            return None
+        message = generation.message
+        items.append({
+            "text": generation.text,
+            "usage_metadata": getattr(message, "usage_metadata", None),
+            "response_metadata": message.response_metadata,
+        })
+    return json.dumps(items, ensure_ascii=False)
+
+def _decode(value: str) -> RETURN_VAL_TYPE:
+    return [
+        ChatGeneration(message=AIMessage(
+            content=item["text"],
+            usage_metadata=item.get("usage_metadata"),
+            response_metadata=item.get("response_metadata") or {},
+        ))
+        for item in json.loads(value)
+    ]
+
+_response_cache: Optional[SQLiteResponseCache] = None
+
+def get_response_cache(settings: Optional[Dict[str, Any]] = None) -> SQLiteResponseCache:
+    """
+    Return the process-wide response cache, creating it from the
+    [response_cache] section of config.toml on first use.
+    """
+    global _response_cache
+    if _response_cache is None:
+        settings = settings or {}
+        path = settings.get("path", ".cache/llm_responses.sqlite")
+        if path != ":memory:" and not os.path.isabs(path):
+            path = os.path.join(PROJECT_ROOT, path)
+        _response_cache = SQLiteResponseCache(
+            path,
+            max_bytes=int(settings.get("max_bytes", 100 * 1024 * 1024)),
+            max_age_seconds=float(settings.get("max_age_days", 30)) * 24 * 3600,
+        )
+    return _response_cache
@@ -0,0 +1,280 @@
+"""
+Concurrent-session load test for the Chainlit handlers ([REQ-PER-001]).
+
+Drives start / main / on_amend / on_approve in src/app.py for N simulated
+users at once, against a slow stub LLM (src/utils/fake_llm.py) and an
+in-process stand-in for the Chainlit API, and measures:
+
+- acknowledgement time per handler: from the handler call to the first
+  message it shows (send, stream start, update or prompt); removing the
+  clicked button does not count
+- event loop lag: how late a 10 ms timer fires while the users are active
+
+The run passes when the p99 acknowledgement of every handler and the p99
+loop lag are within the budget (100 ms by default).
+
+    python -m src.load_test --users 50
+    python -m src.load_test --users 200 --llm-latency 3 --tokens-per-second 30 --json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+import types
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from src import config as app_config
+from src import scheduler
+from src.utils.fake_llm import fake_llm_factory
+
+# Handlers in the order a simulated user calls them
+SCRIPT = ("start", "main", "on_amend", "on_approve", "on_approve", "on_approve")
+
+class SimulatedUser:
+    def __init__(self, index: int):
+        self.index = index
+        self.thread_id = f"load-{index}-{time.time_ns()}"
+        self.session: Dict[str, Any] = {}
+        self.first_event: Optional[float] = None
+
+    def record(self) -> None:
+        if self.first_event is None:
+            self.first_event = time.perf_counter()
+
+_current_user: ContextVar[SimulatedUser] = ContextVar("load_test_user")
+
+class _UserSession:
+    def get(self, key: str, default: Any = None) -> Any:
+        return _current_user.get().session.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        _current_user.get().session[key] = value
+
+class _Context:
+    @property
+    def session(self) -> Any:
+        return types.SimpleNamespace(thread_id=_current_user.get().thread_id)
+
+class _Message:
+    def __init__(self, content: str = "", actions: Optional[List[Any]] = None, **kwargs: Any):
+        self.content = content
+        self.actions = actions or []
+        self._streaming = False
+
+    async def send(self) -> "_Message":
+        _current_user.get().record()
+        return self
+
+    async def update(self) -> bool:
+        _current_user.get().record()
+        return True
+
+    async def stream_token(self, token: str, is_sequence: bool = False) -> None:
+        self.content = token if is_sequence else self.content + token
+        if not self._streaming:
+            self._streaming = True
+            _current_user.get().record()
+
+    async def remove(self) -> bool:
+        return True
+
+class _AskUserMessage:
+    def __init__(self, content: str = "", timeout: int = 60, **kwargs: Any):
+        self.content = content
+
+    async def send(self) -> Dict[str, str]:
+        _current_user.get().record()
+        return {"output": "全体をもう少し詳しくしてください"}
+
+class _Action:
+    def __init__(self, name: str = "", label: str = "", payload: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        self.name = name
+        self.label = label
+        self.payload = payload or {}
+
+    async def remove(self) -> None:
+        pass
+
+def _passthrough(*args: Any, **kwargs: Any) -> Any:
+    # Decorator (@cl.on_message) or decorator factory (@cl.action_callback("approve"))
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+    return lambda f: f
+
+def fake_chainlit() -> types.ModuleType:
+    """Minimal stand-in for the parts of the chainlit API used by src/app.py."""
+    module = types.ModuleType("chainlit")
+    attributes: Dict[str, Any] = {
+        "Message": _Message,
+        "AskUserMessage": _AskUserMessage,
+        "Action": _Action,
+        "user_session": _UserSession(),
+        "context": _Context(),
+    }
+    for name in ("on_app_startup", "on_chat_start", "on_chat_resume", "on_message", "on_stop", "on_chat_end", "action_callback"):
+        attributes[name] = _passthrough
+    for name, value in attributes.items():
+        setattr(module, name, value)
+    return module
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires: the event loop was blocked for that long."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def _run_user(app: Any, user: SimulatedUser, acks: Dict[str, List[float]], think_seconds: float, rng: random.Random) -> None:
+    _current_user.set(user)
+    for handler in SCRIPT:
+        await asyncio.sleep(rng.uniform(0, think_seconds))
+        user.first_event = None
+        start = time.perf_counter()
+        if handler == "start":
+            call = app.start()
+        elif handler == "main":
+            call = app.main(_Message(content=f"Load test topic {user.index}"))
+        else:
+            call = getattr(app, handler)(_Action(name=handler))
+        await call
+        if user.first_event is not None:
+            acks[handler].append(user.first_event - start)
+
+async def run_load_test(
+    users: int = 20,
+    llm_latency: float = 2.0,
+    tokens_per_second: float = 50.0,
+    output_tokens: int = 200,
+    think_seconds: float = 0.5,
+    budget_ms: float = 100.0,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Run `users` simulated users concurrently and return the report."""
+    import src.app as app
+    from src.checkpointer import create_checkpointer
+    from src.graph import workflow
+
+    async def no_warm_up() -> int:
+        return 0
+
+    saved = {name: getattr(app, name) for name in ("cl", "get_app_graph", "warm_up_llm_connections")}
+    saved_scheduler = scheduler._scheduler
+    app.cl = fake_chainlit()
+    graph = workflow.compile(checkpointer=create_checkpointer({"backend": "memory"}), interrupt_before=["human_review"])
+    app.get_app_graph = lambda: graph
+    app.warm_up_llm_connections = no_warm_up
+    scheduler._scheduler = scheduler.LLMScheduler({})
+    app_config.set_llm_factory(fake_llm_factory(
+        latency_seconds=llm_latency, tokens_per_second=tokens_per_second, output_tokens=output_tokens
+    ))
+
+    acks: Dict[str, List[float]] = {handler: [] for handler in dict.fromkeys(SCRIPT)}
+    monitor = LoopLagMonitor()
+    rng = random.Random(seed)
+    # Objects that exist before the run (imports, and earlier runs in the same
+    # process, e.g. the test suite) would make each full GC pause the loop for
+    # longer than the budget: move them out of the collector's reach
+    gc.collect()
+    gc.freeze()
+    start = time.perf_counter()
+    monitor.start()
+    try:
+        await asyncio.gather(*(
+            _run_user(app, SimulatedUser(i), acks, think_seconds, random.Random(rng.random()))
+            for i in range(users)
+        ))
+    finally:
+        await monitor.stop()
+        gc.unfreeze()
+        for name, value in saved.items():
+            setattr(app, name, value)
+        scheduler._scheduler = saved_scheduler
+        app_config.set_llm_factory(None)
+    elapsed = time.perf_counter() - start
+
+    handlers = {
+        handler: {
+            "calls": len(values),
+            "p50_ms": 1000 * _percentile(values, 0.5),
+            "p99_ms": 1000 * _percentile(values, 0.99),
+            "max_ms": 1000 * max(values, default=0.0),
+        }
+        for handler, values in acks.items()
+    }
+    loop_lag = {
+        "p50_ms": 1000 * _percentile(monitor.lags, 0.5),
+        "p99_ms": 1000 * _percentile(monitor.lags, 0.99),
+        "max_ms": 1000 * max(monitor.lags, default=0.0),
+    }
+    failures = [f"{name} ack p99 {row['p99_ms']:.1f} ms" for name, row in handlers.items() if row["p99_ms"] > budget_ms]
+    if loop_lag["p99_ms"] > budget_ms:
+        failures.append(f"event loop lag p99 {loop_lag['p99_ms']:.1f} ms")
+    return {
+        "users": users,
+        "elapsed_seconds": elapsed,
+        "budget_ms": budget_ms,
+        "handlers": handlers,
+        "loop_lag": loop_lag,
+        "passed": not failures and all(row["calls"] for row in handlers.values()),
+        "failures": failures,
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the Chainlit handlers against the REQ-PER-001 response budget.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="Seconds to the stub LLM's first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--think-seconds", type=float, default=0.5, help="Maximum random pause between user actions")
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    # Run without a Chainlit server: src.app is imported against the stand-in API
+    sys.modules.setdefault("chainlit", fake_chainlit())
+    report = asyncio.run(run_load_test(
+        users=args.users,
+        llm_latency=args.llm_latency,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        think_seconds=args.think_seconds,
+        budget_ms=args.budget_ms,
+    ))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['users']} users, {report['elapsed_seconds']:.1f}s, budget {report['budget_ms']:.0f} ms")
+        for name, row in report["handlers"].items():
+            print(f"  {name:12s} ack p50 {row['p50_ms']:7.1f} ms  p99 {row['p99_ms']:7.1f} ms  max {row['max_ms']:7.1f} ms  ({row['calls']} calls)")
+        lag = report["loop_lag"]
+        print(f"  {'loop lag':12s}     p50 {lag['p50_ms']:7.1f} ms  p99 {lag['p99_ms']:7.1f} ms  max {lag['max_ms']:7.1f} ms")
+        print("PASS" if report["passed"] else "FAIL: " + "; ".join(report["failures"]))
+    return 0 if report["passed"] else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
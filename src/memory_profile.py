@@ -0,0 +1,385 @@
+"""
+Per-session memory accounting and idle eviction ([memory] in config.toml, opt-in).
+
+The server holds state per chat session (thread_id) in:
+- the checkpointer: every checkpoint of the thread (with backend = "memory"
+  in this process; with "sqlite" on disk, reported but not counted as memory)
+- with backend = "memory" and artifact_store enabled: the documents in the
+  process's artifact store that only this thread refers to
+- the artifact view of the session (src/artifact_view.py)
+- a finished speculation waiting for approval (src/speculation.py)
+
+memory_report() lists the largest sessions with their bytes and idle time,
+the process RSS and, on demand, a tracemalloc snapshot diff: tracing starts
+with the first diff request, and each later request shows the allocations
+that grew since the previous one. The report is served as JSON at
+admin_path on the Chainlit server and logged on SIGUSR1. The endpoint is
+only mounted with MABG_ADMIN_TOKEN set, and then requires
+"Authorization: Bearer $MABG_ADMIN_TOKEN", or with allow_loopback = true,
+and then serves loopback clients only (not safe behind a reverse proxy,
+where every request comes from the proxy).
+
+A background task measures the sessions every check_interval_seconds, in a
+worker thread, and updates the exported gauges: /metrics scrapes only read
+them. With max_rss_mb set, the same task evicts sessions idle for at
+least idle_minutes when the RSS is over the ceiling, largest first, until
+their bytes cover the excess. An
+evicted in-memory thread is deleted from the checkpointer, with the
+artifacts no other thread refers to, and cannot be resumed; with the
+sqlite backend only the in-process state is dropped.
+"""
+import asyncio
+import ipaddress
+import logging
+import os
+import re
+import secrets
+import signal
+import threading
+import tracemalloc
+from typing import Any, Dict, Iterator, List, Optional, Set, TypeGuard, Union
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from src import artifact_view, session_tasks, speculation
+from src.artifact_store import ARTIFACT_PREFIX, ArtifactSerializer, ArtifactStore
+from src.checkpointer import SqliteCheckpointer
+from src.config import load_config
+from src.metrics import REGISTRY, Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+SESSION_BYTES = REGISTRY.register(Gauge(
+    "mabg_session_memory_bytes", "Bytes held in this process for chat sessions", ("kind",),
+))
+SESSIONS = REGISTRY.register(Gauge("mabg_sessions", "Chat sessions with state in this process", ()))
+RSS_BYTES = REGISTRY.register(Gauge("mabg_process_resident_bytes", "Resident set size of the server process", ()))
+EVICTED = REGISTRY.register(Counter(
+    "mabg_evicted_sessions_total", "Idle sessions evicted because the process was over max_rss_mb", (),
+))
+
+DEFAULT_TOP_SESSIONS = 20
+
+# An artifact reference inside a serialized checkpoint
+ARTIFACT_REF_RE = re.compile(re.escape(ARTIFACT_PREFIX.encode("utf-8")) + rb"([0-9a-f]{64})")
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def in_memory(checkpointer: Optional[BaseCheckpointSaver]) -> TypeGuard[InMemorySaver]:
+    return isinstance(checkpointer, InMemorySaver)
+
+def artifact_store(checkpointer: Optional[BaseCheckpointSaver]) -> Optional[ArtifactStore]:
+    serde = getattr(checkpointer, "serde", None)
+    return serde.store if isinstance(serde, ArtifactSerializer) else None
+
+def checkpoint_bytes(checkpointer: Optional[BaseCheckpointSaver]) -> Dict[str, int]:
+    """thread_id -> serialized bytes of the thread's checkpoints, writes and channel values."""
+    if isinstance(checkpointer, SqliteCheckpointer):
+        return checkpointer.session_sizes()
+    if not isinstance(checkpointer, InMemorySaver):
+        return {}
+    sizes: Dict[str, int] = {}
+    for thread_id, namespaces in list(checkpointer.storage.items()):
+        # Reading a missing thread leaves an empty entry behind
+        if size := _payload_bytes(list(namespaces.values())):
+            sizes[thread_id] = size
+    for thread_id, value in _keyed_payloads(checkpointer):
+        sizes[thread_id] = sizes.get(thread_id, 0) + _payload_bytes(value)
+    return sizes
+
+def artifact_refs(checkpointer: InMemorySaver) -> Dict[str, Set[str]]:
+    """thread_id -> hashes of the artifacts its checkpoints and writes refer to."""
+    refs: Dict[str, Set[str]] = {}
+    for thread_id, namespaces in list(checkpointer.storage.items()):
+        if digests := _payload_refs(list(namespaces.values())):
+            refs[thread_id] = digests
+    for thread_id, value in _keyed_payloads(checkpointer):
+        if digests := _payload_refs(value):
+            refs.setdefault(thread_id, set()).update(digests)
+    return refs
+
+def artifact_bytes(checkpointer: Optional[BaseCheckpointSaver]) -> Dict[str, int]:
+    """
+    thread_id -> stored bytes of the in-memory artifacts that only this thread
+    refers to, i.e. what evicting it frees. Shared documents are not counted.
+    """
+    store = artifact_store(checkpointer)
+    if store is None or not in_memory(checkpointer):
+        return {}
+    refs = artifact_refs(checkpointer)
+    owners: Dict[str, int] = {}
+    for digests in refs.values():
+        for digest in digests:
+            owners[digest] = owners.get(digest, 0) + 1
+    stored = store.sizes(owners)
+    sizes = {}
+    for thread_id, digests in refs.items():
+        if size := sum(stored.get(digest, 0) for digest in digests if owners[digest] == 1):
+            sizes[thread_id] = size
+    return sizes
+
+def _keyed_payloads(checkpointer: InMemorySaver) -> Iterator[tuple[str, Any]]:
+    # writes and blobs are keyed by (thread_id, checkpoint_ns, ...)
+    for store in (checkpointer.writes, checkpointer.blobs):
+        for key, value in list(store.items()):
+            yield str(key[0]), value
+
+def _payloads(value: Any) -> Iterator[Union[bytes, bytearray, str]]:
+    if isinstance(value, (bytes, bytearray, str)):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _payloads(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _payloads(item)
+
+def _payload_bytes(value: Any) -> int:
+    return sum(len(payload.encode("utf-8")) if isinstance(payload, str) else len(payload) for payload in _payloads(value))
+
+def _payload_refs(value: Any) -> Set[str]:
+    return {
+        digest.decode("ascii")
+        for payload in _payloads(value)
+        for digest in ARTIFACT_REF_RE.findall(payload.encode("utf-8") if isinstance(payload, str) else payload)
+    }
+
+def session_sizes(checkpointer: Optional[BaseCheckpointSaver]) -> List[Dict[str, Any]]:
+    """Every session with state in this process or the checkpointer, largest first."""
+    checkpoints = checkpoint_bytes(checkpointer)
+    artifacts = artifact_bytes(checkpointer)
+    views = artifact_view.view_bytes()
+    speculations = speculation.speculation_bytes()
+    counted = in_memory(checkpointer)
+    sessions = []
+    for thread_id in {*checkpoints, *views, *speculations, *session_tasks.active_threads()}:
+        memory = views.get(thread_id, 0) + speculations.get(thread_id, 0)
+        if counted:
+            memory += checkpoints.get(thread_id, 0) + artifacts.get(thread_id, 0)
+        sessions.append({
+            "thread_id": thread_id,
+            "memory_bytes": memory,
+            "checkpoint_bytes": checkpoints.get(thread_id, 0),
+            "artifact_bytes": artifacts.get(thread_id, 0),
+            "view_bytes": views.get(thread_id, 0),
+            "speculation_bytes": speculations.get(thread_id, 0),
+            "idle_seconds": session_tasks.idle_seconds(thread_id),
+            "running": session_tasks.is_running(thread_id),
+        })
+    sessions.sort(key=lambda session: (session["memory_bytes"], session["checkpoint_bytes"]), reverse=True)
+    return sessions
+
+# Snapshot of the previous diff request
+_baseline: Optional[tracemalloc.Snapshot] = None
+# Reports run in worker threads (see mount_memory_endpoint)
+_baseline_lock = threading.Lock()
+
+def snapshot_diff(limit: int = 20, frames: int = 1) -> Dict[str, Any]:
+    """
+    Allocation growth since the previous call, by source line. The first call
+    starts tracemalloc (tracing slows allocations down) and returns no stats.
+    """
+    global _baseline
+    with _baseline_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            _baseline = None
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        stats = snapshot.compare_to(_baseline, "lineno") if _baseline is not None else []
+        _baseline = snapshot
+        traced, peak = tracemalloc.get_traced_memory()
+    return {
+        "traced_bytes": traced,
+        "peak_traced_bytes": peak,
+        "top": [
+            {"location": str(stat.traceback), "size_diff": stat.size_diff, "size": stat.size, "count_diff": stat.count_diff}
+            for stat in stats[:limit]
+        ],
+    }
+
+def stop_tracing() -> None:
+    global _baseline
+    with _baseline_lock:
+        tracemalloc.stop()
+        _baseline = None
+
+def memory_report(checkpointer: Optional[BaseCheckpointSaver], top: int = DEFAULT_TOP_SESSIONS, diff: bool = False) -> Dict[str, Any]:
+    sessions = session_sizes(checkpointer)
+    report: Dict[str, Any] = {
+        "rss_bytes": rss_bytes(),
+        "checkpointer": type(checkpointer).__name__,
+        "checkpoints_in_memory": in_memory(checkpointer),
+        "sessions": len(sessions),
+        "session_memory_bytes": sum(session["memory_bytes"] for session in sessions),
+        "largest_sessions": sessions[:top],
+    }
+    store = artifact_store(checkpointer)
+    if store is not None:
+        # Shared by all sessions: documents are stored once per content
+        report["artifact_store"] = store.stats()
+    if diff:
+        report["tracemalloc"] = snapshot_diff(top)
+    return report
+
+def log_memory_report(checkpointer: Optional[BaseCheckpointSaver], top: int = DEFAULT_TOP_SESSIONS) -> None:
+    report = memory_report(checkpointer, top)
+    logger.warning(
+        "Memory: RSS %.1f MiB, %d sessions holding %.1f MiB",
+        report["rss_bytes"] / 2**20, report["sessions"], report["session_memory_bytes"] / 2**20,
+    )
+    for session in report["largest_sessions"]:
+        logger.warning(
+            "  %s: %d bytes (checkpoints %d, artifacts %d, view %d, speculation %d), idle %s s%s",
+            session["thread_id"], session["memory_bytes"], session["checkpoint_bytes"], session["artifact_bytes"], session["view_bytes"],
+            session["speculation_bytes"], "-" if session["idle_seconds"] is None else f"{session['idle_seconds']:.0f}",
+            ", running" if session["running"] else "",
+        )
+
+async def evict_session(checkpointer: Optional[BaseCheckpointSaver], thread_id: str) -> None:
+    """Drop the session's state from this process (and its in-memory checkpoints and artifacts)."""
+    speculation.cancel_speculation(thread_id)
+    artifact_view.discard_view(thread_id)
+    if in_memory(checkpointer):
+        store = artifact_store(checkpointer)
+        referenced = artifact_refs(checkpointer).get(thread_id, set()) if store is not None else set()
+        await checkpointer.adelete_thread(thread_id)
+        if store is not None and referenced:
+            # Documents that other threads refer to stay
+            store.delete(referenced.difference(*artifact_refs(checkpointer).values()))
+    session_tasks.forget(thread_id)
+    EVICTED.inc()
+
+async def evict_idle_sessions(
+    checkpointer: Optional[BaseCheckpointSaver],
+    max_rss_bytes: int,
+    idle_seconds: float,
+    rss: Optional[int] = None,
+    sessions: Optional[List[Dict[str, Any]]] = None,
+) -> List[str]:
+    """
+    When the RSS is over max_rss_bytes, evict idle sessions, largest first,
+    until their bytes cover the excess. Returns the evicted thread_ids.
+    `sessions` is a session_sizes() result to reuse.
+    """
+    rss = rss_bytes() if rss is None else rss
+    excess = rss - max_rss_bytes
+    if excess <= 0:
+        return []
+    evicted: List[str] = []
+    freed = 0
+    for session in session_sizes(checkpointer) if sessions is None else sessions:
+        if freed >= excess or session["memory_bytes"] == 0:
+            break
+        # Sessions without a run in this process (e.g. restored from a checkpoint) count as idle
+        idle = session["idle_seconds"]
+        if session["running"] or (idle is not None and idle < idle_seconds):
+            continue
+        await evict_session(checkpointer, session["thread_id"])
+        evicted.append(session["thread_id"])
+        freed += session["memory_bytes"]
+    if evicted:
+        logger.warning(
+            "RSS %.1f MiB over the %.1f MiB ceiling: evicted %d idle sessions (%.1f MiB)",
+            rss / 2**20, max_rss_bytes / 2**20, len(evicted), freed / 2**20,
+        )
+    return evicted
+
+def _set_gauges(checkpointer: Optional[BaseCheckpointSaver], sessions: List[Dict[str, Any]], rss: int) -> None:
+    SESSIONS.set(len(sessions))
+    RSS_BYTES.set(rss)
+    counted = in_memory(checkpointer)
+    SESSION_BYTES.set(sum(session["checkpoint_bytes"] for session in sessions) if counted else 0, kind="checkpoints")
+    SESSION_BYTES.set(sum(session["artifact_bytes"] for session in sessions) if counted else 0, kind="artifacts")
+    SESSION_BYTES.set(sum(session["view_bytes"] for session in sessions), kind="views")
+    SESSION_BYTES.set(sum(session["speculation_bytes"] for session in sessions), kind="speculations")
+
+async def _memory_loop(checkpointer: Optional[BaseCheckpointSaver], max_rss_bytes: int, idle_seconds: float, interval: float) -> None:
+    while True:
+        try:
+            # The checkpoint scan (SQLite queries with the sqlite backend) stays off the event loop
+            sessions = await asyncio.to_thread(session_sizes, checkpointer)
+            rss = rss_bytes()
+            _set_gauges(checkpointer, sessions, rss)
+            if max_rss_bytes > 0:
+                await evict_idle_sessions(checkpointer, max_rss_bytes, idle_seconds, rss, sessions)
+        except Exception:
+            logger.exception("Session memory accounting failed")
+        await asyncio.sleep(interval)
+
+# Strong reference to the accounting / eviction task
+_memory_task: Optional[asyncio.Task] = None
+
+def start_memory_policy(checkpointer: Optional[BaseCheckpointSaver], settings: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    If [memory] enabled: refresh the session gauges in the background, log the
+    report on SIGUSR1 and evict idle sessions over max_rss_mb (> 0). Must run
+    on the event loop.
+    """
+    global _memory_task
+    settings = load_config().get("memory", {}) if settings is None else settings
+    if not settings.get("enabled", False):
+        return False
+    loop = asyncio.get_running_loop()
+    top = int(settings.get("top_sessions", DEFAULT_TOP_SESSIONS))
+    try:
+        loop.add_signal_handler(signal.SIGUSR1, log_memory_report, checkpointer, top)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        # No SIGUSR1 (Windows) or not the main thread
+        logger.info("Memory report on SIGUSR1 is not available; use the admin endpoint")
+    if _memory_task is None:
+        _memory_task = loop.create_task(_memory_loop(
+            checkpointer,
+            int(float(settings.get("max_rss_mb", 0)) * 2**20),
+            float(settings.get("idle_minutes", 30)) * 60,
+            float(settings.get("check_interval_seconds", 60)),
+        ))
+    return True
+
+def mount_memory_endpoint(
+    app: Any,
+    checkpointer: Optional[BaseCheckpointSaver],
+    path: str = "/admin/memory",
+    top: int = DEFAULT_TOP_SESSIONS,
+    token: Optional[str] = None,
+    allow_loopback: bool = False,
+) -> bool:
+    """
+    Serve memory_report() as JSON at `path` (`?diff=1` adds the tracemalloc diff,
+    `?top=N` sets the number of sessions), in front of Chainlit's catch-all route.
+    With `token`, requests must send "Authorization: Bearer <token>"; without it,
+    only loopback clients are served, and only if allow_loopback opts in.
+    Everyone else gets 403. Returns False if the endpoint was not mounted.
+    """
+    from fastapi import Request
+    from fastapi.responses import JSONResponse
+
+    if not token and not allow_loopback:
+        logger.warning("Memory endpoint %s not mounted: set MABG_ADMIN_TOKEN (or [memory] allow_loopback)", path)
+        return False
+
+    async def memory_endpoint(request: Request, diff: bool = False, top: int = top) -> JSONResponse:
+        if not _is_admin(request, token):
+            return JSONResponse({"detail": "Forbidden"}, status_code=403)
+        # The checkpoint scan and take_snapshot() are synchronous: keep them off the event loop
+        return JSONResponse(await asyncio.to_thread(memory_report, checkpointer, top, diff))
+
+    app.add_api_route(path, memory_endpoint, methods=["GET"], include_in_schema=False)
+    app.router.routes.insert(0, app.router.routes.pop())
+    return True
+
+def _is_admin(request: Any, token: Optional[str]) -> bool:
+    if token:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and secrets.compare_digest(credentials.strip().encode("utf-8"), token.encode("utf-8"))
+    host = request.client.host if request.client else ""
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
@@ -0,0 +1,275 @@
+"""
+In-process metrics in Prometheus text format.
+
+- LLMMetricsCallback: LangChain callback recording latency, time to first token,
+  prompt/completion tokens and errors per agent / model / operation
+- timed_node: graph node wrapper recording node latency and errors, and labelling
+  the LLM calls made inside the node (agent = node name, operation = generate | refine)
+- scheduler queue wait (observed by src/scheduler.py)
+- mount_metrics_endpoint: GET /metrics on the Chainlit FastAPI app
+"""
+import functools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union, cast
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGenerationChunk, GenerationChunk, LLMResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._format_labels(key)} {value:g}" for key, value in self._values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: Any) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def sum(self, **labels: Any) -> float:
+        entry = self._values.get(self._key(labels))
+        return entry[1] if entry else 0.0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', f'{bound:g}'))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {total:g}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a function that updates gauges right before each scrape."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+LLM_LABELS = ("agent", "model", "operation")
+LLM_LATENCY = REGISTRY.register(Histogram("mabg_llm_request_seconds", "LLM call latency", LLM_LABELS))
+LLM_TTFT = REGISTRY.register(Histogram("mabg_llm_time_to_first_token_seconds", "Time to first streamed token", LLM_LABELS))
+LLM_TOKENS = REGISTRY.register(Counter("mabg_llm_tokens_total", "LLM tokens by type (prompt, completion, cached, cache_write)", (*LLM_LABELS, "type")))
+LLM_ERRORS = REGISTRY.register(Counter("mabg_llm_errors_total", "Failed LLM calls", (*LLM_LABELS, "error")))
+NODE_LATENCY = REGISTRY.register(Histogram("mabg_node_seconds", "Graph node latency", ("node", "operation")))
+NODE_ERRORS = REGISTRY.register(Counter("mabg_node_errors_total", "Graph node failures", ("node", "operation", "error")))
+QUEUE_WAIT = REGISTRY.register(
+    Histogram("mabg_scheduler_queue_wait_seconds", "Time an LLM call waited for a scheduler slot", ("model", "priority"),
+              buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+)
+QUEUE_DEPTH = REGISTRY.register(Gauge("mabg_scheduler_queue_depth", "LLM calls waiting for a scheduler slot", ("model",)))
+
+# (agent, operation) of the graph node currently running in this context
+_node_labels: ContextVar[Tuple[str, str]] = ContextVar("mabg_node_labels", default=("unknown", "generate"))
+
+NodeT = TypeVar("NodeT", bound=Callable[..., Awaitable[Any]])
+
+def timed_node(name: str, node: NodeT) -> NodeT:
+    """
+    Wrap an async agent node: record its latency and errors, and label the LLM
+    calls it makes. The operation is "refine" when the node runs on user feedback.
+    """
+    @functools.wraps(node)
+    async def wrapper(state: Any) -> Any:
+        operation = "refine" if state.get("user_feedback") else "generate"
+        token = _node_labels.set((name, operation))
+        start = time.perf_counter()
+        try:
+            return await node(state)
+        except Exception as e:
+            NODE_ERRORS.inc(node=name, operation=operation, error=type(e).__name__)
+            raise
+        finally:
+            NODE_LATENCY.observe(time.perf_counter() - start, node=name, operation=operation)
+            _node_labels.reset(token)
+    return cast(NodeT, wrapper)
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Records latency, TTFT, tokens and errors of chat model calls.
+    Create one per agent call: the agent / operation labels are taken from the
+    node that is running when the handler is created.
+    """
+
+    run_inline = True  # Cheap bookkeeping only; no need for an executor in async runs
+
+    def __init__(self, agent: Optional[str] = None, operation: Optional[str] = None, model: Optional[str] = None):
+        current_agent, current_operation = _node_labels.get()
+        self.agent = agent or current_agent
+        self.operation = operation or current_operation
+        self.model = model
+        # run_id -> (model, start time, first token seen)
+        self._runs: Dict[UUID, Tuple[str, float, bool]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = self.model or (metadata or {}).get("ls_model_name") or params.get("model_name") or params.get("model") or "unknown"
+        self._runs[run_id] = (str(model), time.perf_counter(), False)
+
+    def on_llm_new_token(
+        self,
+        token: Union[str, List[Union[str, Dict[str, Any]]]],
+        *,
+        chunk: Optional[Union[GenerationChunk, ChatGenerationChunk]] = None,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        run = self._runs.get(run_id)
+        if run is None or run[2]:
+            return
+        model, start, _ = run
+        self._runs[run_id] = (model, start, True)
+        LLM_TTFT.observe(time.perf_counter() - start, **self._labels(model))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        model, start, _ = run
+        labels = self._labels(model)
+        LLM_LATENCY.observe(time.perf_counter() - start, **labels)
+        usage = _token_usage(response)
+        for token_type, tokens in usage.items():
+            LLM_TOKENS.inc(tokens, type=token_type, **labels)
+        logger.info(
+            "LLM call %s/%s (%s): %d prompt tokens, %d cached, %d written to cache",
+            self.agent, self.operation, model, usage["prompt"], usage["cached"], usage["cache_write"],
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        model = run[0] if run else "unknown"
+        LLM_ERRORS.inc(error=type(error).__name__, **self._labels(model))
+
+    def _labels(self, model: str) -> Dict[str, str]:
+        return {"agent": self.agent, "model": model, "operation": self.operation}
+
+def _token_usage(response: LLMResult) -> Dict[str, int]:
+    """Tokens by type; cached / cache_write are the prompt tokens read from / written to the provider's prompt cache."""
+    totals = {"prompt": 0, "completion": 0, "cached": 0, "cache_write": 0}
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                details = usage.get("input_token_details") or {}
+                totals["prompt"] += usage.get("input_tokens", 0)
+                totals["completion"] += usage.get("output_tokens", 0)
+                totals["cached"] += details.get("cache_read") or 0
+                totals["cache_write"] += details.get("cache_creation") or 0
+    if not (totals["prompt"] or totals["completion"]):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        totals["prompt"] = usage.get("prompt_tokens", 0)
+        totals["completion"] = usage.get("completion_tokens", 0)
+        totals["cached"] = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return totals
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+def mount_metrics_endpoint(app: Any, path: str = "/metrics") -> None:
+    """
+    Serve render_metrics() at `path` on a FastAPI app (the Chainlit server).
+    The route is moved to the front so that Chainlit's catch-all frontend route does not shadow it.
+    """
+    from fastapi.responses import PlainTextResponse
+
+    async def metrics_endpoint() -> PlainTextResponse:
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    app.add_api_route(path, metrics_endpoint, methods=["GET"], include_in_schema=False)
+    app.router.routes.insert(0, app.router.routes.pop())
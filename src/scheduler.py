@@ -0,0 +1,238 @@
+"""
+Process-wide LLM request scheduler.
+
+Every agent LLM call goes through a slot of the scheduler:
+- per-model token buckets for requests/min and tokens/min ([scheduler] in config.toml)
+- per-session fair queuing: sessions waiting on the same model are served round-robin
+- interactive sessions are served before batch jobs (configurable "priority")
+- queue depth and wait time metrics (scheduler_stats)
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+from langgraph.config import get_config
+from src.config import load_config
+from src.metrics import QUEUE_DEPTH, QUEUE_WAIT, REGISTRY
+
+PRIORITIES = ("interactive", "batch")
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to one minute of capacity."""
+
+    def __init__(self, rate_per_minute: Optional[float]):
+        self.rate = rate_per_minute / 60.0 if rate_per_minute else None
+        self.capacity = float(rate_per_minute) if rate_per_minute else 0.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        if self.rate is None:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Take units; the level may go negative to charge for underestimates."""
+        if self.rate is None:
+            return
+        self._refill()
+        self.level -= amount
+
+    def _refill(self) -> None:
+        if self.rate is None:
+            return  # Unlimited: the level is never used
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+class Ticket:
+    def __init__(self, session_id: str, priority: str, estimated_tokens: int):
+        self.session_id = session_id
+        self.priority = priority
+        self.estimated_tokens = estimated_tokens
+        self.used_tokens: Optional[int] = None  # Set by the caller once the usage is known
+        self.enqueued_at = time.monotonic()
+        self.future: Optional[asyncio.Future] = None
+
+class _ModelQueue:
+    def __init__(self, limits: Dict[str, Any]):
+        self.requests = TokenBucket(limits.get("requests_per_minute"))
+        self.tokens = TokenBucket(limits.get("tokens_per_minute"))
+        # priority -> session_id -> waiting tickets (round-robin over sessions)
+        self.waiting: Dict[str, "OrderedDict[str, Deque[Ticket]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def depth(self) -> int:
+        return sum(len(q) for sessions in self.waiting.values() for q in sessions.values())
+
+    def peek(self) -> Optional[Ticket]:
+        for priority in PRIORITIES:
+            sessions = self.waiting[priority]
+            if sessions:
+                return next(iter(sessions.values()))[0]
+        return None
+
+    def pop(self, ticket: Ticket) -> None:
+        sessions = self.waiting[ticket.priority]
+        queue = sessions.pop(ticket.session_id)
+        queue.popleft()
+        if queue:
+            # The session goes to the back of the round-robin
+            sessions[ticket.session_id] = queue
+
+    def remove(self, ticket: Ticket) -> None:
+        sessions = self.waiting[ticket.priority]
+        queue = sessions.get(ticket.session_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del sessions[ticket.session_id]
+
+class LLMScheduler:
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        settings = settings or {}
+        self.default_limits: Dict[str, Any] = {
+            key: settings[key] for key in ("requests_per_minute", "tokens_per_minute") if key in settings
+        }
+        self.model_limits: Dict[str, Dict[str, Any]] = settings.get("models", {})
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._lock = threading.Lock()  # Buckets are shared with the blocking (sync) path
+        self.stats: Dict[str, Any] = {
+            "admitted": {p: 0 for p in PRIORITIES},
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        model: str,
+        estimated_tokens: int,
+        session_id: Optional[str] = None,
+        priority: Optional[str] = None,
+    ) -> AsyncIterator[Ticket]:
+        """Wait for a fair, rate-limited turn to call `model`."""
+        default_session, default_priority = _current_session()
+        ticket = Ticket(session_id or default_session, priority or default_priority, estimated_tokens)
+        await self._acquire(model, ticket)
+        try:
+            yield ticket
+        finally:
+            self._settle(model, ticket)
+
+    @contextmanager
+    def blocking_slot(self, model: str, estimated_tokens: int) -> Iterator[Ticket]:
+        """Rate-limited turn for the synchronous path (no fair queuing)."""
+        ticket = Ticket("sync", "interactive", estimated_tokens)
+        queue = self._queue(model)
+        while True:
+            with self._lock:
+                wait = max(queue.requests.wait_time(1), queue.tokens.wait_time(estimated_tokens))
+                if wait == 0:
+                    self._admit(model, queue, ticket)
+                    break
+            time.sleep(wait)
+        try:
+            yield ticket
+        finally:
+            self._settle(model, ticket)
+
+    def queue_depth(self) -> Dict[str, int]:
+        return {model: queue.depth() for model, queue in self._queues.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        admitted = sum(self.stats["admitted"].values())
+        return {
+            **self.stats,
+            "admitted": dict(self.stats["admitted"]),
+            "wait_seconds_avg": self.stats["wait_seconds_total"] / admitted if admitted else 0.0,
+            "queue_depth": self.queue_depth(),
+        }
+
+    async def _acquire(self, model: str, ticket: Ticket) -> None:
+        queue = self._queue(model)
+        ticket.future = asyncio.get_running_loop().create_future()
+        queue.waiting[ticket.priority].setdefault(ticket.session_id, deque()).append(ticket)
+        self._dispatch(model)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            queue.remove(ticket)
+            self._dispatch(model)
+            raise
+
+    def _dispatch(self, model: str) -> None:
+        """Admit waiting tickets in priority / round-robin order while the buckets allow."""
+        queue = self._queues[model]
+        if queue.timer is not None:
+            queue.timer.cancel()
+            queue.timer = None
+        with self._lock:
+            while (ticket := queue.peek()) is not None:
+                wait = max(queue.requests.wait_time(1), queue.tokens.wait_time(ticket.estimated_tokens))
+                if wait > 0:
+                    queue.timer = asyncio.get_running_loop().call_later(wait, self._dispatch, model)
+                    return
+                queue.pop(ticket)
+                self._admit(model, queue, ticket)
+                if ticket.future is not None and not ticket.future.done():
+                    ticket.future.set_result(None)
+
+    def _admit(self, model: str, queue: _ModelQueue, ticket: Ticket) -> None:
+        queue.requests.consume(1)
+        queue.tokens.consume(ticket.estimated_tokens)
+        waited = time.monotonic() - ticket.enqueued_at
+        QUEUE_WAIT.observe(waited, model=model, priority=ticket.priority)
+        self.stats["admitted"][ticket.priority] += 1
+        self.stats["wait_seconds_total"] += waited
+        self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+
+    def _settle(self, model: str, ticket: Ticket) -> None:
+        """Charge (or refund) the difference between estimated and actual token usage."""
+        if ticket.used_tokens is None:
+            return
+        with self._lock:
+            self._queue(model).tokens.consume(ticket.used_tokens - ticket.estimated_tokens)
+
+    def _queue(self, model: str) -> _ModelQueue:
+        if model not in self._queues:
+            self._queues[model] = _ModelQueue({**self.default_limits, **self.model_limits.get(model, {})})
+        return self._queues[model]
+
+def _current_session() -> Tuple[str, str]:
+    """(session_id, priority) from the LangGraph run config, if called inside a graph run."""
+    try:
+        configurable = get_config().get("configurable", {})
+    except RuntimeError:
+        configurable = {}
+    priority = configurable.get("priority", "interactive")
+    if priority not in PRIORITIES:
+        priority = "interactive"
+    return str(configurable.get("thread_id", "default")), priority
+
+def estimate_tokens(*texts: Any) -> int:
+    """Rough prompt size estimate (about 4 characters per token)."""
+    return max(1, sum(len(str(text)) for text in texts) // 4)
+
+_scheduler: Optional[LLMScheduler] = None
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(load_config().get("scheduler", {}))
+    return _scheduler
+
+def scheduler_stats() -> Dict[str, Any]:
+    return get_scheduler().snapshot()
+
+def _collect_queue_depth() -> None:
+    if _scheduler is not None:
+        for model, depth in _scheduler.queue_depth().items():
+            QUEUE_DEPTH.set(depth, model=model)
+
+REGISTRY.add_collector(_collect_queue_depth)
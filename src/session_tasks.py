@@ -0,0 +1,190 @@
+"""
+Cancellable graph runs per chat session.
+
+src/app.py runs every graph run of a session (new topic, approve, amend)
+through run(), which keeps it as the session's task. cancel_run() cancels it:
+
+- superseded: a new topic or action arrived while the previous run was going
+- amend: the user asked for a revision while a run was going
+- stop / chat_end: Chainlit's stop button and the end of the chat session
+
+Cancelling the task cancels the running LangGraph node and, with it, the
+agent's LLM call: the streaming HTTP request is closed (with [workers], the
+job is cancelled). The interrupted node writes nothing, so the checkpoint
+stays at the last completed step.
+
+The savings are estimated per cancelled LLM call: the completion tokens and
+duration that the node's calls took on average, minus what the cancelled
+call had already produced and taken. Calls made in worker processes are
+not seen here.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGenerationChunk, GenerationChunk, LLMResult
+from src.metrics import REGISTRY, Counter, _token_usage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CANCELLED_RUNS = REGISTRY.register(Counter(
+    "mabg_cancelled_runs_total", "Session graph runs cancelled before they finished", ("reason",),
+))
+SAVED_TOKENS = REGISTRY.register(Counter(
+    "mabg_cancel_saved_tokens_total", "Estimated completion tokens not generated because the run was cancelled", ("node",),
+))
+SAVED_SECONDS = REGISTRY.register(Counter(
+    "mabg_cancel_saved_seconds_total", "Estimated LLM call seconds not spent because the run was cancelled", ("node",),
+))
+
+# Weight of the latest completed call in the per-node estimate (moving average)
+ESTIMATE_WEIGHT = 0.2
+
+# node -> (completion tokens, seconds) of its LLM calls, moving average
+_estimates: Dict[str, Tuple[float, float]] = {}
+
+def _update_estimate(node: str, tokens: float, seconds: float) -> None:
+    previous = _estimates.get(node)
+    if previous is None:
+        _estimates[node] = (tokens, seconds)
+        return
+    _estimates[node] = (
+        previous[0] + ESTIMATE_WEIGHT * (tokens - previous[0]),
+        previous[1] + ESTIMATE_WEIGHT * (seconds - previous[1]),
+    )
+
+def estimated_completion_tokens(node: str, elapsed: float) -> float:
+    """
+    Completion tokens a call of `node` has produced after `elapsed` seconds,
+    from the node's moving average (0 before any call of the node completed).
+    """
+    estimate = _estimates.get(node)
+    if estimate is None or estimate[1] <= 0:
+        return 0.0
+    return estimate[0] * min(1.0, elapsed / estimate[1])
+
+@dataclass
+class _Call:
+    node: str
+    start: float
+    tokens: int = 0
+
+class _RunTracker(BaseCallbackHandler):
+    """Follows the LLM calls of a session run to estimate what cancelling them saved."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.calls: Dict[UUID, _Call] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self.calls[run_id] = _Call((metadata or {}).get("langgraph_node", "unknown"), time.perf_counter())
+
+    def on_llm_new_token(
+        self,
+        token: Union[str, List[Union[str, Dict[str, Any]]]],
+        *,
+        chunk: Optional[Union[GenerationChunk, ChatGenerationChunk]] = None,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        call = self.calls.get(run_id)
+        if call is not None and token:
+            call.tokens += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self.calls.pop(run_id, None)
+        if call is not None:
+            # Streamed chunks approximate the tokens when the provider reports no usage
+            tokens = _token_usage(response)["completion"] or call.tokens
+            _update_estimate(call.node, tokens, time.perf_counter() - call.start)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        # A cancelled call stays in calls: non-streamed calls do not report their cancellation
+        if not isinstance(error, asyncio.CancelledError):
+            self.calls.pop(run_id, None)
+
+    def record_savings(self) -> None:
+        """Count what the calls cut short by the cancellation would still have taken."""
+        now = time.perf_counter()
+        for call in self.calls.values():
+            estimate = _estimates.get(call.node)
+            if estimate is None:
+                continue  # No completed call of this node yet to compare with
+            SAVED_TOKENS.inc(max(0.0, estimate[0] - call.tokens), node=call.node)
+            SAVED_SECONDS.inc(max(0.0, estimate[1] - (now - call.start)), node=call.node)
+        self.calls.clear()
+
+@dataclass
+class _SessionRun:
+    task: "asyncio.Task[Any]"
+    tracker: _RunTracker
+    reason: Optional[str] = None
+
+# thread_id -> the session's running graph run
+_runs: Dict[str, _SessionRun] = {}
+# thread_id -> time.monotonic() when the session's last graph run started or ended
+_last_active: Dict[str, float] = {}
+
+async def run(thread_id: str, run_fn: Callable[[Dict[str, Any]], Awaitable[T]], config: Dict[str, Any]) -> Optional[T]:
+    """
+    Run run_fn(config) as the session's graph run, after cancelling the one
+    still running. Returns None when the run is cancelled by cancel_run();
+    a cancellation of the caller itself is propagated.
+    """
+    await cancel_run(thread_id, "superseded")
+    _last_active[thread_id] = time.monotonic()
+    tracker = _RunTracker()
+    config = {**config, "callbacks": [*(config.get("callbacks") or []), tracker]}
+    session_run = _SessionRun(asyncio.ensure_future(run_fn(config)), tracker)
+    _runs[thread_id] = session_run
+    try:
+        return await session_run.task
+    except asyncio.CancelledError:
+        current = asyncio.current_task()
+        if session_run.reason is None or (current is not None and current.cancelling()):
+            raise
+        return None
+    finally:
+        _last_active[thread_id] = time.monotonic()
+        if _runs.get(thread_id) is session_run:
+            del _runs[thread_id]
+
+async def cancel_run(thread_id: Optional[str], reason: str) -> bool:
+    """
+    Cancel the session's graph run and wait until it has stopped, so that the
+    caller can update the checkpoint. Returns True if a run was cancelled.
+    """
+    session_run = _runs.pop(thread_id, None) if thread_id else None
+    if session_run is None or session_run.task.done():
+        return False
+    session_run.reason = reason
+    session_run.task.cancel()
+    CANCELLED_RUNS.inc(reason=reason)
+    logger.info("Cancelled the graph run of %s (%s)", thread_id, reason)
+    await asyncio.gather(session_run.task, return_exceptions=True)
+    session_run.tracker.record_savings()
+    return True
+
+def is_running(thread_id: str) -> bool:
+    return thread_id in _runs
+
+def idle_seconds(thread_id: str) -> Optional[float]:
+    """Seconds since the session's last graph run, None if it had none in this process."""
+    last = _last_active.get(thread_id)
+    return None if last is None else time.monotonic() - last
+
+def active_threads() -> List[str]:
+    """Sessions that had a graph run in this process."""
+    return list(_last_active)
+
+def forget(thread_id: str) -> None:
+    """Drop the activity record of an evicted session."""
+    _last_active.pop(thread_id, None)
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler, get_usage_metadata_callback
+from langchain_core.outputs import ChatGenerationChunk, GenerationChunk, LLMResult
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from src.config import load_config
+from src.metrics import REGISTRY, Counter
+from src.scheduler import estimate_tokens
+from src.session_tasks import estimated_completion_tokens
+from src.workers import agent_node
+from src.state import BlogSessionState
+from src.agents.structure import astructure_agent_node
+from src.agents.writing import awriting_agent_node
+
+logger = logging.getLogger(__name__)
+
+# result: hit (applied on approve), miss (the artifact changed or the run failed), cancelled
+SPECULATIONS = REGISTRY.register(Counter(
+    "mabg_speculations_total", "Speculative next-phase runs by how they ended", ("result",),
+))
+WASTED_TOKENS = REGISTRY.register(Counter(
+    "mabg_speculation_wasted_tokens_total", "Tokens spent on speculative runs that were discarded", ("node",),
+))
+
+NodeFn = Callable[[BlogSessionState], Awaitable[BlogSessionState]]
+
+# Phase under review -> node that runs after approval
+NEXT_NODES: Dict[str, Tuple[str, NodeFn]] = {
+    "Spec": ("structure_agent", agent_node("structure_agent", astructure_agent_node)),
+    "Structure": ("writing_agent", agent_node("writing_agent", awriting_agent_node)),
+}
+
+class _InFlightCalls(BaseCallbackHandler):
+    """
+    The speculative LLM calls still running, for the tokens they spent when
+    they are cancelled (usage metadata only arrives when a call completes).
+    """
+
+    run_inline = True
+
+    def __init__(self, node_name: str) -> None:
+        self.node_name = node_name
+        # run_id -> (start, estimated prompt tokens, streamed tokens)
+        self.calls: Dict[UUID, Tuple[float, int, int]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any) -> None:
+        prompt = estimate_tokens(*(message.content for batch in messages for message in batch))
+        self.calls[run_id] = (time.monotonic(), prompt, 0)
+
+    def on_llm_new_token(
+        self,
+        token: Union[str, List[Union[str, Dict[str, Any]]]],
+        *,
+        chunk: Optional[Union[GenerationChunk, ChatGenerationChunk]] = None,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        call = self.calls.get(run_id)
+        if call is not None and token:
+            self.calls[run_id] = (call[0], call[1], call[2] + estimate_tokens(token))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        # Counted from its usage metadata
+        self.calls.pop(run_id, None)
+
+    def partial_tokens(self) -> int:
+        """
+        Prompt plus completion tokens of the unfinished calls: the streamed
+        chunks, or for a call that does not stream, what the node's calls
+        produce in the elapsed time on average (src/session_tasks.py).
+        """
+        now = time.monotonic()
+        return int(sum(
+            prompt + max(streamed, estimated_completion_tokens(self.node_name, now - start))
+            for start, prompt, streamed in self.calls.values()
+        ))
+
+class _Speculation:
+    def __init__(self, node_name: str, fingerprint: str):
+        self.node_name = node_name
+        self.fingerprint = fingerprint
+        self.usage: Dict[str, Any] = {}
+        self.in_flight = _InFlightCalls(node_name)
+        self.task: Optional[asyncio.Task] = None
+
+# thread_id -> running or finished speculation
+_speculations: Dict[str, _Speculation] = {}
+_stats = {"started": 0, "hits": 0, "misses": 0, "cancelled": 0, "wasted_tokens": 0}
+
+def is_enabled() -> bool:
+    return bool(load_config().get("speculation", {}).get("enabled", False))
+
+def start_speculation(thread_id: str, state: BlogSessionState) -> bool:
+    """
+    While the user reviews the current artifact, generate the next phase
+    in the background as if the artifact had been approved.
+    Returns True if a speculation was started.
+    """
+    cancel_speculation(thread_id)
+    next_node = NEXT_NODES.get(state.get("phase") or "")
+    if next_node is None or state.get("outline_error"):
+        # A malformed outline cannot be approved as it is
+        return False
+
+    node_name, node_fn = next_node
+    speculation = _Speculation(node_name, _fingerprint(state))
+    approved_state: BlogSessionState = {**state, "user_feedback": None}
+
+    # The session's scheduler queue at batch priority, so that speculative calls
+    # do not compete with the live requests of any session
+    config: RunnableConfig = {
+        "configurable": {"thread_id": thread_id, "priority": "batch"},
+        "callbacks": [speculation.in_flight],
+    }
+
+    async def run() -> BlogSessionState:
+        with get_usage_metadata_callback() as callback:
+            # Shared by reference so cancel_speculation() can read partial usage
+            speculation.usage = callback.usage_metadata
+            return await RunnableLambda(node_fn).ainvoke(approved_state, config)
+
+    speculation.task = asyncio.create_task(run())
+    _speculations[thread_id] = speculation
+    _stats["started"] += 1
+    return True
+
+def _count(result: str) -> None:
+    key = {"hit": "hits", "miss": "misses", "cancelled": "cancelled"}[result]
+    _stats[key] += 1
+    SPECULATIONS.inc(result=result)
+
+async def take_speculation(thread_id: str, state: BlogSessionState) -> Optional[Tuple[str, BlogSessionState]]:
+    """
+    On approve: return (node_name, node_output) if a speculation was made from
+    this exact state, waiting for it if it is still running. Returns None on a
+    miss, in which case the caller runs the graph normally.
+    """
+    speculation = _speculations.pop(thread_id, None)
+    if speculation is None or speculation.task is None:
+        return None
+    if speculation.fingerprint != _fingerprint(state):
+        _discard(speculation)
+        _count("miss")
+        return None
+
+    try:
+        result = await speculation.task
+    except Exception:
+        logger.exception("Speculative %s run failed", speculation.node_name)
+        _discard(speculation)
+        _count("miss")
+        return None
+    _count("hit")
+    return speculation.node_name, result
+
+def cancel_speculation(thread_id: str) -> None:
+    """On amend or a new topic: cancel and discard the speculation."""
+    speculation = _speculations.pop(thread_id, None)
+    if speculation is not None:
+        _discard(speculation)
+        _count("cancelled")
+
+def speculation_bytes() -> Dict[str, int]:
+    """thread_id -> bytes of the documents held by the session's finished speculation."""
+    sizes = {}
+    for thread_id, speculation in list(_speculations.items()):
+        task = speculation.task
+        if task is not None and task.done() and not task.cancelled() and task.exception() is None:
+            sizes[thread_id] = sum(len(value.encode("utf-8")) for value in task.result().values() if isinstance(value, str))
+    return sizes
+
+def speculation_stats() -> Dict[str, Any]:
+    """Counts of this process since start (also exported as mabg_speculation*)."""
+    resolved = _stats["hits"] + _stats["misses"] + _stats["cancelled"]
+    return {**_stats, "hit_rate": _stats["hits"] / resolved if resolved else 0.0}
+
+def _discard(speculation: _Speculation) -> None:
+    if speculation.task is not None:
+        if not speculation.task.done():
+            speculation.task.cancel()
+        elif not speculation.task.cancelled():
+            speculation.task.exception()  # Mark a failure as retrieved
+    # Completed calls report their usage; calls cut short by the cancellation are estimated
+    wasted = sum(usage.get("total_tokens", 0) for usage in speculation.usage.values())
+    wasted += speculation.in_flight.partial_tokens()
+    _stats["wasted_tokens"] += wasted
+    WASTED_TOKENS.inc(wasted, node=speculation.node_name)
+    logger.info("Discarded speculative %s run (%d tokens)", speculation.node_name, wasted)
+
+def _fingerprint(state: BlogSessionState) -> str:
+    """Hash of the inputs the next phase is generated from."""
+    parts = [state.get("phase") or "", state.get("topic") or "", state.get("spec_doc") or "", state.get("structure_doc") or ""]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
@@ -1,4 +1,4 @@
-from typing import TypedDict, Optional, Literal
+from typing import Any, Dict, TypedDict, Optional, Literal
 
 class BlogSessionState(TypedDict, total=False):
     """
@@ -9,5 +9,7 @@ class BlogSessionState(TypedDict, total=False):
     topic: Optional[str]
     spec_doc: Optional[str]
     structure_doc: Optional[str]
+    outline: Optional[Dict[str, Any]] # structure_doc の構造化版 (src/agents/outline.py の Outline.model_dump())
+    outline_error: Optional[str] # structure_doc を Outline にできなかった理由。修正されるまで承認できない。
     final_article: Optional[str]
     user_feedback: Optional[str] # 現在の phase に対応する成果物へのフィードバック。承認時にクリアされる。
@@ -0,0 +1,104 @@
+"""
+Checkpoint storage per session, with and without the artifact store.
+
+Runs one scripted session through the real graph (spec -> structure -> writing,
+with `--rounds` amend rounds per phase) against a fake LLM that returns
+`--doc-kb` KiB documents, once per checkpointer setting, and reports the bytes
+stored for the session.
+
+    python -m src.utils.checkpoint_size
+    python -m src.utils.checkpoint_size --rounds 5 --doc-kb 16 --json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src import config as app_config
+from src.artifact_store import ArtifactSerializer
+from src.checkpointer import SqliteCheckpointer, create_checkpointer
+from src.graph import workflow
+
+def _documents(count: int, doc_kb: int) -> List[str]:
+    # Hash-salted lines so that the text does not compress better than real prose
+    documents = []
+    for i in range(count):
+        lines = [f"# Document {i}\n"]
+        while sum(len(line.encode("utf-8")) for line in lines) < doc_kb * 1024:
+            salt = hashlib.sha256(f"{i}-{len(lines)}".encode()).hexdigest()[:24]
+            lines.append(f"{len(lines)}. 検証用のダミー本文です {salt}\n")
+        documents.append("".join(lines))
+    return documents
+
+async def _run_session(graph: Any, thread_id: str, rounds: int) -> None:
+    config = {"configurable": {"thread_id": thread_id}}
+    await graph.ainvoke({"topic": "Checkpoint size"}, config)
+    for _phase in ("Spec", "Structure", "Writing"):
+        for i in range(rounds):
+            await graph.aupdate_state(config, {"user_feedback": f"全体をもう少し詳しくしてください ({i})"})
+            await graph.ainvoke(None, config)
+        await graph.aupdate_state(config, {"user_feedback": None})
+        await graph.ainvoke(None, config)
+
+def measure_session_bytes(rounds: int = 3, doc_kb: int = 8) -> Dict[str, Dict[str, int]]:
+    """
+    Bytes stored for one session: {"full_copies": {...}, "artifact_store": {...}}.
+    """
+    results: Dict[str, Dict[str, int]] = {}
+    llm_calls = 3 * (rounds + 1)
+    saved_llms = dict(app_config._agent_llms)
+    try:
+        for label, artifact_store in (("full_copies", False), ("artifact_store", True)):
+            llm = FakeListChatModel(responses=_documents(llm_calls, doc_kb))
+            app_config._agent_llms.update({name: llm for name in app_config.AGENT_NAMES})
+            with tempfile.TemporaryDirectory() as tmp:
+                checkpointer = create_checkpointer({
+                    "backend": "sqlite",
+                    "path": os.path.join(tmp, "checkpoints.sqlite"),
+                    "artifact_store": artifact_store,
+                })
+                assert isinstance(checkpointer, SqliteCheckpointer)
+                graph = workflow.compile(checkpointer=checkpointer, interrupt_before=["human_review"])
+                asyncio.run(_run_session(graph, "measure", rounds))
+
+                checkpoint_bytes = checkpointer.session_bytes("measure")
+                serde = checkpointer.serde
+                artifact_bytes = serde.store.stats()["stored_bytes"] if isinstance(serde, ArtifactSerializer) else 0
+                results[label] = {
+                    "checkpoints": len(list(checkpointer.list({"configurable": {"thread_id": "measure"}}))),
+                    "checkpoint_bytes": checkpoint_bytes,
+                    "artifact_bytes": artifact_bytes,
+                    "total_bytes": checkpoint_bytes + artifact_bytes,
+                }
+    finally:
+        app_config._agent_llms.clear()
+        app_config._agent_llms.update(saved_llms)
+    return results
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare checkpoint bytes per session with and without the artifact store.")
+    parser.add_argument("--rounds", type=int, default=3, help="Amend rounds per phase")
+    parser.add_argument("--doc-kb", type=int, default=8, help="Size of each generated document in KiB")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = measure_session_bytes(args.rounds, args.doc_kb)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"one session, {args.rounds} amend rounds per phase, {args.doc_kb} KiB documents:")
+    for label, row in results.items():
+        print(
+            f"  {label:15s} {row['total_bytes']:>10,d} bytes"
+            f"  ({row['checkpoints']} checkpoints: {row['checkpoint_bytes']:,d} + artifacts: {row['artifact_bytes']:,d})"
+        )
+    before, after = results["full_copies"]["total_bytes"], results["artifact_store"]["total_bytes"]
+    print(f"  reduction       {1 - after / before:.1%}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
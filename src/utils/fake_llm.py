@@ -0,0 +1,140 @@
+"""
+Deterministic stub chat model for benchmarks and load tests.
+
+FakeStreamingChatModel behaves like a remote LLM without the network: it waits
+`latency_seconds` before the first token, then streams `output_tokens` tokens at
+`tokens_per_second`, and reports usage metadata. The output is the same for the
+same prompt, and is Markdown with `##` sections so that the writing agent's
+section handling is exercised.
+
+Install it for all agents with src.config.set_llm_factory(fake_llm_factory(...)).
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, TypedDict, Unpack
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.ai import UsageMetadata
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Tokens per streamed chunk: keeps the number of sleeps low at high token rates
+CHUNK_TOKENS = 8
+
+class FakeLLMSettings(TypedDict, total=False):
+    """Keyword arguments of FakeStreamingChatModel / fake_llm_factory."""
+    model_name: str
+    latency_seconds: float
+    tokens_per_second: Optional[float]
+    output_tokens: int
+    tokens_per_section: int
+
+class FakeStreamingChatModel(BaseChatModel):
+    model_name: str = "fake-llm"
+    latency_seconds: float = 0.0
+    tokens_per_second: Optional[float] = None  # None: all tokens at once
+    output_tokens: int = 200
+    tokens_per_section: int = 50
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "latency_seconds": self.latency_seconds,
+            "tokens_per_second": self.tokens_per_second,
+            "output_tokens": self.output_tokens,
+        }
+
+    def expected_seconds(self) -> float:
+        """Time one call spends waiting on the (simulated) model."""
+        streaming = self.output_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        return self.latency_seconds + streaming
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        seed = hashlib.sha256("".join(str(m.content) for m in messages).encode("utf-8")).hexdigest()[:8]
+        tokens = []
+        for i in range(self.output_tokens):
+            if i % self.tokens_per_section == 0:
+                tokens.append(f"{chr(10) * 2 if i else ''}## Section {i // self.tokens_per_section + 1}\n")
+            tokens.append(f"w{seed}{i} ")
+        return tokens
+
+    def _chunks(self, messages: List[BaseMessage]) -> List[str]:
+        tokens = self._tokens(messages)
+        return ["".join(tokens[i:i + CHUNK_TOKENS]) for i in range(0, len(tokens), CHUNK_TOKENS)]
+
+    def _chunk_delay(self) -> float:
+        return CHUNK_TOKENS / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _usage(self, messages: List[BaseMessage]) -> UsageMetadata:
+        prompt_tokens = max(1, sum(len(str(m.content)) for m in messages) // 4)
+        return UsageMetadata(
+            input_tokens=prompt_tokens, output_tokens=self.output_tokens, total_tokens=prompt_tokens + self.output_tokens,
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.expected_seconds())
+        message = AIMessage(content="".join(self._tokens(messages)), usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.expected_seconds())
+        message = AIMessage(content="".join(self._tokens(messages)), usage_metadata=self._usage(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_seconds)
+        chunks = self._chunks(messages)
+        for i, text in enumerate(chunks):
+            if i:
+                time.sleep(self._chunk_delay())
+            usage = self._usage(messages) if i == len(chunks) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_seconds)
+        chunks = self._chunks(messages)
+        for i, text in enumerate(chunks):
+            if i:
+                await asyncio.sleep(self._chunk_delay())
+            usage = self._usage(messages) if i == len(chunks) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+def fake_llm_factory(**settings: Unpack[FakeLLMSettings]) -> Callable[[str], FakeStreamingChatModel]:
+    """get_llm replacement returning a FakeStreamingChatModel with `settings` for every agent."""
+    return lambda agent_name: FakeStreamingChatModel(**settings)
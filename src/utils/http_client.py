@@ -0,0 +1,67 @@
+import asyncio
+import importlib.util
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_clients: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+_last_warm_up = 0.0
+
+def get_http_clients(settings: Optional[Dict[str, Any]] = None) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Return the process-wide (sync, async) httpx clients shared by every agent's
+    ChatOpenAI, so all agents reuse one keep-alive connection pool per host.
+    Settings come from the [http] section of config.toml on first use.
+    The async client is bound to the event loop that first uses it (the Chainlit
+    server loop, or the asyncio.run loop of the batch CLI).
+    """
+    global _clients
+    if _clients is None:
+        settings = settings or {}
+        limits = httpx.Limits(
+            max_connections=int(settings.get("max_connections", 100)),
+            max_keepalive_connections=int(settings.get("max_keepalive_connections", 20)),
+            keepalive_expiry=float(settings.get("keepalive_expiry", 60)),
+        )
+        timeout = httpx.Timeout(
+            float(settings.get("timeout", 120)),
+            connect=float(settings.get("connect_timeout", 10)),
+        )
+        # HTTP/2 needs the optional h2 package
+        http2 = bool(settings.get("http2", True)) and importlib.util.find_spec("h2") is not None
+        _clients = (
+            httpx.Client(limits=limits, timeout=timeout, http2=http2),
+            httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2),
+        )
+    return _clients
+
+async def warm_up_connections(base_urls: Iterable[str], settings: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Open pooled connections (DNS, TCP, TLS) to the LLM endpoints before the
+    first real request. Skipped while connections from the previous warm-up
+    are still within keepalive_expiry. Returns the number of hosts reached.
+    """
+    global _last_warm_up
+    settings = settings or {}
+    keepalive_expiry = float(settings.get("keepalive_expiry", 60))
+    now = time.monotonic()
+    if _last_warm_up and now - _last_warm_up < keepalive_expiry:
+        return 0
+    _last_warm_up = now
+
+    _, client = get_http_clients(settings)
+
+    async def touch(url: str) -> bool:
+        try:
+            # Any response means the connection is open and back in the pool
+            await client.head(url, timeout=5)
+            return True
+        except httpx.HTTPError as e:
+            logger.warning("Connection warm-up to %s failed: %s", url, e)
+            return False
+
+    results = await asyncio.gather(*[touch(url) for url in sorted(set(base_urls))])
+    return sum(results)
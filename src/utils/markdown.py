@@ -0,0 +1,88 @@
+import re
+from collections import Counter
+from typing import List, NamedTuple, Optional, Tuple
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+# Outline headings are written like "H2: 見出し" (see prompts/structure_generator.md)
+HEADING_TAG_RE = re.compile(r"^H[1-6]\s*[:：]\s*")
+
+class Section(NamedTuple):
+    level: int
+    title: str
+    text: str       # Heading line + body, up to the next heading of the same or a higher level
+    tail: str = ""  # Text after a higher-level heading that closed this section, up to the next section
+
+def iter_headings(markdown: str) -> List[Tuple[int, int, str]]:
+    """
+    Return (line_index, level, title) for every ATX heading outside code fences.
+    """
+    headings = []
+    in_fence = False
+    for i, line in enumerate(markdown.splitlines()):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        match = HEADING_RE.match(line)
+        if match:
+            headings.append((i, len(match.group(1)), match.group(2)))
+    return headings
+
+def section_level(markdown: str) -> Optional[int]:
+    """
+    The heading level that splits the document into its main sections:
+    the level with the most headings (the shallower one on ties).
+    """
+    counts = Counter(level for _, level, _ in iter_headings(markdown))
+    if not counts:
+        return None
+    return min(counts, key=lambda level: (-counts[level], level))
+
+def top_section_level(markdown: str) -> Optional[int]:
+    """
+    The shallowest heading level that occurs at least twice, e.g. the H2
+    level of an article whose single H1 is the title.
+    """
+    counts = Counter(level for _, level, _ in iter_headings(markdown))
+    repeated = [level for level, count in counts.items() if count >= 2]
+    return min(repeated) if repeated else None
+
+def split_sections(markdown: str, level: Optional[int] = None) -> Tuple[str, List[Section]]:
+    """
+    Split markdown into (preamble, sections) at the given heading level
+    (section_level() by default). Deeper headings stay inside their section.
+    The split is lossless: join_sections(preamble, sections) == markdown.
+    """
+    if level is None:
+        level = section_level(markdown)
+    if level is None:
+        # No headings at all
+        return markdown, []
+    headings = iter_headings(markdown)
+    starts = [(i, title) for i, lvl, title in headings if lvl == level]
+    if not starts:
+        return markdown, []
+
+    lines = markdown.splitlines(keepends=True)
+    boundaries = [i for i, lvl, _ in headings if lvl <= level]
+
+    preamble = "".join(lines[:starts[0][0]])
+    sections = []
+    for n, (i, title) in enumerate(starts):
+        end = next((b for b in boundaries if b > i), len(lines))
+        next_start = starts[n + 1][0] if n + 1 < len(starts) else len(lines)
+        sections.append(Section(
+            level,
+            title,
+            "".join(lines[i:end]),
+            "".join(lines[end:next_start]),
+        ))
+    return preamble, sections
+
+def join_sections(preamble: str, sections: List[Section]) -> str:
+    return preamble + "".join(section.text + section.tail for section in sections)
+
+def clean_heading(title: str) -> str:
+    """Strip outline markers such as "H2:" from a heading title."""
+    return HEADING_TAG_RE.sub("", title).strip()
@@ -1,16 +1,25 @@
 import os
+import time
+from typing import Dict, List, Tuple
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "prompts")
+
+# Minimum interval between mtime checks of a cached prompt file (seconds)
+PROMPT_RECHECK_SECONDS = 2.0
+
+# prompt_name -> (last_checked, mtime, content)
+_prompt_cache: Dict[str, Tuple[float, float, str]] = {}
 
 def load_prompt(prompt_name: str) -> str:
     """
     Load a prompt file from the prompts directory.
     Removes YAML frontmatter if present.
     """
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-    prompt_path = os.path.join(project_root, "prompts", f"{prompt_name}.md")
-    
+    prompt_path = _prompt_path(prompt_name)
+
     if not os.path.exists(prompt_path):
         raise FileNotFoundError(f"Prompt file not found at {prompt_path}")
-        
+
     with open(prompt_path, "r", encoding="utf-8") as f:
         content = f.read()
         # Remove frontmatter if present
@@ -23,3 +32,43 @@ def load_prompt(prompt_name: str) -> str:
             except ValueError:
                 pass
         return content
+
+def get_prompt(prompt_name: str) -> Tuple[str, float]:
+    """
+    Cached load_prompt. Returns (content, mtime).
+    The file is re-read only when its mtime changes; the mtime itself is
+    checked at most once every PROMPT_RECHECK_SECONDS.
+    """
+    now = time.monotonic()
+    cached = _prompt_cache.get(prompt_name)
+    if cached and now - cached[0] < PROMPT_RECHECK_SECONDS:
+        return cached[2], cached[1]
+
+    mtime = os.stat(_prompt_path(prompt_name)).st_mtime
+    if cached and cached[1] == mtime:
+        _prompt_cache[prompt_name] = (now, mtime, cached[2])
+        return cached[2], mtime
+
+    content = load_prompt(prompt_name)
+    _prompt_cache[prompt_name] = (now, mtime, content)
+    return content, mtime
+
+def preload_prompts() -> List[str]:
+    """
+    Load every prompt in the prompts directory into the cache.
+    Called at startup so that no prompt file is read on the request path.
+    """
+    names = sorted(
+        os.path.splitext(filename)[0]
+        for filename in os.listdir(PROMPTS_DIR)
+        if filename.endswith(".md")
+    )
+    for name in names:
+        get_prompt(name)
+    return names
+
+def clear_prompt_cache() -> None:
+    _prompt_cache.clear()
+
+def _prompt_path(prompt_name: str) -> str:
+    return os.path.join(PROMPTS_DIR, f"{prompt_name}.md")
@@ -0,0 +1,77 @@
+"""
+Cold-start import time measurement.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+reports the import time of each module, so startup regressions (e.g. an
+expensive import or client construction at import time) are visible.
+
+    python -m src.utils.startup                 # src.app, top 15 modules
+    python -m src.utils.startup src.graph --json
+    python -m src.utils.startup --max-seconds 3  # exit 1 when slower
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+def measure_import_times(module: str = "src.app") -> List[Dict[str, float | str]]:
+    """
+    Import `module` in a fresh interpreter and return one entry per imported
+    module: {"module", "self_seconds", "cumulative_seconds"}, in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    entries: List[Dict[str, float | str]] = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append({
+            "module": name.strip(),
+            "self_seconds": int(self_us) / 1e6,
+            "cumulative_seconds": int(cumulative_us) / 1e6,
+        })
+    return entries
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time per module.")
+    parser.add_argument("module", nargs="?", default="src.app")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list")
+    parser.add_argument("--json", action="store_true", help="Print all entries as JSON")
+    parser.add_argument("--max-seconds", type=float, help="Fail when the total import time exceeds this")
+    args = parser.parse_args(argv)
+
+    entries = measure_import_times(args.module)
+    total = next(float(e["cumulative_seconds"]) for e in entries if e["module"] == args.module)
+
+    if args.json:
+        print(json.dumps({"module": args.module, "total_seconds": total, "modules": entries}, indent=2))
+    else:
+        print(f"import {args.module}: {total:.3f}s")
+        own = [e for e in entries if str(e["module"]).startswith("src")]
+        slowest = sorted(entries, key=lambda e: float(e["self_seconds"]), reverse=True)[:args.top]
+        for title, rows, key in (("project modules (cumulative)", own, "cumulative_seconds"), ("slowest modules (self)", slowest, "self_seconds")):
+            print(f"\n{title}:")
+            for e in rows:
+                print(f"  {float(e[key]):8.3f}s  {e['module']}")
+
+    if args.max_seconds is not None and total > args.max_seconds:
+        print(f"\nFAIL: {total:.3f}s > {args.max_seconds:.3f}s", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,141 @@
+"""
+Event loop blocking watchdog ([watchdog] in config.toml, opt-in).
+
+A heartbeat callback on the event loop measures loop lag continuously. A
+sampling thread checks the heartbeat; when it is overdue by more than the
+threshold, the loop is blocked by sync code, and the thread captures the
+loop thread's current stack together with the session thread_id and graph
+node of the task that is running. The stall is logged with that stack, and
+lag / stall counters go to src/metrics.py.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from types import FrameType
+from typing import Any, Deque, Dict, Optional, Tuple
+from src.config import load_config
+from src.metrics import REGISTRY, Counter, Histogram, timed_node
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = REGISTRY.register(Histogram(
+    "mabg_event_loop_lag_seconds", "Delay of the watchdog heartbeat on the event loop", (),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+))
+LOOP_STALLS = REGISTRY.register(Counter(
+    "mabg_event_loop_stalls_total", "Event loop blocked longer than the watchdog threshold", ("node",),
+))
+
+class LoopWatchdog:
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float = 0.1, interval: float = 0.02, max_stack_frames: int = 40):
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.max_stack_frames = max_stack_frames
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=100)  # Most recent stalls, for inspection
+        self._expected = 0.0
+        self._current: Optional[Dict[str, Any]] = None  # Stall seen by the sampler, not yet recovered
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start watching; must be called from the event loop thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._expected = time.monotonic() + self.interval
+        self._handle = self.loop.call_later(self.interval, self._beat)
+        self._thread = threading.Thread(target=self._sample, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _beat(self) -> None:
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected)
+        LOOP_LAG.observe(lag)
+        if lag > self.threshold:
+            with self._lock:
+                stall, self._current = self._current, None
+            # Short stalls can end before the sampler looks; they are recorded without a stack
+            stall = stall or {"stack": None, "thread_id": None, "node": None, "task": None}
+            stall["seconds"] = lag
+            self.stalls.append(stall)
+            LOOP_STALLS.inc(node=stall["node"] or "none")
+            if stall["stack"] is not None:
+                logger.warning("Event loop was blocked for %.0f ms (thread_id=%s, node=%s)", lag * 1000, stall["thread_id"], stall["node"])
+        if not self._stop.is_set():
+            self._expected = now + self.interval
+            self._handle = self.loop.call_later(self.interval, self._beat)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            overdue = time.monotonic() - self._expected
+            if overdue <= self.threshold:
+                continue
+            with self._lock:
+                if self._current is not None:
+                    continue
+                self._current = stall = self._capture()
+            logger.warning(
+                "Event loop blocked for over %.0f ms (thread_id=%s, node=%s, task=%s):\n%s",
+                overdue * 1000, stall["thread_id"], stall["node"], stall["task"], stall["stack"],
+            )
+
+    def _capture(self) -> Dict[str, Any]:
+        frame = sys._current_frames().get(self._loop_thread_id or 0)
+        stack = "".join(traceback.format_stack(frame, limit=self.max_stack_frames)) if frame else ""
+        thread_id, node = _frame_session(frame)
+        task = asyncio.current_task(self.loop)
+        return {"stack": stack, "thread_id": thread_id, "node": node, "task": task.get_name() if task else None}
+
+def _noop_node(state: Any) -> Any:
+    return state
+
+# All timed_node wrappers share this code object; the node name is in the closure
+_TIMED_NODE_CODE = timed_node("", _noop_node).__code__
+
+def _frame_session(frame: Optional[FrameType]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (thread_id, graph node) of the blocked code, read from the frames of the
+    await chain: the timed_node wrapper names the node, and the RunnableConfig
+    that LangGraph / src/app.py keep in a `config` local carries the thread_id.
+    """
+    thread_id = node = None
+    while frame is not None and (thread_id is None or node is None):
+        if frame.f_code is _TIMED_NODE_CODE and node is None:
+            node = frame.f_locals.get("name")
+        config = frame.f_locals.get("config")
+        if isinstance(config, dict):
+            thread_id = thread_id or (config.get("configurable") or {}).get("thread_id")
+            node = node or (config.get("metadata") or {}).get("langgraph_node")
+        frame = frame.f_back
+    return thread_id, node
+
+_watchdog: Optional[LoopWatchdog] = None
+
+def start_watchdog(settings: Optional[Dict[str, Any]] = None) -> Optional[LoopWatchdog]:
+    """
+    Start the process-wide watchdog on the running loop if [watchdog] enabled.
+    """
+    global _watchdog
+    settings = load_config().get("watchdog", {}) if settings is None else settings
+    if not settings.get("enabled", False) or _watchdog is not None:
+        return _watchdog
+    _watchdog = LoopWatchdog(
+        asyncio.get_running_loop(),
+        threshold=float(settings.get("threshold_ms", 100)) / 1000,
+        interval=float(settings.get("interval_ms", 20)) / 1000,
+    )
+    _watchdog.start()
+    return _watchdog
@@ -0,0 +1,347 @@
+"""
+Out-of-process agent node workers ([workers] in config.toml).
+
+With workers enabled, the graph's spec / structure / writing nodes are
+remote_node()s: the Chainlit process only enqueues the node run in the job
+queue (src/job_queue.py) and waits for the result, passing the worker's
+streamed LLM output on as LangGraph custom stream events. Worker processes
+run the actual agent nodes:
+
+- started by the Chainlit process at startup (pool_size processes), and/or
+- run separately to scale generation independently from serving:
+
+    python -m src.workers --size 4
+
+A job carries the thread_id and priority of its graph run, and the worker
+runs the node with them, so the LLM scheduler inside the worker keeps
+sessions fair and serves interactive work first. Interactive jobs are also
+claimed before batch jobs. Two things stay per process, though:
+
+- [scheduler] rate limits are enforced by each worker process on its own:
+  divide the provider's limits by the number of worker processes.
+- LLM and node metrics of the agent runs are recorded in the worker's
+  registry, which is not served; the web process exports the job metrics
+  (queue depth, wait and latency per node) instead.
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, List, Optional, Protocol, Set, Union
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGenerationChunk, GenerationChunk
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from src.config import load_config
+from src.job_queue import JobQueue
+from src.metrics import REGISTRY, Gauge, Histogram, timed_node
+from src.state import BlogSessionState
+
+logger = logging.getLogger(__name__)
+
+class NodeFn(Protocol):
+    """An async graph node (the shape StateGraph.add_node accepts)."""
+
+    def __call__(self, state: BlogSessionState) -> Awaitable[BlogSessionState]: ...
+
+# The parts of a run's configurable that the worker restores (see src/scheduler.py)
+JOB_CONFIGURABLE = ("thread_id", "priority")
+
+JOB_QUEUE_DEPTH = REGISTRY.register(Gauge("mabg_job_queue_depth", "Agent node jobs by status", ("status",)))
+JOB_WAIT = REGISTRY.register(Histogram("mabg_job_wait_seconds", "Time a node job waited for a worker", ("node",)))
+JOB_LATENCY = REGISTRY.register(Histogram("mabg_job_seconds", "Node job latency from enqueue to result", ("node",)))
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+DEFAULT_QUEUE_PATH = ".cache/jobs.sqlite"
+
+class WorkerJobError(RuntimeError):
+    pass
+
+def settings() -> Dict[str, Any]:
+    return load_config().get("workers", {})
+
+def is_enabled() -> bool:
+    return bool(settings().get("enabled", False))
+
+def queue_path(worker_settings: Dict[str, Any]) -> str:
+    """queue_path, relative to the project root, so that the web process and workers started elsewhere share it."""
+    path = worker_settings.get("queue_path", DEFAULT_QUEUE_PATH)
+    if path != ":memory:" and not os.path.isabs(path):
+        path = os.path.join(PROJECT_ROOT, path)
+    return path
+
+_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(queue_path(settings()))
+    return _queue
+
+def _collect_queue_depth() -> None:
+    if _queue is not None:
+        for status, count in _queue.depth().items():
+            JOB_QUEUE_DEPTH.set(count, status=status)
+
+REGISTRY.add_collector(_collect_queue_depth)
+
+def local_nodes() -> Dict[str, NodeFn]:
+    # Imported here: src.graph imports this module, and the agents are only run by workers
+    from src.agents.spec import aspec_agent_node
+    from src.agents.structure import astructure_agent_node
+    from src.agents.writing import awriting_agent_node
+    return {
+        "spec_agent": aspec_agent_node,
+        "structure_agent": astructure_agent_node,
+        "writing_agent": awriting_agent_node,
+    }
+
+def remote_node(name: str) -> NodeFn:
+    """A graph node that runs `name` on a worker and streams its progress."""
+
+    async def run(state: BlogSessionState) -> BlogSessionState:
+        from langgraph.config import get_config, get_stream_writer
+
+        queue = get_job_queue()
+        poll = float(settings().get("poll_interval_ms", 50)) / 1000
+        try:
+            write = get_stream_writer()
+        except (RuntimeError, KeyError):  # Called outside a graph run (e.g. speculation)
+            write = None
+        try:
+            configurable = get_config().get("configurable", {})
+        except RuntimeError:
+            configurable = {}
+        session = {key: configurable[key] for key in JOB_CONFIGURABLE if key in configurable}
+        job_id = await asyncio.to_thread(queue.enqueue, name, state, session)
+        received = 0
+        attempt = 0
+        try:
+            while True:
+                job = await asyncio.to_thread(queue.get, job_id, received)
+                if job is None:
+                    raise WorkerJobError(f"{name}: job {job_id} disappeared")
+                if job["attempts"] != attempt:
+                    # Requeued after its worker was lost: the new attempt streams from the start
+                    attempt = job["attempts"]
+                    if received:
+                        received = 0
+                        if write is not None:
+                            write({"node": name, "restart": True})
+                        continue
+                if job["progress"]:
+                    received += len(job["progress"])
+                    if write is not None:
+                        write({"node": name, "token": job["progress"]})
+                if job["status"] in ("done", "failed", "cancelled"):
+                    break
+                await asyncio.sleep(poll)
+        except BaseException:
+            # Cancelled by the caller: the worker stops the run at its next heartbeat
+            await asyncio.shield(asyncio.to_thread(queue.cancel, job_id))
+            raise
+        await asyncio.to_thread(queue.delete, job_id)
+        if job["started_at"] is not None:
+            JOB_WAIT.observe(job["started_at"] - job["created_at"], node=name)
+        JOB_LATENCY.observe(job["finished_at"] - job["created_at"], node=name)
+        if job["status"] != "done":
+            raise WorkerJobError(f"{name} failed on the worker: {job['error'] or job['status']}")
+        return job["result"]
+
+    run.__name__ = f"remote_{name}"
+    return run
+
+def agent_node(name: str, node: NodeFn) -> NodeFn:
+    """
+    The node to register for `name`: run on a worker with [workers] enabled, in-process otherwise.
+    [workers] is checked per run, so that building the graph does not load config.toml.
+    """
+
+    @functools.wraps(node)
+    async def run(state: BlogSessionState) -> BlogSessionState:
+        return await (remote_node(name) if is_enabled() else node)(state)
+
+    return timed_node(name, run)
+
+class _ProgressCollector(BaseCallbackHandler):
+    """Buffers the streamed tokens of the node's first LLM call (as the UI shows only that one)."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.buffer: List[str] = []
+        self._run_id: Optional[UUID] = None
+
+    def on_llm_new_token(
+        self,
+        token: Union[str, List[Union[str, Dict[str, Any]]]],
+        *,
+        chunk: Optional[Union[GenerationChunk, ChatGenerationChunk]] = None,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        if self._run_id is None:
+            self._run_id = run_id
+        if run_id == self._run_id and isinstance(token, str):
+            self.buffer.append(token)
+
+    # Having these makes the handler a streaming handler (like LangGraph's messages
+    # mode), so chat models stream their tokens instead of returning them at once
+    def tap_output_aiter(self, run_id: UUID, output: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        return output
+
+    def tap_output_iter(self, run_id: UUID, output: Iterator[Any]) -> Iterator[Any]:
+        return output
+
+    def take(self) -> str:
+        text = "".join(self.buffer)
+        self.buffer.clear()
+        return text
+
+async def _run_job(queue: JobQueue, job: Any, nodes: Dict[str, NodeFn], heartbeat: float) -> None:
+    collector = _ProgressCollector()
+    node = nodes.get(job.node)
+    if node is None:
+        await asyncio.to_thread(queue.fail, job.id, f"unknown node {job.node}")
+        return
+    # Callbacks given here are inherited by the agent's chain calls inside the node,
+    # and the run's session is what the scheduler sees for them
+    config: RunnableConfig = {"callbacks": [collector], "configurable": job.configurable}
+    task = asyncio.ensure_future(RunnableLambda(node).ainvoke(job.state, config))
+    while not task.done():
+        await asyncio.wait({task}, timeout=heartbeat)
+        if task.done():
+            break
+        status = await asyncio.to_thread(queue.heartbeat, job.id, collector.take(), job.attempts)
+        if status != "running":
+            logger.info("Job %s (%s) was %s, stopping it", job.id, job.node, status)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return
+    try:
+        result = task.result()
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job.id, job.node)
+        await asyncio.to_thread(queue.fail, job.id, f"{type(e).__name__}: {e}", collector.take(), job.attempts)
+        return
+    await asyncio.to_thread(queue.complete, job.id, result, collector.take(), job.attempts)
+
+async def worker_loop(
+    queue: JobQueue,
+    worker_id: str,
+    concurrency: int = 4,
+    poll_interval: float = 0.2,
+    heartbeat: float = 0.1,
+    stale_seconds: float = 600.0,
+    stop: Optional[asyncio.Event] = None,
+    nodes: Optional[Dict[str, NodeFn]] = None,
+) -> None:
+    """Claim and run jobs, up to `concurrency` at a time, until `stop` is set."""
+    nodes = nodes or {name: timed_node(name, node) for name, node in local_nodes().items()}
+    stop = stop or asyncio.Event()
+    running: Set[asyncio.Task] = set()
+    stopped = asyncio.ensure_future(stop.wait())
+    try:
+        while not stop.is_set():
+            job = None
+            if len(running) < concurrency:
+                job = await asyncio.to_thread(queue.claim, worker_id, stale_seconds)
+            if job is not None:
+                task = asyncio.create_task(_run_job(queue, job, nodes, heartbeat))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                continue
+            await asyncio.wait([stopped, *running], timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopped.cancel()
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+def run_worker(worker_id: str, worker_settings: Dict[str, Any]) -> None:
+    """Entry point of a worker process."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s {worker_id} %(levelname)s %(name)s: %(message)s")
+
+    async def main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await worker_loop(
+            JobQueue(queue_path(worker_settings)),
+            worker_id,
+            concurrency=int(worker_settings.get("concurrency", 4)),
+            poll_interval=float(worker_settings.get("poll_interval_ms", 50)) / 1000,
+            heartbeat=float(worker_settings.get("heartbeat_ms", 200)) / 1000,
+            stale_seconds=float(worker_settings.get("stale_seconds", 600)),
+            stop=stop,
+        )
+
+    asyncio.run(main())
+
+class WorkerPool:
+    """pool_size worker processes (spawned, so they do not inherit the web server's state)."""
+
+    def __init__(self, size: int, worker_settings: Dict[str, Any]):
+        self.size = size
+        self.settings = worker_settings
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Any] = []
+
+    def start(self) -> None:
+        for i in range(self.size):
+            process = self._context.Process(
+                target=run_worker, args=(f"worker-{os.getpid()}-{i}", self.settings), daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        logger.info("Started %d generation worker processes", self.size)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(timeout)
+        self._processes.clear()
+
+    def alive(self) -> int:
+        return sum(1 for process in self._processes if process.is_alive())
+
+_pool: Optional[WorkerPool] = None
+
+def start_worker_pool() -> Optional[WorkerPool]:
+    """Start the in-container worker pool if [workers] is enabled with pool_size > 0."""
+    global _pool
+    worker_settings = settings()
+    size = int(worker_settings.get("pool_size", 2))
+    if not worker_settings.get("enabled", False) or size <= 0 or _pool is not None:
+        return _pool
+    _pool = WorkerPool(size, worker_settings)
+    _pool.start()
+    return _pool
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run agent node workers that take jobs from the local job queue.")
+    parser.add_argument("--size", type=int, default=None, help="Number of worker processes (default: [workers] pool_size)")
+    args = parser.parse_args(argv)
+
+    worker_settings = settings()
+    pool = WorkerPool(args.size if args.size is not None else int(worker_settings.get("pool_size", 2)), worker_settings)
+    pool.start()
+    try:
+        while pool.alive():
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
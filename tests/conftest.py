@@ -2,6 +2,8 @@ import sys
 import os
 from unittest.mock import MagicMock, AsyncMock
 import pytest
+import src.config
+import src.graph
 
 # Set dummy API key to prevent OpenAI client initialization error during import
 os.environ["OPENAI_API_KEY"] = "dummy"
@@ -14,8 +16,23 @@ os.environ["OPENROUTER_API_KEY"] = "dummy"
 mock_cl = MagicMock()
 mock_cl.on_chat_start = lambda f: f
 mock_cl.on_message = lambda f: f
+mock_cl.on_chat_resume = lambda f: f
+mock_cl.on_stop = lambda f: f
+mock_cl.on_chat_end = lambda f: f
+mock_cl.action_callback = lambda name: (lambda f: f)
 sys.modules["chainlit"] = mock_cl
 
+@pytest.fixture(autouse=True, scope="session")
+def memory_checkpointer():
+    """
+    Keep graph checkpoints in memory so that tests do not share state through the on-disk database.
+    """
+    src.config._config = {**src.config.load_config(), "checkpointer": {"backend": "memory"}}
+    src.graph._app_graph = None
+    src.graph.get_app_graph()
+    yield
+    src.graph._app_graph = None
+
 @pytest.fixture
 def mock_cl_fixture():
     """
@@ -29,6 +46,7 @@ def mock_cl_fixture():
     mock_cl.user_session.get = MagicMock(return_value=None)
     
     message_instance = AsyncMock()
+    message_instance.content = ""
     mock_cl.Message.return_value = message_instance
     
     return mock_cl, mock_cl.user_session
@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from unittest.mock import MagicMock, AsyncMock
+from unittest.mock import MagicMock, AsyncMock, patch
 import src.app as app
 
 @pytest.mark.asyncio
@@ -10,11 +11,16 @@ async def test_app_start(mock_cl_fixture):
     """
     mock_cl, mock_user_session = mock_cl_fixture
     
-    await app.start()
+    with patch("src.app.warm_up_llm_connections", new_callable=AsyncMock) as mock_warm_up:
+        await app.start()
+        await asyncio.sleep(0)
+    
+    # Connection warm-up runs in the background
+    mock_warm_up.assert_awaited_once()
     
     # Check if graph and thread_id are set in session
     assert mock_user_session.set.call_count >= 2
-    mock_user_session.set.assert_any_call("graph", app.app_graph)
+    mock_user_session.set.assert_any_call("graph", app.get_app_graph())
     # Check thread_id set (value is random UUID so just check key)
     calls = [args[0] for args, _ in mock_user_session.set.call_args_list]
     assert "thread_id" in calls
@@ -39,16 +45,18 @@ async def test_app_main_flow(mock_cl_fixture):
     mock_graph = AsyncMock()
     mock_user_session.get.side_effect = lambda key: mock_graph if key == "graph" else "test-thread-id"
     
-    # Mock astream (generator)
+    # Mock astream (messages mode: (chunk, metadata) tuples)
     async def mock_astream(*args, **kwargs):
-        yield {"event": "test"}
+        assert kwargs.get("stream_mode") == "messages"
+        yield MagicMock(text="```markdown\nMock ", id="run-1"), {"langgraph_node": "spec_agent"}
+        yield MagicMock(text="Spec\n```", id="run-1"), {"langgraph_node": "spec_agent"}
     mock_graph.astream = mock_astream
     
-    # Mock get_state (Synchoronous)
+    # Mock aget_state (async)
     mock_state_snapshot = MagicMock()
     mock_state_snapshot.values = {"phase": "Spec", "spec_doc": "Mock Spec"}
     mock_state_snapshot.next = ("human_review",) # Tuple for interrupt
-    mock_graph.get_state = MagicMock(return_value=mock_state_snapshot)
+    mock_graph.aget_state = AsyncMock(return_value=mock_state_snapshot)
     
     # Execute
     await app.main(message)
@@ -57,9 +65,17 @@ async def test_app_main_flow(mock_cl_fixture):
     # Check output message
     assert mock_cl.Message.call_count >= 1 # Consolidated to 1 (plus DEBUG likely, so >= 1)
     
-    # Check if actions are displayed
-    last_call = mock_cl.Message.call_args_list[-1]
-    assert "actions" in last_call[1] or last_call[1].get("actions")
+    # Tokens are streamed into the message with the code fence stripped
+    streamed_msg = mock_cl.Message.return_value
+    streamed = "".join(call.args[0] for call in streamed_msg.stream_token.await_args_list)
+    assert streamed == "Mock Spec"
+    
+    # The message is sent before streaming and replaced by the artifact's section messages
+    streamed_msg.send.assert_awaited()
+    streamed_msg.remove.assert_awaited()
+    # The artifact is shown in its own message, with the review buttons below it
+    assert streamed_msg.content == "Mock Spec"
+    assert mock_cl.Message.call_args.kwargs["content"].startswith("**Phase: Spec**")
     
     # Check if actions were created
     assert mock_cl.Action.call_count >= 2
@@ -80,3 +96,28 @@ async def test_app_main_flow(mock_cl_fixture):
         for call in action_calls
     )
     assert amend_called, "Amend action not created or missing payload"
+
+@pytest.mark.asyncio
+async def test_outline_that_failed_validation_can_only_be_amended(mock_cl_fixture):
+    """
+    検証に失敗した構成案はエラーを表示し、Amend だけを提示して承認させないこと。
+    """
+    mock_cl, mock_user_session = mock_cl_fixture
+    mock_graph = AsyncMock()
+    mock_user_session.get.side_effect = lambda key: mock_graph if key == "graph" else "outline-thread"
+    state = {"phase": "Structure", "structure_doc": "見出しのない構成案", "outline_error": "sections: Field required"}
+
+    with patch("src.app.artifact_view.get_view") as get_view:
+        get_view.return_value.show = AsyncMock(return_value={"changed": 1, "unchanged": 0})
+        await app._show_output_and_actions(state, ("human_review",))
+
+    assert [call.kwargs["name"] for call in mock_cl.Action.call_args_list] == ["amend"]
+    assert "sections: Field required" in mock_cl.Message.call_args.kwargs["content"]
+
+    # A stale Approve button does not resume the graph
+    mock_graph.aget_state = AsyncMock(return_value=MagicMock(values=state, next=("human_review",)))
+    with patch("src.app._resume_graph", new_callable=AsyncMock) as resume:
+        await app.on_approve(AsyncMock())
+
+    resume.assert_not_awaited()
+    mock_graph.aupdate_state.assert_not_awaited()
@@ -0,0 +1,109 @@
+import time
+from typing import TypedDict
+import pytest
+from langgraph.graph import StateGraph, END
+from src.artifact_store import ARTIFACT_PREFIX, ArtifactSerializer, ArtifactStore, artifact_history
+from src.checkpointer import SqliteCheckpointer
+
+BIG_DOC = "# Spec\n" + "".join(f"{i}. 本文の行です\n" for i in range(300))
+
+class _State(TypedDict, total=False):
+    phase: str
+    spec_doc: str
+    user_feedback: str
+
+def _compile(checkpointer):
+    workflow = StateGraph(_State)
+    workflow.add_node("spec", lambda state: {"spec_doc": BIG_DOC + (state.get("user_feedback") or ""), "phase": "Spec"})
+    workflow.add_node("human_review", lambda state: {})
+    workflow.set_entry_point("spec")
+    workflow.add_edge("spec", "human_review")
+    workflow.add_conditional_edges("human_review", lambda state: "spec" if state.get("user_feedback") else "end", {"spec": "spec", "end": END})
+    return workflow.compile(checkpointer=checkpointer, interrupt_before=["human_review"])
+
+def test_store_deduplicates_and_compresses(tmp_path):
+    store = ArtifactStore(str(tmp_path / "a.sqlite"))
+    first = store.put(BIG_DOC)
+    assert store.put(BIG_DOC) == first
+    assert store.get(first) == BIG_DOC
+
+    stats = store.stats()
+    assert stats["artifacts"] == 1
+    assert stats["stored_bytes"] < stats["raw_bytes"]
+
+    # Another instance (process) reads the same blob
+    assert ArtifactStore(str(tmp_path / "a.sqlite")).get(first) == BIG_DOC
+
+def test_serializer_keeps_only_references():
+    serde = ArtifactSerializer(ArtifactStore(":memory:"), min_bytes=1024)
+    value = {"channel_values": {"spec_doc": BIG_DOC, "phase": "Spec"}, "writes": [["spec_doc", BIG_DOC]]}
+
+    type_, data = serde.dumps_typed(value)
+
+    assert len(data) < 300
+    assert ARTIFACT_PREFIX.encode() in data
+    assert serde.loads_typed((type_, data)) == value
+    # A plain string write value is externalized too
+    assert serde.loads_typed(serde.dumps_typed(BIG_DOC)) == BIG_DOC
+    assert serde.loads_typed(serde.dumps_typed("short")) == "short"
+
+@pytest.mark.asyncio
+async def test_graph_checkpoints_hold_references(tmp_path):
+    """
+    修正ラウンドを重ねてもチェックポイントには参照のみが保存され、別インスタンスから復元できること。
+    """
+    path = str(tmp_path / "cp.sqlite")
+    config = {"configurable": {"thread_id": "t1"}}
+    plain = SqliteCheckpointer(str(tmp_path / "plain.sqlite"))
+    saver = SqliteCheckpointer(path, serde=ArtifactSerializer(ArtifactStore(path)))
+
+    for checkpointer in (plain, saver):
+        graph = _compile(checkpointer)
+        await graph.ainvoke({}, config)
+        for feedback in ("a", "b"):
+            await graph.aupdate_state(config, {"user_feedback": feedback})
+            await graph.ainvoke(None, config)
+
+    assert saver.session_bytes("t1") < plain.session_bytes("t1") / 5
+    assert saver.serde.store.stats()["artifacts"] == 3
+
+    reopened = _compile(SqliteCheckpointer(path, serde=ArtifactSerializer(ArtifactStore(path))))
+    snapshot = await reopened.aget_state(config)
+    assert snapshot.values["spec_doc"] == BIG_DOC + "b"
+
+@pytest.mark.asyncio
+async def test_artifact_history():
+    serde = ArtifactSerializer(ArtifactStore(":memory:"))
+    graph = _compile(SqliteCheckpointer(":memory:", serde=serde))
+    config = {"configurable": {"thread_id": "t1"}}
+    await graph.ainvoke({}, config)
+    await graph.aupdate_state(config, {"user_feedback": "a"})
+    await graph.ainvoke(None, config)
+
+    history = await artifact_history(graph, "t1", "spec_doc")
+
+    assert [entry["text"] for entry in history] == [BIG_DOC, BIG_DOC + "a"]
+    assert history[0]["phase"] == "Spec"
+    assert history[0]["hash"] != history[1]["hash"]
+
+def test_cleanup_deletes_unused_artifacts(tmp_path):
+    path = str(tmp_path / "cp.sqlite")
+    store = ArtifactStore(path)
+    saver = SqliteCheckpointer(path, ttl_seconds=3600, serde=ArtifactSerializer(store))
+    _compile(saver).invoke({}, {"configurable": {"thread_id": "abandoned"}})
+
+    two_hours_ago = time.time() - 7200
+    with saver.cursor() as cur:
+        cur.execute("UPDATE thread_activity SET updated_at = ?", (two_hours_ago,))
+    store._conn.execute("UPDATE artifacts SET last_used_at = ?", (two_hours_ago,))
+
+    assert saver.cleanup_expired() == 1
+    assert store.stats()["artifacts"] == 0
+
+def test_measure_session_bytes():
+    from src.utils.checkpoint_size import measure_session_bytes
+
+    results = measure_session_bytes(rounds=1, doc_kb=2)
+
+    assert results["artifact_store"]["checkpoints"] == results["full_copies"]["checkpoints"]
+    assert results["artifact_store"]["total_bytes"] < results["full_copies"]["total_bytes"]
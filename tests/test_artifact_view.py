@@ -0,0 +1,84 @@
+from typing import List
+import pytest
+from src.artifact_view import PAYLOAD_BYTES, SAVED_BYTES, ArtifactView, split_blocks
+
+class FakeMessage:
+    def __init__(self) -> None:
+        self.content = ""
+        self.frames: List[str] = []  # Payloads sent to the browser
+        self.removed = False
+
+    async def send(self):
+        self.frames.append(self.content)
+
+    async def update(self):
+        self.frames.append(self.content)
+
+    async def stream_token(self, token):
+        self.content += token
+        self.frames.append(token)
+
+    async def remove(self):
+        self.removed = True
+
+ARTICLE = "# Title\n\nIntro\n\n## One\n\nFirst\n\n## Two\n\nSecond\n\n## Three\n\nThird\n"
+
+def new_view(messages, chunk_chars=1000):
+    def new_message():
+        messages.append(FakeMessage())
+        return messages[-1]
+    return ArtifactView(new_message, chunk_chars)
+
+def test_split_blocks_is_per_top_level_section():
+    blocks = split_blocks(ARTICLE)
+    assert blocks == ["# Title\n\nIntro\n\n", "## One\n\nFirst\n\n", "## Two\n\nSecond\n\n", "## Three\n\nThird\n"]
+    assert "".join(blocks) == ARTICLE
+    assert split_blocks("no headings") == ["no headings"]
+
+@pytest.mark.asyncio
+async def test_revision_only_sends_the_changed_sections():
+    messages = []
+    view = new_view(messages)
+    assert await view.show("t_writing", ARTICLE) == {"changed": 4, "unchanged": 0}
+
+    saved_before = SAVED_BYTES.value(phase="t_writing")
+    revised = ARTICLE.replace("Second", "Second, revised")
+    assert await view.show("t_writing", revised) == {"changed": 1, "unchanged": 3}
+
+    assert len(messages) == 4
+    assert [len(m.frames) for m in messages] == [1, 1, 2, 1]
+    assert messages[2].content == "## Two\n\nSecond, revised\n\n"
+    assert SAVED_BYTES.value(phase="t_writing") == saved_before + len(ARTICLE.encode()) - len("## Two\n\nSecond\n\n")
+    assert PAYLOAD_BYTES.count(phase="t_writing") == 2
+
+@pytest.mark.asyncio
+async def test_added_and_removed_sections():
+    messages = []
+    view = new_view(messages)
+    await view.show("t_outline", ARTICLE)
+
+    await view.show("t_outline", ARTICLE + "\n## Four\n\nFourth\n")
+    assert len(messages) == 5
+
+    await view.show("t_outline", "# Title\n\nIntro\n\n## One\n\nFirst\n\n## Two\n\nSecond\n")
+    assert [m.removed for m in messages] == [False, False, False, True, True]
+
+@pytest.mark.asyncio
+async def test_large_sections_are_streamed_in_chunks():
+    messages = []
+    view = new_view(messages, chunk_chars=10)
+    await view.show("t_spec", "x" * 25)
+
+    (message,) = messages
+    # Streamed, then finalized with the full content
+    assert message.frames == ["", "x" * 10, "x" * 10, "x" * 5, "x" * 25]
+    assert message.content == "x" * 25
+
+@pytest.mark.asyncio
+async def test_payload_counts_streamed_output_and_finalized_chunks():
+    messages = []
+    view = new_view(messages, chunk_chars=10)
+    await view.show("t_payload", "x" * 25, streamed_bytes=40)
+
+    # The streamed LLM output, the chunks and the final update
+    assert PAYLOAD_BYTES.sum(phase="t_payload") == 40 + 2 * 25
@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.batch import load_topics, run_batch
+
+@pytest.fixture
+def mock_agents():
+    with patch("src.agents.spec.arun_agent_chain", new_callable=AsyncMock) as spec, \
+         patch("src.agents.structure.arun_agent_chain", new_callable=AsyncMock) as structure, \
+         patch("src.agents.writing.arun_agent_chain", new_callable=AsyncMock) as writing:
+        spec.return_value = "Spec"
+        structure.return_value = "Structure"
+        writing.side_effect = lambda **kwargs: f"# Article for {kwargs['input_vars']['spec_doc']}"
+        yield spec, structure, writing
+
+def test_load_topics_jsonl_and_csv(tmp_path):
+    jsonl = tmp_path / "topics.jsonl"
+    jsonl.write_text('{"id": "a/1", "topic": "LangGraph"}\n\n{"topic": "Chainlit"}\n', encoding="utf-8")
+    csv_file = tmp_path / "topics.csv"
+    csv_file.write_text("id,topic\nx,Python\ny,\n", encoding="utf-8")
+
+    topics = load_topics(str(jsonl))
+    assert [t["topic"] for t in topics] == ["LangGraph", "Chainlit"]
+    assert topics[0]["id"] == "a_1"
+    assert len(topics[1]["id"]) == 12
+
+    assert [t["id"] for t in load_topics(str(csv_file))] == ["x"]
+
+@pytest.mark.asyncio
+async def test_run_batch_auto_approves_and_applies_scripted_feedback(tmp_path, mock_agents):
+    """
+    各 human_review で自動承認し、スクリプト化されたフィードバックがあれば先に適用すること。
+    """
+    spec, structure, writing = mock_agents
+    topics = [
+        {"id": "plain", "topic": "Topic A", "feedback": {}},
+        {"id": "scripted", "topic": "Topic B", "feedback": {"Spec": ["more detail"]}},
+    ]
+
+    summary = await run_batch(topics, str(tmp_path), concurrency=2)
+
+    assert summary == {"total": 2, "skipped": 0, "done": 2, "failed": 0}
+    assert (tmp_path / "plain.md").read_text(encoding="utf-8") == "# Article for Spec"
+    assert (tmp_path / "scripted.md").exists()
+    # One extra spec call for the scripted refinement
+    assert spec.await_count == 3
+    refine_call = [c for c in spec.await_args_list if "feedback" in c.kwargs["input_vars"]]
+    assert refine_call[0].kwargs["input_vars"]["feedback"] == "more detail"
+
+@pytest.mark.asyncio
+async def test_run_batch_skips_finished_topics(tmp_path, mock_agents):
+    """
+    出力済みのトピックは再実行時にスキップされること (クラッシュ後の再開)。
+    """
+    spec, _, _ = mock_agents
+    (tmp_path / "done.md").write_text("existing", encoding="utf-8")
+    topics = [{"id": "done", "topic": "Topic", "feedback": {}}]
+
+    summary = await run_batch(topics, str(tmp_path))
+
+    assert summary["skipped"] == 1
+    spec.assert_not_awaited()
+    assert (tmp_path / "done.md").read_text(encoding="utf-8") == "existing"
+
+@pytest.mark.asyncio
+async def test_resumed_topic_does_not_reapply_consumed_feedback(tmp_path, mock_agents):
+    """
+    永続化されたスレッドから再開したとき、適用済みのフィードバックを再適用しないこと。
+    """
+    from src.batch import generate_article
+
+    spec, structure, _ = mock_agents
+    structure.side_effect = [RuntimeError("crash"), "Structure"]
+    item = {"id": "resumed", "topic": "Topic", "feedback": {"Spec": ["more detail"]}}
+
+    with pytest.raises(RuntimeError):
+        await generate_article(item, str(tmp_path))
+    assert await generate_article(item, str(tmp_path)) is not None
+
+    refine_calls = [c for c in spec.await_args_list if "feedback" in c.kwargs["input_vars"]]
+    assert len(refine_calls) == 1
+    assert all("feedback" not in c.kwargs["input_vars"] for c in structure.await_args_list)
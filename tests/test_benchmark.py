@@ -0,0 +1,68 @@
+import time
+import pytest
+import src.config as config
+from src.benchmark import compare_to_baseline, run_session
+from src.checkpointer import create_checkpointer
+from src.graph import workflow
+from src.utils.fake_llm import FakeStreamingChatModel, fake_llm_factory
+
+@pytest.fixture
+def fake_llm():
+    config.set_llm_factory(fake_llm_factory(output_tokens=120))
+    yield
+    config.set_llm_factory(None)
+
+def test_fake_llm_is_deterministic_and_reports_usage():
+    llm = FakeStreamingChatModel(output_tokens=120, tokens_per_section=40)
+
+    first = llm.invoke("hello")
+    assert llm.invoke("hello").content == first.content
+    assert llm.invoke("other").content != first.content
+    assert first.content.count("## Section") == 3
+    assert first.usage_metadata["output_tokens"] == 120
+
+@pytest.mark.asyncio
+async def test_fake_llm_streams_at_configured_rate():
+    llm = FakeStreamingChatModel(latency_seconds=0.05, tokens_per_second=2000, output_tokens=100)
+    assert llm.expected_seconds() == pytest.approx(0.1)
+
+    start = time.perf_counter()
+    chunks = [chunk async for chunk in llm.astream("hello")]
+    elapsed = time.perf_counter() - start
+
+    assert len(chunks) > 1
+    assert elapsed >= 0.09
+    assert "".join(chunk.content for chunk in chunks) == (await llm.ainvoke("hello")).content
+
+def test_llm_factory_replaces_agent_llms(fake_llm):
+    assert isinstance(config.get_agent_llm("spec_agent"), FakeStreamingChatModel)
+
+@pytest.mark.asyncio
+async def test_run_session_completes_with_fake_llm(fake_llm):
+    graph = workflow.compile(checkpointer=create_checkpointer({"backend": "memory"}), interrupt_before=["human_review"])
+
+    await run_session(graph, "bench-1", amend_rounds=1)
+
+    state = (await graph.aget_state({"configurable": {"thread_id": "bench-1"}})).values
+    assert state["phase"] == "Writing"
+    assert "## Section" in state["final_article"]
+
+def test_compare_to_baseline():
+    baseline = {"metrics": {
+        "session.seconds": {"value": 1.0, "unit": "s", "better": "lower"},
+        "throughput.10.sessions_per_second": {"value": 100.0, "unit": "sessions/s", "better": "higher"},
+        "throughput.500.sessions_per_second": {"value": 50.0, "unit": "sessions/s", "better": "higher"},
+    }}
+    ok = {"metrics": {
+        "session.seconds": {"value": 1.2, "unit": "s", "better": "lower"},
+        "throughput.10.sessions_per_second": {"value": 80.0, "unit": "sessions/s", "better": "higher"},
+    }}
+    slow = {"metrics": {
+        "session.seconds": {"value": 1.5, "unit": "s", "better": "lower"},
+        "throughput.10.sessions_per_second": {"value": 60.0, "unit": "sessions/s", "better": "higher"},
+    }}
+
+    assert compare_to_baseline(ok, baseline, tolerance=0.3) == []
+    regressions = compare_to_baseline(slow, baseline, tolerance=0.3)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("session.seconds")
@@ -0,0 +1,112 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, END
+from src.artifact_store import ArtifactSerializer
+from src.checkpointer import SqliteCheckpointer, create_checkpointer
+
+class _State(TypedDict, total=False):
+    draft: str
+    final: str
+
+def _compile(checkpointer):
+    workflow = StateGraph(_State)
+    workflow.add_node("draft", lambda state: {"draft": "draft"})
+    workflow.add_node("human_review", lambda state: {})
+    workflow.add_node("finish", lambda state: {"final": state["draft"] + " approved"})
+    workflow.set_entry_point("draft")
+    workflow.add_edge("draft", "human_review")
+    workflow.add_edge("human_review", "finish")
+    workflow.add_edge("finish", END)
+    return workflow.compile(checkpointer=checkpointer, interrupt_before=["human_review"])
+
+def test_create_checkpointer_backends(tmp_path):
+    assert isinstance(create_checkpointer({"backend": "memory"}), MemorySaver)
+
+    saver = create_checkpointer({"backend": "sqlite", "path": str(tmp_path / "cp.sqlite"), "ttl_hours": 2})
+    assert isinstance(saver, SqliteCheckpointer)
+    assert saver.ttl_seconds == 7200
+
+    with pytest.raises(ValueError):
+        create_checkpointer({"backend": "redis"})
+
+def test_artifact_store_defaults_to_sqlite_only(tmp_path):
+    """
+    メモリ上のアーティファクトは削除されないため、memory バックエンドでは既定で無効であること。
+    """
+    assert not isinstance(create_checkpointer({"backend": "memory"}).serde, ArtifactSerializer)
+    assert isinstance(create_checkpointer({"backend": "memory", "artifact_store": True}).serde, ArtifactSerializer)
+    assert isinstance(create_checkpointer({"backend": "sqlite", "path": str(tmp_path / "cp.sqlite")}).serde, ArtifactSerializer)
+
+def test_sqlite_uses_wal(tmp_path):
+    saver = SqliteCheckpointer(str(tmp_path / "cp.sqlite"))
+    with saver.cursor() as cur:
+        assert cur.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+@pytest.mark.asyncio
+async def test_session_resumes_on_another_worker(tmp_path):
+    """
+    あるワーカーで開始したセッションを、同じ DB を開いた別のワーカーで再開できること。
+    """
+    path = str(tmp_path / "cp.sqlite")
+    config = {"configurable": {"thread_id": "t1"}}
+
+    await _compile(SqliteCheckpointer(path)).ainvoke({}, config)
+
+    # A second instance has its own connection, like another process would
+    other_worker = _compile(SqliteCheckpointer(path))
+    snapshot = await other_worker.aget_state(config)
+    assert snapshot.next == ("human_review",)
+    assert snapshot.values["draft"] == "draft"
+
+    result = await other_worker.ainvoke(None, config)
+    assert result["final"] == "draft approved"
+
+def test_concurrent_writers(tmp_path):
+    """
+    複数ワーカーが同時に書き込んでも "database is locked" にならないこと。
+    """
+    path = str(tmp_path / "cp.sqlite")
+
+    def run_sessions(worker: int) -> None:
+        graph = _compile(SqliteCheckpointer(path))
+        for i in range(5):
+            graph.invoke({}, {"configurable": {"thread_id": f"w{worker}-{i}"}})
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(run_sessions, range(4)))
+
+    assert SqliteCheckpointer(path).thread_count() == 20
+
+def test_cleanup_expired_threads(tmp_path):
+    """
+    TTL を過ぎた放置スレッドだけが削除されること。
+    """
+    saver = SqliteCheckpointer(str(tmp_path / "cp.sqlite"), ttl_seconds=3600)
+    graph = _compile(saver)
+    graph.invoke({}, {"configurable": {"thread_id": "abandoned"}})
+    graph.invoke({}, {"configurable": {"thread_id": "active"}})
+
+    with saver.cursor() as cur:
+        cur.execute("UPDATE thread_activity SET updated_at = ? WHERE thread_id = 'abandoned'", (time.time() - 7200,))
+
+    assert saver.cleanup_expired() == 1
+    assert saver.expired_threads == 1
+    assert graph.get_state({"configurable": {"thread_id": "abandoned"}}).values == {}
+    assert graph.get_state({"configurable": {"thread_id": "active"}}).next == ("human_review",)
+    with saver.cursor() as cur:
+        assert cur.execute("SELECT COUNT(*) FROM writes WHERE thread_id = 'abandoned'").fetchone()[0] == 0
+
+def test_cleanup_runs_periodically_on_put(tmp_path):
+    saver = SqliteCheckpointer(str(tmp_path / "cp.sqlite"), ttl_seconds=3600, cleanup_interval_seconds=0)
+    graph = _compile(saver)
+    graph.invoke({}, {"configurable": {"thread_id": "abandoned"}})
+    with saver.cursor() as cur:
+        cur.execute("UPDATE thread_activity SET updated_at = ? WHERE thread_id = 'abandoned'", (time.time() - 7200,))
+
+    graph.invoke({}, {"configurable": {"thread_id": "new"}})
+
+    assert saver.expired_threads == 1
+    assert saver.thread_count() == 1
@@ -0,0 +1,131 @@
+import pytest
+from src.agents.common import _clean_output, StreamingFenceCleaner
+
+SAMPLES = [
+    "```markdown\n# Title\n\nBody\n```",
+    "  ```\n\n  # Title\n``",
+    "```md\n```",
+    "plain text\n\n",
+    "```python\ncode\n``` \n",
+    "```md\nline ``` end\n```  \n\n",
+    "```\nabc ```",
+    "no fence\n```",
+]
+
+def _stream(text: str, size: int) -> str:
+    cleaner = StreamingFenceCleaner()
+    out = "".join(cleaner.feed(text[i:i + size]) for i in range(0, len(text), size))
+    return out + cleaner.finish()
+
+@pytest.mark.parametrize("text", SAMPLES)
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_streaming_cleaner_matches_clean_output(text, size):
+    """
+    逐次クリーナーの出力を連結すると _clean_output と一致すること。
+    """
+    assert _stream(text, size) == _clean_output(text)
+
+def test_streaming_cleaner_emits_body_before_finish():
+    """
+    本文はストリーム途中で表示され、閉じフェンスの候補だけが保留されること。
+    """
+    cleaner = StreamingFenceCleaner()
+    assert cleaner.feed("```markdown\n") == ""
+    assert cleaner.feed("# Title\nBody") == "# Title\nBody"
+    assert cleaner.feed("\n``") == ""
+    assert cleaner.finish() == "\n``"
+
+@pytest.fixture
+def prompt_dir(tmp_path, monkeypatch):
+    import src.utils.prompts as prompts
+    from src.agents.common import clear_chain_registry
+
+    (tmp_path / "sample.md").write_text("---\nname: sample\n---\nVersion 1", encoding="utf-8")
+    monkeypatch.setattr(prompts, "PROMPTS_DIR", str(tmp_path))
+    monkeypatch.setattr(prompts, "PROMPT_RECHECK_SECONDS", 0.0)
+    prompts.clear_prompt_cache()
+    clear_chain_registry()
+    yield tmp_path
+    prompts.clear_prompt_cache()
+    clear_chain_registry()
+
+def test_get_chain_is_cached_and_invalidated_by_mtime(prompt_dir):
+    """
+    同じ (LLM, プロンプト, テンプレート) ではチェーンを再利用し、
+    プロンプトファイルの mtime が変わったら再構築すること。
+    """
+    import os
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agents.common import get_chain
+
+    llm = FakeListChatModel(responses=["ok"])
+    chain = get_chain(llm, "sample", "Topic: {topic}")
+    assert get_chain(llm, "sample", "Topic: {topic}") is chain
+    assert get_chain(llm, "sample", "Other: {topic}") is not chain
+
+    path = prompt_dir / "sample.md"
+    path.write_text("Version 2", encoding="utf-8")
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    rebuilt = get_chain(llm, "sample", "Topic: {topic}")
+    assert rebuilt is not chain
+    messages = rebuilt.first.format_messages(topic="x")
+    assert messages[0].content == "Version 2"
+
+def test_preload_prompts_fills_cache(prompt_dir):
+    """
+    起動時のプリロード後はプロンプトファイルを読まないこと。
+    """
+    from unittest.mock import patch
+    import src.utils.prompts as prompts
+
+    assert prompts.preload_prompts() == ["sample"]
+    with patch.object(prompts, "PROMPT_RECHECK_SECONDS", 60.0), \
+         patch("src.utils.prompts.load_prompt") as mock_load:
+        content, _ = prompts.get_prompt("sample")
+    assert content == "Version 1"
+    mock_load.assert_not_called()
+
+def test_context_comes_first_with_cache_breakpoints_for_anthropic(prompt_dir):
+    """
+    承認済みの上流成果物をシステムプロンプト直後に置き、Anthropic 系では
+    キャッシュブレークポイントを付けること。それ以外は 1 つのユーザーメッセージにまとめる。
+    """
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.agents.common import CACHE_CONTROL, get_chain
+
+    anthropic = FakeListChatModel(responses=["ok"])
+    object.__setattr__(anthropic, "model_name", "anthropic/claude-opus-4.5")
+    system, user = get_chain(anthropic, "sample", "Task: {task}", "Spec: {spec}").first.format_messages(spec="S", task="T")
+    assert system.content == [{"type": "text", "text": "Version 1", "cache_control": CACHE_CONTROL}]
+    assert user.content == [
+        {"type": "text", "text": "Spec: S", "cache_control": CACHE_CONTROL},
+        {"type": "text", "text": "Task: T"},
+    ]
+
+    openai = FakeListChatModel(responses=["ok"])
+    system, user = get_chain(openai, "sample", "Task: {task}", "Spec: {spec}").first.format_messages(spec="S", task="T")
+    assert system.content == "Version 1"
+    assert user.content == "Spec: S\n\nTask: T"
+
+@pytest.mark.asyncio
+async def test_cached_prompt_tokens_are_reported(prompt_dir, caplog):
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from src import metrics
+    from src.agents.common import arun_agent_chain
+
+    message = AIMessage(content="done", usage_metadata={
+        "input_tokens": 2000, "output_tokens": 10, "total_tokens": 2010,
+        "input_token_details": {"cache_read": 1536},
+    })
+    llm = GenericFakeChatModel(messages=iter([message]))
+    labels = {"agent": "unknown", "model": "GenericFakeChatModel", "operation": "generate"}
+    before = metrics.LLM_TOKENS.value(type="cached", **labels)
+
+    with caplog.at_level("INFO", logger="src.metrics"):
+        await arun_agent_chain(llm, "sample", "Task: {task}", {"task": "T", "spec": "S"}, context_template="Spec: {spec}")
+
+    assert metrics.LLM_TOKENS.value(type="cached", **labels) == before + 1536
+    assert "2000 prompt tokens, 1536 cached" in caplog.text
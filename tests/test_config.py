@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+import src.config as config
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+
+def test_load_config_is_parsed_once_until_reload(monkeypatch):
+    """
+    config.toml はプロセス内で一度だけ解析され、reload_config で再読込されること。
+    """
+    monkeypatch.setattr(config, "_config", None)
+    monkeypatch.setattr(config, "_agent_llms", {})
+
+    with patch("src.config.tomllib.load", return_value={"default": {"llm": "m", "temperature": 0.5}}) as mock_load:
+        for name in ("spec_agent", "structure_agent", "writing_agent"):
+            config.get_agent_config(name)
+        assert mock_load.call_count == 1
+
+        config.reload_config()
+        assert mock_load.call_count == 2
+
+def test_agent_llm_is_built_on_first_use_and_memoized(monkeypatch):
+    monkeypatch.setattr(config, "_agent_llms", {})
+    with patch("src.config.get_llm", side_effect=lambda name: object()) as mock_get_llm:
+        first = config.get_agent_llm("spec_agent")
+        assert config.get_agent_llm("spec_agent") is first
+        assert config.get_agent_llm("writing_agent") is not first
+    assert mock_get_llm.call_count == 2
+
+def test_import_does_not_build_llm_or_read_config():
+    """
+    API キーがなくてもグラフとアプリを import でき、import 時に設定読込や LLM 生成、
+    エンドポイントの追加が行われないこと。
+    """
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENROUTER_API_KEY", "OPENAI_API_KEY")}
+    code = (
+        "import sys, src.graph, src.app, src.config as c;"
+        "from chainlit.server import app as server;"
+        "assert c._config is None and not c._agent_llms;"
+        "assert src.graph._app_graph is None;"
+        "assert not [r for r in server.router.routes if getattr(r, 'path', None) == '/metrics'];"
+        "assert 'langchain_openai' not in sys.modules"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_measure_import_times():
+    from src.utils.startup import measure_import_times
+
+    entries = measure_import_times("src.state")
+    modules = [entry["module"] for entry in entries]
+    assert "src.state" in modules
+    assert all(entry["cumulative_seconds"] >= entry["self_seconds"] >= 0 for entry in entries)
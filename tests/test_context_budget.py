@@ -0,0 +1,114 @@
+import pytest
+from unittest.mock import MagicMock, patch
+import src.agents.context_budget as context_budget
+from src.agents.context_budget import CONTEXT_TOKENS_SAVED, TRIM_MARKER, count_tokens, fit_context, summarize_markdown, trim_to_tokens
+from src.agents.structure import astructure_agent_node
+from src.agents.writing import awriting_agent_node
+
+MODEL = "openai/gpt-oss-20b"
+
+@pytest.fixture(autouse=True)
+def char_estimate():
+    # Deterministic counts without downloading a tiktoken encoding
+    count_tokens.cache_clear()
+    with patch.object(context_budget, "_get_encoding", return_value=None):
+        yield
+    count_tokens.cache_clear()
+
+def make_llm():
+    llm = MagicMock()
+    llm.model_name = MODEL
+    return llm
+
+def long_doc(sections=20):
+    return "\n\n".join(f"## 見出し {i}\n最初の行 {i}\n" + "本文の説明が続きます。" * 40 for i in range(sections))
+
+def test_count_tokens_is_cached():
+    text = "hello world " * 100
+    count_tokens(text, MODEL)
+    hits = count_tokens.cache_info().hits
+    assert count_tokens(text, MODEL) == count_tokens(text, MODEL)
+    assert count_tokens.cache_info().hits == hits + 2
+
+def test_summarize_markdown_keeps_headings_and_first_lines():
+    summary = summarize_markdown(long_doc(3))
+    assert summary.splitlines()[:2] == ["## 見出し 0", "最初の行 0"]
+    assert "本文の説明" not in summary
+    assert summarize_markdown("no headings here") == "no headings here"
+
+def test_trim_keeps_both_ends():
+    text = "START " + "x" * 4000 + " END"
+    trimmed = trim_to_tokens(text, 100, MODEL)
+    assert count_tokens(trimmed, MODEL) <= 100
+    assert trimmed.startswith("START") and trimmed.endswith("END")
+    assert TRIM_MARKER in trimmed
+
+def test_within_budget_is_unchanged():
+    inputs = {"spec_doc": "short", "feedback": "ok"}
+    assert fit_context("structure_agent", make_llm(), "structure_generator", "{spec_doc}{feedback}", inputs, budget=100000) is inputs
+
+def test_low_value_inputs_are_reduced_first(caplog):
+    inputs = {"spec_doc": long_doc(), "current_structure": "## A\n## B", "feedback": "もっと詳しく"}
+    before = CONTEXT_TOKENS_SAVED.value(agent="structure_agent")
+
+    with caplog.at_level("INFO", logger="src.agents.context_budget"):
+        fitted = fit_context(
+            "structure_agent", make_llm(), "structure_generator", "{spec_doc}\n{current_structure}\n{feedback}", inputs,
+            summarize=("spec_doc",), trim=("spec_doc", "current_structure"), budget=3000,
+        )
+
+    assert fitted["spec_doc"] == summarize_markdown(inputs["spec_doc"])
+    assert fitted["current_structure"] == inputs["current_structure"]
+    assert fitted["feedback"] == inputs["feedback"]
+    saved = CONTEXT_TOKENS_SAVED.value(agent="structure_agent") - before
+    assert saved > 0
+    assert f"saved {int(saved)}" in caplog.text
+
+@pytest.mark.asyncio
+async def test_structure_refine_uses_the_agent_budget():
+    state = {"spec_doc": long_doc(), "structure_doc": "## A\n## B", "user_feedback": "Bを増やして"}
+
+    with patch("src.agents.context_budget.get_agent_config", return_value={"context_budget_tokens": 1500}), \
+         patch("src.agents.structure.arun_agent_chain", return_value="New Structure") as mock_run:
+        await astructure_agent_node(state)
+
+    input_vars = mock_run.call_args[1]["input_vars"]
+    assert len(input_vars["spec_doc"]) < len(state["spec_doc"])
+    assert input_vars["current_structure"] == "## A\n## B"
+    assert input_vars["feedback"] == "Bを増やして"
+
+@pytest.mark.asyncio
+async def test_structure_refine_never_trims_the_current_structure(caplog):
+    """
+    置き換え対象の構成案は予算超過でも中略されず、警告付きでそのまま送られること。
+    """
+    state = {"spec_doc": "short spec", "structure_doc": long_doc(), "user_feedback": "Bを増やして"}
+
+    with patch("src.agents.context_budget.get_agent_config", return_value={"context_budget_tokens": 1500}), \
+         patch("src.agents.structure.arun_agent_chain", return_value="New Structure") as mock_run, \
+         caplog.at_level("WARNING", logger="src.agents.context_budget"):
+        await astructure_agent_node(state)
+
+    assert mock_run.call_args[1]["input_vars"]["current_structure"] == state["structure_doc"]
+    assert "still exceeds the context budget" in caplog.text
+
+@pytest.mark.asyncio
+async def test_writing_refine_over_budget_is_done_per_section():
+    """
+    記事本体だけで予算を超える場合、記事を中略せずにセクションごとに書き直すこと。
+    """
+    article = long_doc(4)
+    state = {"spec_doc": "spec", "structure_doc": "## A", "final_article": article, "user_feedback": "全体をもっと丁寧に"}
+
+    async def rewrite(**kwargs):
+        return kwargs["input_vars"]["heading"] + "\n改訂"
+
+    with patch("src.agents.context_budget.get_agent_config", return_value={"context_budget_tokens": 1500}), \
+         patch("src.agents.writing.arun_agent_chain", side_effect=rewrite) as mock_run:
+        result = (await awriting_agent_node(state))["final_article"]
+
+    sections = [call[1]["input_vars"]["current_section"] for call in mock_run.call_args_list]
+    assert len(sections) == 4
+    assert "\n\n".join(sections) == article.strip()
+    assert all(TRIM_MARKER not in section for section in sections)
+    assert result.count("改訂") == 4
@@ -0,0 +1,185 @@
+import asyncio
+import time
+from typing import Any, List
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatResult
+import src.hedging as hedging
+import src.scheduler as scheduler
+from src.hedging import HEDGE_EVENTS, CircuitBreaker, HedgedChatModel, LLMDeadlineExceeded
+from src.utils.fake_llm import FakeStreamingChatModel
+
+class FailingChatModel(FakeStreamingChatModel):
+    model_name: str = "failing"
+    calls: int = 0
+
+    def _generate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        raise ConnectionError("provider down")
+
+    async def _agenerate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        raise ConnectionError("provider down")
+
+    def _stream(self, *args: Any, **kwargs: Any):
+        self.calls += 1
+        raise ConnectionError("provider down")
+        yield
+
+    async def _astream(self, *args: Any, **kwargs: Any):
+        self.calls += 1
+        raise ConnectionError("provider down")
+        yield
+
+class TokenCollector(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.tokens: List[str] = []
+
+    def on_llm_new_token(self, token: Any, **kwargs: Any) -> None:
+        self.tokens.append(token)
+
+@pytest.fixture(autouse=True)
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    monkeypatch.setattr(hedging, "_breaker", breaker)
+    return breaker
+
+def primary(latency=0.0):
+    return FakeStreamingChatModel(model_name="primary", latency_seconds=latency, output_tokens=16)
+
+def fallback():
+    return FakeStreamingChatModel(model_name="fallback", output_tokens=24)
+
+def events(agent):
+    return {event: HEDGE_EVENTS.value(agent=agent, event=event) for event in ("fired", "won", "failover", "deadline")}
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    llm = HedgedChatModel(primary=primary(), fallback=fallback(), agent="t_fast", hedge_after_seconds=0.2)
+
+    result = await llm.ainvoke("hello")
+
+    assert result.content == (await primary().ainvoke("hello")).content
+    assert events("t_fast")["fired"] == 0
+    assert llm.model_name == "primary"
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_only_the_winner_streams():
+    llm = HedgedChatModel(primary=primary(latency=2.0), fallback=fallback(), agent="t_hedge", hedge_after_seconds=0.05)
+    collector = TokenCollector()
+
+    start = time.perf_counter()
+    chunks = [chunk.content async for chunk in llm.astream("hello", {"callbacks": [collector]})]
+
+    assert time.perf_counter() - start < 1.0
+    assert "".join(chunks) == (await fallback().ainvoke("hello")).content
+    assert "".join(collector.tokens) == "".join(chunks)
+    assert events("t_hedge") == {"fired": 1, "won": 1, "failover": 0, "deadline": 0}
+
+@pytest.mark.asyncio
+async def test_hedge_waits_for_a_scheduler_slot_of_the_fallback(monkeypatch):
+    """
+    ヘッジ/フェイルオーバーのリクエストも fallback モデルのレート制限を受けること。
+    """
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.LLMScheduler({"models": {"fallback": {"requests_per_minute": 60}}}))
+    llm = HedgedChatModel(primary=primary(latency=2.0), fallback=fallback(), agent="t_hedge_slot", hedge_after_seconds=0.05)
+
+    await llm.ainvoke("hello")
+    assert scheduler._scheduler.stats["admitted"]["interactive"] == 1
+
+    # With the fallback's bucket empty, the hedge is sent only once it refills (1 request/s)
+    scheduler._scheduler._queue("fallback").requests.level = 0
+    start = time.perf_counter()
+    await llm.ainvoke("hello")
+    assert 0.5 < time.perf_counter() - start < 2.0
+    assert events("t_hedge_slot")["won"] == 2
+
+@pytest.mark.asyncio
+async def test_failing_primary_fails_over_without_waiting_for_the_hedge():
+    llm = HedgedChatModel(primary=FailingChatModel(), fallback=fallback(), agent="t_failover", hedge_after_seconds=5.0)
+
+    start = time.perf_counter()
+    result = await llm.ainvoke("hello")
+
+    assert time.perf_counter() - start < 1.0
+    assert result.content == (await fallback().ainvoke("hello")).content
+    assert events("t_failover")["failover"] == 1
+
+def test_sync_call_fails_over():
+    llm = HedgedChatModel(primary=FailingChatModel(), fallback=fallback(), agent="t_sync")
+    assert llm.invoke("hello").content == fallback().invoke("hello").content
+
+@pytest.mark.asyncio
+async def test_deadline():
+    llm = HedgedChatModel(primary=primary(latency=2.0), agent="t_deadline", deadline_seconds=0.1)
+
+    with pytest.raises(LLMDeadlineExceeded):
+        await llm.ainvoke("hello")
+    assert events("t_deadline")["deadline"] == 1
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_skips_a_failing_model(breaker):
+    failing = FailingChatModel()
+    llm = HedgedChatModel(primary=failing, fallback=fallback(), agent="t_breaker")
+
+    for _ in range(3):
+        await llm.ainvoke("hello")
+
+    # Two failures open the circuit; the third call goes straight to the fallback
+    assert failing.calls == 2
+    assert breaker.snapshot()["failing"] == {"failures": 2, "open": True}
+    assert not breaker.allow("failing")
+
+def test_breaker_probe_after_reset():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.0)
+    breaker.record_failure("m")
+    assert breaker.allow("m")       # Probe
+    assert not breaker.allow("m")   # Only one probe at a time
+    breaker.record_success("m")
+    assert breaker.allow("m")
+
+def _half_open(breaker, model):
+    """Open the circuit of `model` and let its reset time pass."""
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure(model)
+    breaker._opened_at[model] -= breaker.reset_seconds
+
+@pytest.mark.asyncio
+async def test_probe_that_loses_the_hedge_race_is_released(breaker):
+    """
+    ヘッジに負けたプローブ呼び出しが結果なしで終わっても、次のプローブを通せること。
+    """
+    _half_open(breaker, "primary")
+    llm = HedgedChatModel(primary=primary(latency=2.0), fallback=fallback(), agent="t_probe_lost", hedge_after_seconds=0.05)
+
+    await llm.ainvoke("hello")
+
+    assert events("t_probe_lost")["won"] == 1
+    assert breaker.snapshot()["primary"]["open"]
+    assert breaker.allow("primary")
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_is_released(breaker):
+    _half_open(breaker, "primary")
+    llm = HedgedChatModel(primary=primary(latency=2.0), fallback=fallback(), agent="t_probe_cancelled")
+
+    task = asyncio.ensure_future(llm.ainvoke("hello"))
+    await asyncio.sleep(0.05)
+    assert not breaker.allow("primary")  # The call holds the probe
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert breaker.snapshot()["primary"]["open"]
+    assert breaker.allow("primary")
+
+def test_get_llm_wraps_prod_agents(monkeypatch):
+    from src.config import get_llm
+
+    monkeypatch.setenv("APP_ENV", "prod")
+    llm = get_llm("structure_agent")
+
+    assert isinstance(llm, HedgedChatModel)
+    assert llm.model_name == "anthropic/claude-opus-4.5"
+    assert llm.fallback.model_name == "openai/gpt-oss-20b"
+    assert llm.deadline_seconds == 180
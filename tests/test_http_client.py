@@ -0,0 +1,47 @@
+import httpx
+import pytest
+import src.utils.http_client as http_client
+
+@pytest.fixture
+def reset_clients(monkeypatch):
+    monkeypatch.setattr(http_client, "_clients", None)
+    monkeypatch.setattr(http_client, "_last_warm_up", 0.0)
+
+def test_agents_share_one_http_client(reset_clients):
+    """
+    全エージェントの ChatOpenAI が同じ HTTP クライアント (接続プール) を使うこと。
+    """
+    from src.config import get_llm
+
+    spec_llm = get_llm("spec_agent")
+    writing_llm = get_llm("writing_agent")
+    sync_client, async_client = http_client.get_http_clients()
+
+    assert spec_llm.http_async_client is async_client
+    assert writing_llm.http_async_client is async_client
+    assert spec_llm.http_client is sync_client
+
+def test_pool_settings_from_config(reset_clients):
+    _, client = http_client.get_http_clients({"max_connections": 7, "max_keepalive_connections": 3})
+    pool = client._transport._pool
+    assert pool._max_connections == 7
+    assert pool._max_keepalive_connections == 3
+
+@pytest.mark.asyncio
+async def test_warm_up_touches_each_host_once(reset_clients, monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, str(request.url)))
+        return httpx.Response(405)
+
+    clients = (httpx.Client(), httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(http_client, "_clients", clients)
+    urls = ["https://llm.example/api/v1", "https://llm.example/api/v1", "https://other.example/v1"]
+
+    assert await http_client.warm_up_connections(urls) == 2
+    assert sorted(requests) == [("HEAD", "https://llm.example/api/v1"), ("HEAD", "https://other.example/v1")]
+
+    # Within keepalive_expiry the pool is still warm
+    assert await http_client.warm_up_connections(urls) == 0
+    assert len(requests) == 2
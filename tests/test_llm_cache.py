@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.llm_cache import SQLiteResponseCache
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteResponseCache(str(tmp_path / "cache.sqlite"))
+
+def test_cache_hit_skips_llm(cache):
+    """
+    同じモデル・同じメッセージの2回目の呼び出しはキャッシュから返ること。
+    """
+    llm = FakeListChatModel(responses=["first", "second"], cache=cache)
+
+    assert llm.invoke("hello").content == "first"
+    assert llm.invoke("hello").content == "first"
+    assert llm.invoke("other").content == "second"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 2
+
+def test_cache_persists_across_instances(tmp_path):
+    """
+    キャッシュはプロセス(インスタンス)をまたいで永続化されること。
+    """
+    path = str(tmp_path / "cache.sqlite")
+    FakeListChatModel(responses=["stored"], cache=SQLiteResponseCache(path)).invoke("hello")
+
+    reopened = SQLiteResponseCache(path)
+    llm = FakeListChatModel(responses=["stored"], cache=reopened)
+    assert llm.invoke("hello").content == "stored"
+    assert reopened.hits == 1
+    assert reopened.misses == 0
+
+@pytest.mark.asyncio
+async def test_cache_async_lookup(cache):
+    llm = FakeListChatModel(responses=["first", "second"], cache=cache)
+    assert (await llm.ainvoke("hello")).content == "first"
+    assert (await llm.ainvoke("hello")).content == "first"
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """
+    max_bytes を超えると最も長く使われていないエントリから削除されること。
+    """
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=250)
+    llm = FakeListChatModel(responses=["a" * 40, "b" * 40, "c" * 40], cache=cache)
+
+    llm.invoke("one")
+    llm.invoke("two")
+    llm.invoke("one")  # touch "one" so that "two" is the LRU entry
+    llm.invoke("three")
+
+    assert cache.evictions >= 1
+    assert cache.stats()["bytes"] <= 250
+    assert llm.invoke("one").content == "a" * 40
+
+def test_cache_counts_are_exported_as_metrics(tmp_path):
+    """
+    ヒット・ミス・削除件数と保存サイズは /metrics に出力されること。
+    """
+    from src.llm_cache import CACHE_BYTES, CACHE_EVICTIONS, CACHE_LOOKUPS
+    from src.metrics import REGISTRY
+
+    hits, misses, evictions = CACHE_LOOKUPS.value(result="hit"), CACHE_LOOKUPS.value(result="miss"), CACHE_EVICTIONS.value()
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=150)
+    llm = FakeListChatModel(responses=["a" * 40, "b" * 40], cache=cache)
+
+    llm.invoke("one")
+    llm.invoke("one")
+    llm.invoke("two")
+
+    assert CACHE_LOOKUPS.value(result="hit") == hits + 1
+    assert CACHE_LOOKUPS.value(result="miss") == misses + 2
+    assert cache.evictions >= 1
+    assert CACHE_EVICTIONS.value() == evictions + cache.evictions
+    assert CACHE_BYTES.value() == cache.stats()["bytes"]
+    assert 'mabg_response_cache_lookups_total{result="hit"}' in REGISTRY.render()
+
+def test_cache_expires_old_entries(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite"), max_age_seconds=60)
+    llm = FakeListChatModel(responses=["old", "new"], cache=cache)
+
+    with patch("src.llm_cache.time.time", return_value=1000.0):
+        llm.invoke("hello")
+    with patch("src.llm_cache.time.time", return_value=1100.0):
+        assert llm.invoke("hello").content == "new"
+
+def test_get_llm_enables_cache_for_deterministic_agents():
+    """
+    temperature 0.0 のエージェントは既定でキャッシュを使い、
+    response_cache フラグで明示的に切り替えられること。
+    """
+    from src.config import get_llm
+
+    base = {"llm": "test/model", "base_url": "https://example.invalid/v1"}
+    with patch("src.config.get_agent_config", return_value={**base, "temperature": 0.0}), \
+         patch("src.config.get_response_cache", return_value=SQLiteResponseCache(":memory:")):
+        assert isinstance(get_llm("review_agent").cache, SQLiteResponseCache)
+    with patch("src.config.get_agent_config", return_value={**base, "temperature": 1.0}):
+        assert get_llm("writing_agent").cache is False
+    with patch("src.config.get_agent_config", return_value={**base, "temperature": 1.0, "response_cache": True}), \
+         patch("src.config.get_response_cache", return_value=SQLiteResponseCache(":memory:")):
+        assert isinstance(get_llm("writing_agent").cache, SQLiteResponseCache)
@@ -0,0 +1,43 @@
+import os
+import time
+from unittest.mock import patch
+import pytest
+import src.app as app
+from src.load_test import run_load_test
+
+FAST = {"users": 5, "llm_latency": 0.05, "tokens_per_second": 4000, "output_tokens": 80, "think_seconds": 0.01}
+
+@pytest.mark.asyncio
+async def test_load_test_drives_every_handler():
+    original_cl, original_graph = app.cl, app.get_app_graph
+    report = await run_load_test(**FAST)
+
+    assert report["handlers"]["main"]["calls"] == 5
+    assert report["handlers"]["on_approve"]["calls"] == 15
+    # The app is restored after the run
+    assert app.cl is original_cl
+    assert app.get_app_graph is original_graph
+
+@pytest.mark.asyncio
+async def test_blocking_handler_fails_the_budget():
+    original = app._format_response
+
+    def blocking_format(state):
+        time.sleep(0.15)
+        return original(state)
+
+    with patch("src.app._format_response", side_effect=blocking_format):
+        report = await run_load_test(**FAST)
+
+    assert not report["passed"]
+    assert any("loop lag" in failure for failure in report["failures"])
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.environ.get("MABG_TIMING_TESTS"), reason="wall-clock budget; set MABG_TIMING_TESTS=1 or run python -m src.load_test")
+async def test_handlers_acknowledge_within_budget():
+    """
+    [REQ-PER-001] 複数ユーザーが同時に操作しても、各ハンドラが 0.1 秒以内に反応すること。
+    """
+    report = await run_load_test(**FAST)
+
+    assert report["passed"], report["failures"]
@@ -0,0 +1,53 @@
+from src.utils.markdown import clean_heading, join_sections, section_level, split_sections
+
+OUTLINE = """# 記事構成案
+
+## 記事タイトル案
+1. タイトル
+
+## 構成案
+
+### 導入 (Lead)
+*   **読者の共感**: ...
+
+### H2: LangGraph とは
+*   **このセクションの目的**: ...
+    *   **H3: 状態管理**
+
+### H2: 実装例
+```python
+# not a heading
+```
+
+### まとめ (Conclusion)
+*   **要点の振り返り**: ...
+
+## メモ / 戦略的意図
+*   補足
+"""
+
+def test_split_outline_into_sections():
+    """
+    構成案は最も多い見出しレベル (###) で分割され、コードブロック内の # は無視されること。
+    """
+    assert section_level(OUTLINE) == 3
+    preamble, sections = split_sections(OUTLINE)
+
+    assert [clean_heading(s.title) for s in sections] == ["導入 (Lead)", "LangGraph とは", "実装例", "まとめ (Conclusion)"]
+    assert preamble.startswith("# 記事構成案")
+    assert "# not a heading" in sections[2].text
+    # A shallower heading closes the last section and is kept in its tail
+    assert "メモ" not in sections[3].text
+    assert sections[3].tail.startswith("## メモ")
+
+def test_split_sections_is_lossless():
+    for doc in [OUTLINE, "# Title\n\nintro\n\n## A\na\n\n## B\nb", "no headings", ""]:
+        preamble, sections = split_sections(doc)
+        assert join_sections(preamble, sections) == doc
+
+def test_split_sections_explicit_level():
+    article = "# Title\nlead\n## A\na\n### A-1\nx\n## B\nb\n"
+    preamble, sections = split_sections(article, level=2)
+    assert preamble == "# Title\nlead\n"
+    assert [s.title for s in sections] == ["A", "B"]
+    assert "### A-1" in sections[0].text
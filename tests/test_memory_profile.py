@@ -0,0 +1,166 @@
+import asyncio
+from typing import TypedDict
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, StateGraph
+import src.memory_profile as memory_profile
+import src.session_tasks as session_tasks
+from src import artifact_view, speculation
+from src.artifact_store import ArtifactSerializer, ArtifactStore
+from src.checkpointer import SqliteCheckpointer
+from src.memory_profile import EVICTED, evict_idle_sessions, mount_memory_endpoint, session_sizes, snapshot_diff
+
+class _State(TypedDict, total=False):
+    doc: str
+
+def _graph(checkpointer):
+    workflow = StateGraph(_State)
+    workflow.add_node("write", lambda state: {"doc": state["doc"] * 2})
+    workflow.set_entry_point("write")
+    workflow.add_edge("write", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+async def _sessions(checkpointer, sizes):
+    graph = _graph(checkpointer)
+    for thread_id, size in sizes.items():
+        await session_tasks.run(thread_id, lambda config, size=size: graph.ainvoke({"doc": "x" * size}, config), {"configurable": {"thread_id": thread_id}})
+
+@pytest.fixture(autouse=True)
+def no_other_sessions(monkeypatch):
+    monkeypatch.setattr(session_tasks, "_last_active", {})
+    monkeypatch.setattr(artifact_view, "_views", {})
+    monkeypatch.setattr(speculation, "_speculations", {})
+
+@pytest.mark.asyncio
+async def test_sessions_are_reported_largest_first():
+    checkpointer = MemorySaver()
+    await _sessions(checkpointer, {"t-small": 1_000, "t-large": 50_000})
+
+    small, large = sorted(session_sizes(checkpointer), key=lambda session: session["memory_bytes"])
+    assert [session["thread_id"] for session in session_sizes(checkpointer)] == ["t-large", "t-small"]
+    # The input and both versions of doc, as channel values and as pending writes
+    assert 7 * 50_000 <= large["memory_bytes"] < 7 * 50_000 + 5_000
+    assert small["memory_bytes"] < large["memory_bytes"] / 10
+    assert large["checkpoint_bytes"] == large["memory_bytes"]
+    assert not large["running"] and large["idle_seconds"] >= 0
+
+def test_sqlite_session_sizes_match_session_bytes(tmp_path):
+    import asyncio
+    checkpointer = SqliteCheckpointer(str(tmp_path / "cp.sqlite"))
+    asyncio.run(_sessions(checkpointer, {"t-a": 1_000, "t-b": 5_000}))
+
+    assert checkpointer.session_sizes() == {thread_id: checkpointer.session_bytes(thread_id) for thread_id in ("t-a", "t-b")}
+    # On disk: reported, but not counted as memory of the process
+    assert all(session["memory_bytes"] == 0 for session in session_sizes(checkpointer))
+
+@pytest.mark.asyncio
+async def test_idle_sessions_are_evicted_largest_first_over_the_ceiling():
+    checkpointer = MemorySaver()
+    await _sessions(checkpointer, {"t-1": 10_000, "t-2": 20_000, "t-3": 40_000})
+    before = EVICTED.value()
+
+    assert await evict_idle_sessions(checkpointer, max_rss_bytes=10**9, idle_seconds=0, rss=10**8) == []
+    assert await evict_idle_sessions(checkpointer, max_rss_bytes=10**9, idle_seconds=3600, rss=10**9 + 1) == []
+
+    # Sessions hold about 7x their input: 300 KB over the ceiling takes the two largest
+    evicted = await evict_idle_sessions(checkpointer, max_rss_bytes=10**9, idle_seconds=0, rss=10**9 + 300_000)
+    assert evicted == ["t-3", "t-2"]
+    assert EVICTED.value() == before + 2
+    assert [session["thread_id"] for session in session_sizes(checkpointer)] == ["t-1"]
+    assert (await _graph(checkpointer).aget_state({"configurable": {"thread_id": "t-3"}})).values == {}
+
+@pytest.mark.asyncio
+async def test_evicting_an_in_memory_session_frees_its_artifacts():
+    store = ArtifactStore(":memory:")
+    checkpointer = MemorySaver(serde=ArtifactSerializer(store, min_bytes=1024))
+    graph = _graph(checkpointer)
+    docs = {"t-own": "a" * 30_000, "t-shared-1": "b" * 20_000, "t-shared-2": "b" * 20_000}
+    for thread_id, doc in docs.items():
+        await session_tasks.run(thread_id, lambda config, doc=doc: graph.ainvoke({"doc": doc}, config), {"configurable": {"thread_id": thread_id}})
+
+    sessions = {session["thread_id"]: session for session in session_sizes(checkpointer)}
+    # Input and output document of t-own; documents shared by both other sessions are not counted
+    own = store.sizes(memory_profile.artifact_refs(checkpointer)["t-own"])
+    assert len(own) == 2 and sessions["t-own"]["artifact_bytes"] == sum(own.values())
+    assert sessions["t-shared-1"]["artifact_bytes"] == 0
+    assert sessions["t-own"]["memory_bytes"] == sessions["t-own"]["checkpoint_bytes"] + sessions["t-own"]["artifact_bytes"]
+
+    await memory_profile.evict_session(checkpointer, "t-own")
+    await memory_profile.evict_session(checkpointer, "t-shared-1")
+
+    assert store.stats()["artifacts"] == 2
+    state = await graph.aget_state({"configurable": {"thread_id": "t-shared-2"}})
+    assert state.values["doc"] == "b" * 40_000
+
+def test_tracemalloc_diff_shows_the_growth_since_the_last_request():
+    retained = []
+    try:
+        assert snapshot_diff()["top"] == []
+        retained.append([bytearray(1000) for _ in range(1000)])
+        top = snapshot_diff(limit=5)["top"]
+    finally:
+        memory_profile.stop_tracing()
+
+    assert "test_memory_profile.py" in top[0]["location"]
+    assert top[0]["size_diff"] >= 1_000_000
+
+@pytest.mark.asyncio
+async def test_memory_endpoint_precedes_catch_all_route():
+    checkpointer = MemorySaver()
+    await _sessions(checkpointer, {"t-endpoint": 1_000})
+    app = FastAPI()
+
+    @app.get("/{full_path:path}")
+    async def frontend(full_path: str):
+        return {"page": full_path}
+
+    mount_memory_endpoint(app, checkpointer, allow_loopback=True)
+    report = TestClient(app, client=("127.0.0.1", 50000)).get("/admin/memory?top=1").json()
+
+    assert report["rss_bytes"] > 0
+    assert report["checkpoints_in_memory"]
+    assert [session["thread_id"] for session in report["largest_sessions"]] == ["t-endpoint"]
+    assert "tracemalloc" not in report
+
+def test_memory_endpoint_is_for_admins_only():
+    app = FastAPI()
+    # Neither a token nor the loopback opt-in: not mounted at all
+    assert not mount_memory_endpoint(app, MemorySaver(), path="/admin/none")
+    mount_memory_endpoint(app, MemorySaver(), allow_loopback=True)
+    mount_memory_endpoint(app, MemorySaver(), path="/admin/token", token="s3cret", allow_loopback=True)
+
+    assert TestClient(app).get("/admin/none").status_code == 404
+    assert TestClient(app).get("/admin/memory").status_code == 403
+    assert TestClient(app, client=("::1", 50000)).get("/admin/memory").status_code == 200
+    # With a token, a loopback client needs it too (e.g. behind a reverse proxy)
+    local = TestClient(app, client=("127.0.0.1", 50000))
+    assert local.get("/admin/token").status_code == 403
+    assert TestClient(app).get("/admin/token", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert TestClient(app).get("/admin/token", headers={"Authorization": "Bearer s3cret"}).json()["sessions"] == 0
+
+@pytest.mark.asyncio
+async def test_session_gauges_are_refreshed_in_the_background_not_on_scrape(monkeypatch):
+    """
+    セッションの計測はバックグラウンドタスクで行い、/metrics の取得時には行わないこと。
+    """
+    from src.metrics import REGISTRY
+
+    checkpointer = MemorySaver()
+    await _sessions(checkpointer, {"t-gauges": 5_000})
+    monkeypatch.setattr(memory_profile, "_memory_task", None)
+    assert memory_profile.start_memory_policy(checkpointer, {"enabled": True, "check_interval_seconds": 60})
+    try:
+        while memory_profile.SESSIONS.value() != 1:
+            await asyncio.sleep(0.01)
+        assert memory_profile.SESSION_BYTES.value(kind="checkpoints") >= 5_000
+
+        def no_scan(checkpointer):
+            raise AssertionError("session_sizes() called on scrape")
+
+        monkeypatch.setattr(memory_profile, "session_sizes", no_scan)
+        assert "mabg_sessions 1" in REGISTRY.render()
+    finally:
+        memory_profile._memory_task.cancel()
+        await asyncio.gather(memory_profile._memory_task, return_exceptions=True)
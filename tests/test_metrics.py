@@ -0,0 +1,112 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from src import metrics
+from src.agents.common import arun_agent_chain
+from src.metrics import Counter, Histogram, LLMMetricsCallback, Registry, mount_metrics_endpoint, timed_node
+
+def _fake_llm(text: str = "result") -> GenericFakeChatModel:
+    message = AIMessage(content=text, usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15})
+    return GenericFakeChatModel(messages=iter([message]))
+
+def test_histogram_and_counter_render():
+    registry = Registry()
+    histogram = registry.register(Histogram("h_seconds", "help", ("agent",), buckets=(0.1, 1.0)))
+    counter = registry.register(Counter("c_total", "help", ("agent",)))
+    histogram.observe(0.5, agent='a"b')
+    counter.inc(2, agent="x")
+
+    text = registry.render()
+
+    assert "# TYPE h_seconds histogram" in text
+    assert 'h_seconds_bucket{agent="a\\"b",le="0.1"} 0' in text
+    assert 'h_seconds_bucket{agent="a\\"b",le="1"} 1' in text
+    assert 'h_seconds_bucket{agent="a\\"b",le="+Inf"} 1' in text
+    assert 'h_seconds_count{agent="a\\"b"} 1' in text
+    assert 'c_total{agent="x"} 2' in text
+
+@pytest.mark.asyncio
+async def test_agent_call_metrics_are_labelled_by_node():
+    """
+    ノード内の LLM 呼び出しが agent / model / operation 別に記録されること。
+    """
+    llm = _fake_llm()
+    labels = {"agent": "spec_agent", "model": "GenericFakeChatModel", "operation": "refine"}
+    latency_before = metrics.LLM_LATENCY.count(**labels)
+    prompt_before = metrics.LLM_TOKENS.value(type="prompt", **labels)
+    node_before = metrics.NODE_LATENCY.count(node="spec_agent", operation="refine")
+
+    async def node(state):
+        return {"spec_doc": await arun_agent_chain(llm, "spec_generator", "{topic}", {"topic": state["topic"]})}
+
+    result = await timed_node("spec_agent", node)({"topic": "t", "user_feedback": "fix"})
+
+    assert result == {"spec_doc": "result"}
+    assert metrics.LLM_LATENCY.count(**labels) == latency_before + 1
+    assert metrics.LLM_TOKENS.value(type="prompt", **labels) == prompt_before + 12
+    assert metrics.NODE_LATENCY.count(node="spec_agent", operation="refine") == node_before + 1
+
+@pytest.mark.asyncio
+async def test_agent_call_keeps_the_graph_message_stream():
+    """
+    計測用コールバックを足しても、グラフの stream_mode="messages" にトークンが流れること。
+    """
+    from typing import TypedDict
+    from langgraph.graph import END, START, StateGraph
+
+    class State(TypedDict, total=False):
+        topic: str
+        spec_doc: str
+
+    llm = _fake_llm("streamed spec text")
+
+    async def node(state):
+        return {"spec_doc": await arun_agent_chain(llm, "spec_generator", "{topic}", {"topic": state["topic"]})}
+
+    builder = StateGraph(State)
+    builder.add_node("spec_agent", node)
+    builder.add_edge(START, "spec_agent")
+    builder.add_edge("spec_agent", END)
+    graph = builder.compile()
+
+    chunks = [chunk async for chunk, _ in graph.astream({"topic": "t"}, stream_mode="messages")]
+
+    assert "".join(str(chunk.content) for chunk in chunks) == "streamed spec text"
+
+@pytest.mark.asyncio
+async def test_ttft_recorded_when_streaming():
+    labels = {"agent": "writing_agent", "model": "fake", "operation": "generate"}
+    before = metrics.LLM_TTFT.count(**labels)
+    callback = LLMMetricsCallback(agent="writing_agent", operation="generate", model="fake")
+
+    chunks = [chunk async for chunk in _fake_llm("a b c").astream("hi", config={"callbacks": [callback]})]
+
+    assert len(chunks) > 1
+    assert metrics.LLM_TTFT.count(**labels) == before + 1
+
+@pytest.mark.asyncio
+async def test_node_errors_counted():
+    async def failing(state):
+        raise RuntimeError("boom")
+
+    before = metrics.NODE_ERRORS.value(node="writing_agent", operation="generate", error="RuntimeError")
+    with pytest.raises(RuntimeError):
+        await timed_node("writing_agent", failing)({})
+    assert metrics.NODE_ERRORS.value(node="writing_agent", operation="generate", error="RuntimeError") == before + 1
+
+def test_metrics_endpoint_precedes_catch_all_route():
+    app = FastAPI()
+
+    @app.get("/{full_path:path}")
+    async def frontend(full_path: str):
+        return {"page": full_path}
+
+    mount_metrics_endpoint(app)
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE mabg_llm_request_seconds histogram" in response.text
+    assert "mabg_scheduler_queue_wait_seconds" in response.text
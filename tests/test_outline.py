@@ -0,0 +1,64 @@
+import pytest
+from pydantic import ValidationError
+from src.agents.outline import Outline, OutlineSection, load_outline, parse_outline
+
+def make_outline(*titles: str) -> Outline:
+    return Outline(
+        title="記事タイトル",
+        sections=[OutlineSection(title=title, goal=f"{title}の目的", target_chars=500, points=[f"{title}の要素"]) for title in titles],
+    )
+
+def test_markdown_round_trip():
+    outline = make_outline("導入", "本題", "まとめ")
+
+    parsed = Outline.from_markdown(outline.to_markdown())
+
+    assert parsed == outline
+    assert load_outline(outline.model_dump()) == outline
+
+def test_section_lookup():
+    outline = make_outline("導入", "本題", "まとめ")
+
+    assert outline.section("本題").goal == "本題の目的"
+    assert outline.section("H2: まとめ").title == "まとめ"
+    assert outline.section("付録") is None
+
+def test_malformed_outlines_are_rejected():
+    with pytest.raises(ValidationError, match="duplicate section titles"):
+        make_outline("導入", "本題", "本題")
+    with pytest.raises(ValidationError):
+        make_outline("導入")
+    with pytest.raises(ValidationError):
+        OutlineSection(title="導入", goal="g", target_chars=0)
+    assert parse_outline("本文だけで見出しがない") is None
+
+def test_from_markdown_reads_the_prompt_format():
+    markdown = """# 記事構成案
+
+## 記事タイトル案
+1.  LangGraph 入門
+2.  LangGraph で作るエージェント
+3.  はじめての LangGraph
+
+## 構成案
+
+### H2: 導入 (Lead)
+*   **このセクションの目的**: 読者の課題を提示する
+*   **目安の文字数**: 約1,200文字
+*   **含めるべき要素**:
+    *   よくある失敗
+    *   H3: この記事で分かること
+
+### まとめ (Conclusion)
+*   要点の振り返り
+
+## メモ / 戦略的意図
+*   失敗例から入る
+"""
+    outline = Outline.from_markdown(markdown)
+
+    assert outline.title == "LangGraph 入門"
+    lead, summary = outline.sections
+    assert (lead.title, lead.goal, lead.target_chars) == ("導入 (Lead)", "読者の課題を提示する", 1200)
+    assert lead.points == ["よくある失敗", "H3: この記事で分かること"]
+    assert (summary.title, summary.goal, summary.target_chars, summary.points) == ("まとめ (Conclusion)", "要点の振り返り", 800, [])
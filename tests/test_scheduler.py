@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from src.scheduler import LLMScheduler, TokenBucket
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(60)  # 1 per second, capacity 60
+    assert bucket.wait_time(1) == 0
+    bucket.consume(60)
+    assert 0.9 < bucket.wait_time(1) <= 1.0
+    # Unlimited bucket never waits
+    assert TokenBucket(None).wait_time(10**9) == 0
+
+async def _run(scheduler, model, session, priority, order, tokens=1):
+    async with scheduler.slot(model, tokens, session_id=session, priority=priority):
+        order.append(session)
+
+@pytest.mark.asyncio
+async def test_sessions_are_served_round_robin():
+    """
+    同じモデルを待つセッションはラウンドロビンで処理され、1セッションが独占しないこと。
+    """
+    scheduler = LLMScheduler({"requests_per_minute": 6000})  # one request per 10 ms once drained
+    scheduler._queue("m").requests.level = 0
+    order = []
+
+    await asyncio.gather(
+        _run(scheduler, "m", "heavy", "interactive", order),
+        _run(scheduler, "m", "heavy", "interactive", order),
+        _run(scheduler, "m", "heavy", "interactive", order),
+        _run(scheduler, "m", "light", "interactive", order),
+    )
+
+    assert order == ["heavy", "light", "heavy", "heavy"]
+    stats = scheduler.snapshot()
+    assert stats["admitted"]["interactive"] == 4
+    assert stats["wait_seconds_max"] > 0
+    assert stats["queue_depth"] == {"m": 0}
+
+@pytest.mark.asyncio
+async def test_interactive_sessions_go_before_batch():
+    scheduler = LLMScheduler({"requests_per_minute": 6000})
+    scheduler._queue("m").requests.level = 0
+    order = []
+
+    batch = [asyncio.create_task(_run(scheduler, "m", f"batch-{i}", "batch", order)) for i in range(3)]
+    await asyncio.sleep(0)
+    await _run(scheduler, "m", "user", "interactive", order)
+    await asyncio.gather(*batch)
+
+    assert order[0] == "user"
+
+@pytest.mark.asyncio
+async def test_token_limit_and_usage_settlement():
+    """
+    tokens/min の制限を超える場合は待機し、実際の使用量で見積もりとの差分を精算すること。
+    """
+    scheduler = LLMScheduler({"models": {"m": {"tokens_per_minute": 600}}})
+    async with scheduler.slot("m", 100, session_id="s") as ticket:
+        ticket.used_tokens = 500
+    bucket = scheduler._queue("m").tokens
+    assert bucket.wait_time(200) > 0
+    # Other models are not limited
+    assert scheduler._queue("other").tokens.wait_time(10**6) == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    scheduler = LLMScheduler({"requests_per_minute": 60})
+    scheduler._queue("m").requests.level = 0
+    task = asyncio.create_task(_run(scheduler, "m", "s", "interactive", []))
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth() == {"m": 1}
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert scheduler.queue_depth() == {"m": 0}
+
+def test_blocking_slot_for_sync_path():
+    scheduler = LLMScheduler({"requests_per_minute": 60})
+    with scheduler.blocking_slot("m", 10) as ticket:
+        ticket.used_tokens = 20
+    assert scheduler.snapshot()["admitted"]["interactive"] == 1
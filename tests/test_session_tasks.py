@@ -0,0 +1,97 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+import pytest
+import src.app as app
+import src.session_tasks as session_tasks
+from src.session_tasks import CANCELLED_RUNS, SAVED_SECONDS, SAVED_TOKENS
+from src.utils.fake_llm import FakeStreamingChatModel
+
+@pytest.mark.asyncio
+async def test_new_run_supersedes_the_running_one():
+    started = asyncio.Event()
+
+    async def slow(config):
+        started.set()
+        await asyncio.sleep(10)
+        return "slow"
+
+    async def fast(config):
+        return "fast"
+
+    before = CANCELLED_RUNS.value(reason="superseded")
+    first = asyncio.create_task(session_tasks.run("t-supersede", slow, {}))
+    await started.wait()
+
+    assert await session_tasks.run("t-supersede", fast, {}) == "fast"
+    # The superseded caller returns quietly instead of failing
+    assert await first is None
+    assert CANCELLED_RUNS.value(reason="superseded") == before + 1
+    assert not await session_tasks.cancel_run("t-supersede", "stop")
+
+@pytest.mark.asyncio
+async def test_cancelling_the_caller_is_propagated():
+    task = asyncio.create_task(session_tasks.run("t-caller", lambda config: asyncio.sleep(10), {}))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert "t-caller" not in session_tasks._runs
+
+@pytest.mark.asyncio
+async def test_cancelled_llm_call_counts_the_estimated_savings(monkeypatch):
+    monkeypatch.setattr(session_tasks, "_estimates", {})
+    llm = FakeStreamingChatModel(tokens_per_second=200, output_tokens=40)
+
+    async def call_llm(config):
+        config = {**config, "metadata": {"langgraph_node": "t_node"}}
+        return (await llm.ainvoke("hello", config)).content
+
+    # A completed call gives the estimate: 40 tokens in about 0.2 s
+    await session_tasks.run("t-savings", call_llm, {})
+    tokens, seconds = session_tasks._estimates["t_node"]
+    assert tokens == 40 and seconds >= 0.15
+
+    before_tokens, before_seconds = SAVED_TOKENS.value(node="t_node"), SAVED_SECONDS.value(node="t_node")
+    task = asyncio.create_task(session_tasks.run("t-savings", call_llm, {}))
+    await asyncio.sleep(0.05)
+    assert await session_tasks.cancel_run("t-savings", "stop")
+
+    assert await task is None
+    assert SAVED_TOKENS.value(node="t_node") == before_tokens + 40
+    assert SAVED_SECONDS.value(node="t_node") - before_seconds > 0.05
+
+@pytest.mark.asyncio
+async def test_stop_leaves_the_thread_at_the_last_review(mock_cl_fixture):
+    mock_cl, mock_user_session = mock_cl_fixture
+    thread_id = "t-stop"
+    app_graph = app.get_app_graph()
+    mock_user_session.get.side_effect = lambda key: app_graph if key == "graph" else thread_id
+    config = {"configurable": {"thread_id": thread_id}}
+    structure_started = asyncio.Event()
+
+    async def spec_chain(**kwargs):
+        return "Spec doc"
+
+    async def structure_chain(**kwargs):
+        structure_started.set()
+        await asyncio.sleep(10)
+        return "Structure doc"
+
+    with patch("src.agents.spec.arun_agent_chain", side_effect=spec_chain), \
+         patch("src.agents.structure.arun_agent_chain", side_effect=structure_chain):
+        await app_graph.ainvoke({"topic": "topic"}, config)
+        approve = asyncio.create_task(app.on_approve(AsyncMock()))
+        await structure_started.wait()
+
+        await app.on_stop()
+        await approve
+
+    # The structure run was cancelled and the spec is up for review again
+    snapshot = await app_graph.aget_state(config)
+    assert snapshot.next == ("human_review",)
+    assert snapshot.values["phase"] == "Spec"
+    assert snapshot.values["user_feedback"] is None
+    assert "structure_doc" not in snapshot.values
+    assert thread_id not in session_tasks._runs
+    # ... and shown with the review buttons again
+    assert any(call.kwargs.get("name") == "approve" for call in mock_cl.Action.call_args_list[-2:])
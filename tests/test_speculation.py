@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from src import speculation
+from src.graph import get_app_graph
+
+@pytest.fixture(autouse=True)
+def reset_speculation():
+    speculation._speculations.clear()
+    for key in speculation._stats:
+        speculation._stats[key] = 0
+    yield
+    speculation._speculations.clear()
+
+@pytest.mark.asyncio
+async def test_speculation_hit_is_applied_as_next_node():
+    """
+    Spec レビュー中に投機実行した構成案を、承認時にそのまま次フェーズの結果として反映できること。
+    """
+    app_graph = get_app_graph()
+    config = {"configurable": {"thread_id": "spec-hit"}}
+    with patch("src.agents.spec.arun_agent_chain", return_value="Spec Doc"):
+        await app_graph.ainvoke({"topic": "topic"}, config)
+
+    state = (await app_graph.aget_state(config)).values
+    with patch("src.agents.structure.arun_agent_chain", return_value="Speculated Structure") as mock_structure:
+        assert speculation.start_speculation("spec-hit", state)
+        await asyncio.sleep(0)
+
+        # Approve
+        await app_graph.aupdate_state(config, {"user_feedback": None})
+        approved = (await app_graph.aget_state(config)).values
+        node_name, output = await speculation.take_speculation("spec-hit", approved)
+
+    assert node_name == "structure_agent"
+    mock_structure.assert_called_once()
+    await app_graph.aupdate_state(config, output, as_node=node_name)
+    snapshot = await app_graph.aget_state(config)
+    assert snapshot.values["structure_doc"] == "Speculated Structure"
+    assert snapshot.values["phase"] == "Structure"
+    assert snapshot.next == ("human_review",)
+    assert speculation.speculation_stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_speculation_miss_when_artifact_changed():
+    state = {"phase": "Spec", "topic": "t", "spec_doc": "v1"}
+    with patch("src.agents.structure.arun_agent_chain", return_value="Structure"):
+        speculation.start_speculation("miss", state)
+        result = await speculation.take_speculation("miss", {**state, "spec_doc": "v2"})
+
+    assert result is None
+    assert speculation.speculation_stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_cancel_speculation_on_amend():
+    """
+    Amend 時は実行中の投機タスクをキャンセルし、統計に記録すること。
+    """
+    started = asyncio.Event()
+
+    async def slow_chain(**kwargs):
+        started.set()
+        await asyncio.sleep(10)
+
+    with patch("src.agents.structure.arun_agent_chain", side_effect=slow_chain):
+        speculation.start_speculation("amend", {"phase": "Spec", "spec_doc": "v1"})
+        task = speculation._speculations["amend"].task
+        await started.wait()
+        speculation.cancel_speculation("amend")
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    stats = speculation.speculation_stats()
+    assert stats["cancelled"] == 1
+    assert stats["hit_rate"] == 0.0
+    assert await speculation.take_speculation("amend", {"phase": "Spec"}) is None
+
+@pytest.mark.asyncio
+async def test_speculative_calls_are_queued_as_batch_work_of_the_session():
+    from src.scheduler import _current_session
+    sessions = []
+
+    async def chain(**kwargs):
+        sessions.append(_current_session())
+        return "Structure"
+
+    with patch("src.agents.structure.arun_agent_chain", side_effect=chain):
+        speculation.start_speculation("batch-session", {"phase": "Spec", "spec_doc": "v1"})
+        await speculation.take_speculation("batch-session", {"phase": "Spec", "spec_doc": "v1"})
+
+    assert sessions == [("batch-session", "batch")]
+
+@pytest.mark.asyncio
+async def test_cancelled_speculation_counts_the_tokens_of_the_call_in_flight(monkeypatch):
+    """
+    実行中の LLM 呼び出しをキャンセルした場合も、送ったプロンプトと生成済みと推定される
+    トークンを無駄になったトークンとして計上し、メトリクスに出力すること。
+    """
+    from src import session_tasks
+    from src.speculation import SPECULATIONS, WASTED_TOKENS
+    from src.utils.fake_llm import FakeStreamingChatModel
+
+    # structure_agent calls produce 1000 tokens in 0.05 s on average
+    monkeypatch.setitem(session_tasks._estimates, "structure_agent", (1000.0, 0.05))
+    llm = FakeStreamingChatModel(latency_seconds=10)
+    cancelled, wasted = SPECULATIONS.value(result="cancelled"), WASTED_TOKENS.value(node="structure_agent")
+
+    with patch("src.agents.structure.get_agent_llm", return_value=llm):
+        speculation.start_speculation("in-flight", {"phase": "Spec", "spec_doc": "spec " * 400})
+        await asyncio.sleep(0.1)
+        assert speculation._speculations["in-flight"].in_flight.calls
+        speculation.cancel_speculation("in-flight")
+
+    assert SPECULATIONS.value(result="cancelled") == cancelled + 1
+    spent = WASTED_TOKENS.value(node="structure_agent") - wasted
+    # The prompt (the spec alone is about 500 tokens) and the estimated completion
+    assert spent >= 1500
+    assert speculation.speculation_stats()["wasted_tokens"] == spent
+
+def test_no_speculation_after_writing_phase():
+    assert not speculation.start_speculation("done", {"phase": "Writing"})
+
+def test_no_speculation_from_an_outline_that_failed_validation():
+    state = {"phase": "Structure", "structure_doc": "見出しのない構成案", "outline_error": "sections: Field required"}
+    assert not speculation.start_speculation("malformed", state)
@@ -1,15 +1,16 @@
 import pytest
 from unittest.mock import patch
-from src.agents.structure import structure_agent_node
+from src.agents.structure import astructure_agent_node
 from src.state import BlogSessionState
 
 @pytest.fixture
 def mock_run_agent():
-    with patch("src.agents.structure.run_agent_chain") as mock:
-        mock.return_value = "# Mocked Structure Plan\n\n## H2: Section 1"
+    with patch("src.agents.structure.arun_agent_chain") as mock:
+        mock.return_value = "# Mocked Structure Plan\n\n## H2: Section 1\n\n## H2: Section 2"
         yield mock
 
-def test_structure_agent_generation(mock_run_agent):
+@pytest.mark.asyncio
+async def test_structure_agent_generation(mock_run_agent):
     """
     [REQ-FUN-020] 構成案生成フローのテスト。
     """
@@ -22,7 +23,7 @@ def test_structure_agent_generation(mock_run_agent):
     )
     
     # Act
-    result = structure_agent_node(state)
+    result = await astructure_agent_node(state)
     
     # Assert
     assert result["phase"] == "Structure"
@@ -33,7 +34,8 @@ def test_structure_agent_generation(mock_run_agent):
     args = mock_run_agent.call_args[1]
     assert args["input_vars"]["spec_doc"] == state["spec_doc"]
 
-def test_structure_agent_refinement(mock_run_agent):
+@pytest.mark.asyncio
+async def test_structure_agent_refinement(mock_run_agent):
     """
     [REQ-FUN-021] フィードバックによる構成案修正フローのテスト。
     """
@@ -47,7 +49,7 @@ def test_structure_agent_refinement(mock_run_agent):
     )
     
     # Act
-    result = structure_agent_node(state)
+    result = await astructure_agent_node(state)
     
     # Assert
     assert result["phase"] == "Structure"
@@ -58,12 +60,73 @@ def test_structure_agent_refinement(mock_run_agent):
     args = mock_run_agent.call_args[1]
     assert args["input_vars"]["feedback"] == "Make it better"
 
-def test_structure_agent_missing_spec():
+@pytest.mark.asyncio
+async def test_structure_agent_missing_spec():
     """
     spec_doc が欠落している場合のエラーハンドリングをテスト。
     """
     state = BlogSessionState(topic="Test Topic") # spec_doc なし
     
-    result = structure_agent_node(state)
+    result = await astructure_agent_node(state)
     
     assert "Error: Spec is missing" in result["structure_doc"]
+
+@pytest.mark.asyncio
+async def test_structure_agent_stores_the_validated_outline():
+    """
+    モデルの Markdown はそのまま structure_doc になり、解析した Outline が一緒に state に保存されること。
+    """
+    markdown = (
+        "# 記事構成案\n\n## 記事タイトル案\n1. 案A\n2. 案B\n3. 案C\n\n## 構成案\n\n"
+        "### 導入 (Lead)\n*   **目安の文字数**: 約400文字\n*   課題の提示\n\n"
+        "### まとめ (Conclusion)\n*   **目安の文字数**: 約300文字\n*   振り返り\n\n"
+        "## メモ / 戦略的意図\n*   結論を先に置いた\n"
+    )
+    with patch("src.agents.structure.arun_agent_chain", return_value=markdown) as mock:
+        result = await astructure_agent_node(BlogSessionState(spec_doc="# Spec", phase="Spec"))
+
+    assert mock.call_count == 1
+    assert result["structure_doc"] == markdown
+    assert result["outline"]["title"] == "案A"
+    assert [(section["title"], section["target_chars"], section["points"]) for section in result["outline"]["sections"]] == [
+        ("導入 (Lead)", 400, []),
+        ("まとめ (Conclusion)", 300, []),
+    ]
+
+@pytest.mark.asyncio
+async def test_structure_agent_retries_an_invalid_outline_once():
+    """
+    検証に失敗した構成案は1回だけ再生成し、それでも失敗すれば Outline なしで最後の構成案を返すこと。見出しのない回答は再生成しない。
+    """
+    from src.agents.structure import OUTLINE_ERRORS
+
+    duplicated = "# 構成案\n\n### H2: 本題\n- A\n\n### H2: 本題\n- B\n"
+    markdown = "# 構成案\n\n### H2: 導入\n- 課題\n\n### H2: まとめ\n- 振り返り\n"
+
+    before = OUTLINE_ERRORS.value()
+    with patch("src.agents.structure.arun_agent_chain", side_effect=[duplicated, markdown]) as mock:
+        result = await astructure_agent_node(BlogSessionState(spec_doc="# Spec", phase="Spec"))
+
+    assert mock.call_count == 2
+    assert OUTLINE_ERRORS.value() == before + 1
+    assert result["structure_doc"] == markdown
+    assert [section["title"] for section in result["outline"]["sections"]] == ["導入", "まとめ"]
+    assert result["outline_error"] is None
+
+    with patch("src.agents.structure.arun_agent_chain", side_effect=[duplicated, duplicated]):
+        result = await astructure_agent_node(BlogSessionState(spec_doc="# Spec", phase="Spec"))
+
+    assert OUTLINE_ERRORS.value() == before + 3
+    assert result["structure_doc"] == duplicated
+    assert result["outline"] is None
+    # Shown to the reviewer, who has to amend the outline before approving it
+    assert "duplicate section titles: 本題" in result["outline_error"]
+
+    # An answer without headings is not retried
+    with patch("src.agents.structure.arun_agent_chain", return_value="見出しのない構成案") as mock:
+        result = await astructure_agent_node(BlogSessionState(spec_doc="# Spec", phase="Spec"))
+
+    assert mock.call_count == 1
+    assert result["structure_doc"] == "見出しのない構成案"
+    assert result["outline"] is None
+    assert result["outline_error"].startswith("sections:")
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import time
+import pytest
+from src.metrics import timed_node
+from src.watchdog import LOOP_LAG, LOOP_STALLS, LoopWatchdog, start_watchdog
+
+def blocking_call():
+    time.sleep(0.3)
+
+@pytest.mark.asyncio
+async def test_blocking_node_is_reported_with_stack_and_session(caplog):
+    async def slow_node(state):
+        blocking_call()
+        return state
+
+    node = timed_node("writing_agent", slow_node)
+    before = LOOP_STALLS.value(node="writing_agent")
+    watchdog = LoopWatchdog(asyncio.get_running_loop(), threshold=0.05, interval=0.01)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        config = {"configurable": {"thread_id": "thread-42"}}
+        with caplog.at_level(logging.WARNING, logger="src.watchdog"):
+            await node({"config": config})
+            await asyncio.sleep(0.05)
+    finally:
+        watchdog.stop()
+
+    stall = watchdog.stalls[-1]
+    assert stall["seconds"] >= 0.2
+    assert stall["node"] == "writing_agent"
+    assert stall["thread_id"] == "thread-42"
+    assert "blocking_call" in stall["stack"]
+    assert LOOP_STALLS.value(node="writing_agent") == before + 1
+    assert any("thread-42" in record.getMessage() and "blocking_call" in record.getMessage() for record in caplog.records)
+
+@pytest.mark.asyncio
+async def test_responsive_loop_records_lag_without_stalls():
+    before = LOOP_LAG.count()
+    watchdog = LoopWatchdog(asyncio.get_running_loop(), threshold=0.1, interval=0.01)
+    watchdog.start()
+    try:
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+    finally:
+        watchdog.stop()
+
+    assert LOOP_LAG.count() > before
+    assert not watchdog.stalls
+
+def test_watchdog_is_opt_in():
+    # Disabled: nothing is started, so no running loop is needed
+    assert start_watchdog({"enabled": False}) is None
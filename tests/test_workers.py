@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+import pytest
+import pytest_asyncio
+from langchain_core.runnables import RunnableLambda
+import src.workers as workers
+from src.job_queue import JobQueue
+from src.utils.fake_llm import FakeStreamingChatModel
+from src.workers import JOB_LATENCY, WorkerJobError, agent_node, remote_node, worker_loop
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(workers, "_queue", queue)
+    monkeypatch.setattr(workers, "settings", lambda: {"enabled": True, "poll_interval_ms": 10})
+    yield queue
+    queue.close()
+
+async def streaming_node(state):
+    llm = FakeStreamingChatModel(tokens_per_second=2000, output_tokens=40)
+    text = (await llm.ainvoke(state["topic"])).content
+    return {"spec_doc": text, "phase": "Spec", "user_feedback": None}
+
+async def failing_node(state):
+    raise ValueError("boom")
+
+async def slow_node(state):
+    await asyncio.sleep(10)
+    return {}
+
+NODES = {"spec_agent": streaming_node, "structure_agent": failing_node, "writing_agent": slow_node}
+
+@pytest_asyncio.fixture
+async def worker(queue):
+    stop = asyncio.Event()
+    task = asyncio.create_task(worker_loop(queue, "test-worker", poll_interval=0.01, heartbeat=0.02, stop=stop, nodes=NODES))
+    yield
+    stop.set()
+    await task
+
+def test_queue_claim_is_fifo_and_stale_jobs_are_retried(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_attempts=2)
+    first = queue.enqueue("spec_agent", {"topic": "a"})
+    queue.enqueue("spec_agent", {"topic": "b"})
+
+    job = queue.claim("w1")
+    assert (job.id, job.state, job.attempts) == (first, {"topic": "a"}, 1)
+    assert queue.depth() == {"queued": 1, "running": 1}
+
+    # The worker died: without heartbeat the job is handed out again, and failed after max_attempts
+    time.sleep(0.02)
+    assert queue.claim("w2", stale_seconds=0.01).id == first
+    time.sleep(0.02)
+    assert queue.claim("w3", stale_seconds=0.01).state == {"topic": "b"}
+    assert queue.get(first)["status"] == "failed"
+    queue.close()
+
+def test_interactive_jobs_are_claimed_before_batch_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    queue.enqueue("spec_agent", {"topic": "batch"}, {"thread_id": "b", "priority": "batch"})
+    queue.enqueue("spec_agent", {"topic": "chat"}, {"thread_id": "c", "priority": "interactive"})
+    queue.enqueue("spec_agent", {"topic": "script"})
+
+    claimed = [queue.claim("w") for _ in range(3)]
+    assert [job.state["topic"] for job in claimed] == ["chat", "script", "batch"]
+    assert claimed[0].configurable == {"thread_id": "c", "priority": "interactive"}
+    assert claimed[1].configurable == {}
+    queue.close()
+
+@pytest.mark.asyncio
+async def test_worker_runs_the_node_in_the_session_of_the_graph_run(queue):
+    """
+    ワーカー上のノードも元のセッション (thread_id / priority) でスケジューラに並ぶこと。
+    """
+    from src.scheduler import _current_session
+
+    async def session_node(state):
+        thread_id, priority = _current_session()
+        return {"spec_doc": f"{thread_id}/{priority}"}
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(worker_loop(
+        queue, "test-worker", poll_interval=0.01, heartbeat=0.02, stop=stop, nodes={"spec_agent": session_node},
+    ))
+    config = {"configurable": {"thread_id": "t-batch", "priority": "batch"}}
+    result = await RunnableLambda(remote_node("spec_agent")).ainvoke({"topic": "x"}, config)
+    stop.set()
+    await task
+
+    assert result == {"spec_doc": "t-batch/batch"}
+
+@pytest.mark.asyncio
+async def test_remote_node_returns_the_worker_result_and_streams_progress(queue, worker):
+    from langgraph.graph import END, StateGraph
+    from src.state import BlogSessionState
+
+    graph = StateGraph(BlogSessionState)
+    graph.add_node("spec_agent", remote_node("spec_agent"))
+    graph.set_entry_point("spec_agent")
+    graph.add_edge("spec_agent", END)
+    before = JOB_LATENCY.count(node="spec_agent")
+
+    progress = []
+    async for mode, payload in graph.compile().astream({"topic": "hello"}, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            progress.append(payload["token"])
+        else:
+            final = payload
+
+    expected = (await FakeStreamingChatModel(output_tokens=40).ainvoke("hello")).content
+    assert final["spec_doc"] == expected
+    assert "".join(progress) == expected
+    assert JOB_LATENCY.count(node="spec_agent") == before + 1
+    assert queue.depth() == {"queued": 0, "running": 0}
+
+@pytest.mark.asyncio
+async def test_requeued_job_streams_from_the_start_and_fences_off_the_lost_worker(queue):
+    """
+    ワーカー喪失で再キューされたジョブは、進捗を最初から流し直し、元のワーカーの書き込みを受け付けないこと。
+    """
+    from langgraph.graph import END, StateGraph
+    from src.state import BlogSessionState
+
+    graph = StateGraph(BlogSessionState)
+    graph.add_node("spec_agent", remote_node("spec_agent"))
+    graph.set_entry_point("spec_agent")
+    graph.add_edge("spec_agent", END)
+
+    async def lost_then_retried():
+        while (lost := queue.claim("lost")) is None:
+            await asyncio.sleep(0.01)
+        queue.heartbeat(lost.id, "partial ", lost.attempts)
+        await asyncio.sleep(0.1)
+        retry = queue.claim("retry", stale_seconds=0)
+        assert (retry.id, retry.attempts) == (lost.id, 2)
+        assert queue.heartbeat(lost.id, "late ", lost.attempts) == "requeued"
+        queue.complete(lost.id, {"spec_doc": "lost"}, "", lost.attempts)
+        queue.heartbeat(retry.id, "fresh", retry.attempts)
+        await asyncio.sleep(0.1)
+        queue.complete(retry.id, {"spec_doc": "fresh"}, "", retry.attempts)
+
+    driver = asyncio.create_task(lost_then_retried())
+    events = []
+    async for mode, payload in graph.compile().astream({"topic": "hello"}, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            events.append("<restart>" if payload.get("restart") else payload["token"])
+        else:
+            final = payload
+    await driver
+
+    assert "".join(events) == "partial <restart>fresh"
+    assert final["spec_doc"] == "fresh"
+
+def test_queue_path_is_relative_to_the_project_root(tmp_path):
+    assert workers.queue_path({}) == os.path.join(workers.PROJECT_ROOT, ".cache", "jobs.sqlite")
+    assert workers.queue_path({"queue_path": str(tmp_path / "q.sqlite")}) == str(tmp_path / "q.sqlite")
+
+@pytest.mark.asyncio
+async def test_worker_failure_is_raised_in_the_web_process(queue, worker):
+    with pytest.raises(WorkerJobError, match="ValueError: boom"):
+        await remote_node("structure_agent")({"topic": "x"})
+
+@pytest.mark.asyncio
+async def test_cancelling_the_caller_stops_the_worker_job(queue, worker):
+    call = asyncio.create_task(remote_node("writing_agent")({"topic": "x"}))
+    while queue.depth()["running"] == 0:
+        await asyncio.sleep(0.01)
+
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+
+    (job_id,) = [row[0] for row in queue._conn.execute("SELECT id FROM jobs")]
+    assert queue.get(job_id)["status"] == "cancelled"
+    assert queue.depth()["running"] == 0
+
+@pytest.mark.asyncio
+async def test_agent_node_runs_on_a_worker_only_when_enabled(monkeypatch):
+    async def local(state):
+        return {"spec_doc": "local"}
+
+    def remote(name):
+        async def run(state):
+            return {"spec_doc": f"remote {name}"}
+        return run
+
+    monkeypatch.setattr("src.workers.remote_node", remote)
+    node = agent_node("spec_agent", local)
+    assert await node({"topic": "x"}) == {"spec_doc": "local"}
+
+    monkeypatch.setattr("src.workers.is_enabled", lambda: True)
+    assert await node({"topic": "x"}) == {"spec_doc": "remote spec_agent"}
@@ -1,15 +1,16 @@
 import pytest
 from unittest.mock import patch
 from src.state import BlogSessionState
-from src.agents.writing import writing_agent_node
+from src.agents.writing import awriting_agent_node
 
 @pytest.fixture
 def mock_run_agent():
-    with patch("src.agents.writing.run_agent_chain") as mock:
+    with patch("src.agents.writing.arun_agent_chain") as mock:
         mock.return_value = "# Mock Article\n\nContent..."
         yield mock
 
-def test_writing_agent_generate_flow(mock_run_agent):
+@pytest.mark.asyncio
+async def test_writing_agent_generate_flow(mock_run_agent):
     """
     [REQ-FUN-030] 記事生成フローのテスト
     - フィードバックがない場合、新規生成が行われること
@@ -21,7 +22,7 @@ def test_writing_agent_generate_flow(mock_run_agent):
         "phase": "Structure"
     }
     
-    result = writing_agent_node(state)
+    result = await awriting_agent_node(state)
     
     assert result["phase"] == "Writing"
     assert result["final_article"] == "# Mock Article\n\nContent..."
@@ -33,7 +34,8 @@ def test_writing_agent_generate_flow(mock_run_agent):
     assert args["input_vars"]["spec_doc"] == state["spec_doc"]
     assert args["input_vars"]["structure_doc"] == state["structure_doc"]
 
-def test_writing_agent_refine_flow(mock_run_agent):
+@pytest.mark.asyncio
+async def test_writing_agent_refine_flow(mock_run_agent):
     """
     [REQ-FUN-031] 記事修正フローのテスト
     - フィードバックがある場合、修正が行われること
@@ -46,7 +48,7 @@ def test_writing_agent_refine_flow(mock_run_agent):
         "phase": "Writing"
     }
     
-    result = writing_agent_node(state)
+    result = await awriting_agent_node(state)
     
     assert result["phase"] == "Writing"
     assert result["final_article"] == "# Mock Article\n\nContent..."
@@ -57,3 +59,208 @@ def test_writing_agent_refine_flow(mock_run_agent):
     args = mock_run_agent.call_args[1]
     assert args["input_vars"]["current_article"] == state["final_article"]
     assert args["input_vars"]["feedback"] == "Make it longer"
+
+@pytest.mark.asyncio
+async def test_awriting_agent_refine_flow():
+    """
+    非同期ノードでもフィードバックがある場合は修正フローになること
+    """
+    from unittest.mock import AsyncMock
+
+    state: BlogSessionState = {
+        "spec_doc": "# Spec\n...",
+        "structure_doc": "# Structure\n...",
+        "final_article": "# Old Article",
+        "user_feedback": "Make it longer",
+        "phase": "Writing"
+    }
+    with patch("src.agents.writing.arun_agent_chain", new_callable=AsyncMock) as mock:
+        mock.return_value = "# Revised"
+        result = await awriting_agent_node(state)
+
+    assert result["final_article"] == "# Revised"
+    assert mock.call_args[1]["input_vars"]["feedback"] == "Make it longer"
+
+@pytest.mark.asyncio
+async def test_awriting_agent_parallel_sections():
+    """
+    [REQ-FUN-030] parallel_sections 有効時は構成案の見出しごとに並行執筆し、
+    構成案の順に結合すること。同時実行数は max_parallel_sections 以下であること。
+    """
+    import asyncio
+
+    running = 0
+    peak = 0
+
+    async def fake_chain(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        input_vars = kwargs["input_vars"]
+        # Later sections finish first to check ordering
+        await asyncio.sleep(0.01 * (input_vars["total"] - input_vars["index"]))
+        running -= 1
+        return f"## {input_vars['section_title']}\nbody {input_vars['index']}"
+
+    structure_doc = "# 構成案\n\n### 導入\n- a\n\n### H2: 本題\n- b\n\n### まとめ\n- c\n"
+    state: BlogSessionState = {"spec_doc": "# Spec", "structure_doc": structure_doc, "phase": "Structure"}
+    config = {"parallel_sections": True, "max_parallel_sections": 2}
+
+    with patch("src.agents.writing.get_agent_config", return_value=config), \
+         patch("src.agents.writing.arun_agent_chain", side_effect=fake_chain) as mock:
+        result = await awriting_agent_node(state)
+
+    assert result["final_article"] == "## 導入\nbody 1\n\n## 本題\nbody 2\n\n## まとめ\nbody 3"
+    assert mock.call_count == 3
+    assert peak == 2
+    first_call = mock.call_args_list[0][1]["input_vars"]
+    assert first_call["structure_doc"] == structure_doc
+    assert first_call["title_instruction"]
+
+@pytest.mark.asyncio
+async def test_a_failed_section_cancels_the_other_sections():
+    """
+    1つのセクションの執筆が失敗したら、残りのセクションの呼び出しを取り消してエラーを返すこと。
+    """
+    import asyncio
+
+    cancelled = []
+
+    async def fake_chain(**kwargs):
+        index = kwargs["input_vars"]["index"]
+        if index == 1:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("section 1 failed")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return "never"
+
+    structure_doc = "# 構成案\n\n## 導入\n- a\n\n## 本題\n- b\n\n## まとめ\n- c\n\n## 付録\n- d\n"
+    state: BlogSessionState = {"spec_doc": "# Spec", "structure_doc": structure_doc, "phase": "Structure"}
+    config = {"parallel_sections": True, "max_parallel_sections": 2}
+
+    with patch("src.agents.writing.get_agent_config", return_value=config), \
+         patch("src.agents.writing.arun_agent_chain", side_effect=fake_chain) as mock:
+        with pytest.raises(RuntimeError, match="section 1 failed"):
+            await asyncio.wait_for(awriting_agent_node(state), timeout=5)
+
+    # Every section that had started is cancelled, and the last one never starts
+    started = [call[1]["input_vars"]["index"] for call in mock.call_args_list]
+    assert sorted(cancelled) == [index for index in started if index != 1]
+    assert 4 not in started
+
+@pytest.mark.asyncio
+async def test_awriting_agent_writes_the_sections_of_the_stored_outline():
+    """
+    state に Outline があれば、structure_doc を解析し直さずにそのセクションを使うこと。
+    """
+    from src.agents.outline import Outline, OutlineSection
+
+    outline = Outline(title="T", sections=[
+        OutlineSection(title="導入", goal="課題の提示", target_chars=400),
+        OutlineSection(title="まとめ", goal="振り返り", target_chars=300),
+    ])
+    # structure_doc has no headings: the sections can only come from the outline
+    state: BlogSessionState = {"spec_doc": "# Spec", "structure_doc": "構成案", "outline": outline.model_dump(), "phase": "Structure"}
+
+    async def fake_chain(**kwargs):
+        return f"## {kwargs['input_vars']['section_title']}\nbody"
+
+    with patch("src.agents.writing.get_agent_config", return_value={"parallel_sections": True}), \
+         patch("src.agents.writing.arun_agent_chain", side_effect=fake_chain) as mock:
+        result = await awriting_agent_node(state)
+
+    assert result["final_article"] == "## 導入\nbody\n\n## まとめ\nbody"
+    assert mock.call_args_list[1][1]["input_vars"]["section_outline"] == outline.sections[1].to_markdown()
+
+ARTICLE = "# Title\n\nLead.\n\n## Intro\nIntro body.\n\n## Setup\nSetup body with typo.\n\n## Summary\nSummary body.\n"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("feedback", ["セクション2の誤字を直して", "Fix the typo in section 2", "Setup の誤字を直して"])
+async def test_awriting_agent_refines_only_target_section(feedback):
+    """
+    [REQ-FUN-031] 特定セクションへのフィードバックはそのセクションだけを書き直し、
+    他のセクションはバイト単位で変更しないこと。
+    """
+    from unittest.mock import AsyncMock
+
+    state: BlogSessionState = {
+        "spec_doc": "# Spec",
+        "structure_doc": "# Structure",
+        "final_article": ARTICLE,
+        "user_feedback": feedback,
+        "phase": "Writing"
+    }
+    with patch("src.agents.writing.arun_agent_chain", new_callable=AsyncMock) as mock:
+        mock.return_value = "## Setup\nSetup body, fixed."
+        result = await awriting_agent_node(state)
+
+    assert result["final_article"] == ARTICLE.replace("Setup body with typo.", "Setup body, fixed.")
+    mock.assert_awaited_once()
+    input_vars = mock.call_args[1]["input_vars"]
+    assert input_vars["current_section"] == "## Setup\nSetup body with typo."
+    assert "current_article" not in input_vars
+
+@pytest.mark.asyncio
+async def test_awriting_agent_global_feedback_regenerates_article():
+    """
+    記事全体へのフィードバックは全文の再生成にフォールバックすること。
+    """
+    from unittest.mock import AsyncMock
+
+    state: BlogSessionState = {
+        "spec_doc": "# Spec",
+        "structure_doc": "# Structure",
+        "final_article": ARTICLE,
+        "user_feedback": "記事全体の語尾を統一して (セクション2も)",
+        "phase": "Writing"
+    }
+    with patch("src.agents.writing.arun_agent_chain", new_callable=AsyncMock) as mock:
+        mock.return_value = "# Rewritten"
+        result = await awriting_agent_node(state)
+
+    assert result["final_article"] == "# Rewritten"
+    assert mock.call_args[1]["input_vars"]["current_article"] == ARTICLE
+
+@pytest.mark.parametrize("feedback, targets", [
+    ("Make the tone friendlier", []),
+    ("toneを柔らかくして", []),
+    ("全てのセクションの語尾を統一して", []),
+    ("Add a milestone list to Setup", [1]),
+    ("Setup の全ての誤字を直して", [1]),
+    ("Setup にストーンの例を足して", [1]),
+])
+def test_global_feedback_matches_whole_words_only(feedback, targets):
+    """
+    [REQ-FUN-031] 全体へのフィードバックの判定は単語・句単位で行い、部分一致で全文再生成にしないこと。
+    """
+    from src.agents.writing import _target_sections
+    from src.utils.markdown import split_sections
+
+    _, sections = split_sections(ARTICLE, 2)
+    assert _target_sections(feedback, sections) == targets
+
+@pytest.mark.parametrize("feedback, targets", [
+    ("セクション2の3つ目の例を直して", [1]),
+    ("第3章を短くして", [2]),
+    ("2番目の見出しの誤字を直して", [1]),
+    ("Shorten the 3rd section", [2]),
+    ("3つ目の例を直して", []),
+    ("2番目の段落を削って", []),
+    ("Add 3 examples", []),
+    ("セクション5を直して", []),
+    ("セクション2とセクション7を直して", []),
+])
+def test_section_numbers_need_a_section_noun(feedback, targets):
+    """
+    [REQ-FUN-031] 番号はセクションを表す語と結びついている場合だけ対象セクションとみなし、
+    存在しない番号を含むなど曖昧な場合は全文修正にフォールバックすること。
+    """
+    from src.agents.writing import _target_sections
+    from src.utils.markdown import split_sections
+
+    _, sections = split_sections(ARTICLE, 2)
+    assert _target_sections(feedback, sections) == targets